@@ -1 +1,149 @@
 import _ from "../css/main.css";
+
+// How often to ask for the progress of a feed refresh, in milliseconds
+const POLL_INTERVAL = 2000;
+
+function describe(subscription) {
+  switch (subscription.status) {
+    case "pending":
+      return "Queued";
+    case "running":
+      return "Refreshing";
+    case "failed":
+      return "Could not refresh";
+    default:
+      if (subscription.new_videos === 0) {
+        return "Up to date";
+      }
+      return `${subscription.new_videos} new videos`;
+  }
+}
+
+function showProgress(progress) {
+  let finished = 0;
+  let newVideos = 0;
+  for (const subscription of progress.subscriptions) {
+    const card = document.querySelector(
+      `[data-subscription-id="${subscription.id}"] [data-refresh-status]`
+    );
+    if (card) {
+      card.textContent = describe(subscription);
+    }
+    if (subscription.status === "done" || subscription.status === "failed") {
+      finished += 1;
+    }
+    newVideos += subscription.new_videos;
+  }
+
+  document.getElementById("update-feeds-progress").textContent =
+    `Refreshed ${finished} of ${progress.subscriptions.length} ` +
+    `subscriptions, ${newVideos} new videos`;
+  return newVideos;
+}
+
+// Replace a card with the one rendered at `url`
+function loadCard(card, url, options = {}) {
+  return fetch(url, { credentials: "same-origin", ...options })
+    .then((response) => response.text())
+    .then((html) => {
+      const template = document.createElement("template");
+      template.innerHTML = html.trim();
+      card.replaceWith(template.content.firstElementChild);
+    });
+}
+
+// Load the cards left out of the index page as they are scrolled into view
+function loadLazyCards(deck) {
+  const cards = deck.querySelectorAll("[data-lazy-card]");
+  if (!("IntersectionObserver" in window)) {
+    cards.forEach((card) => loadCard(card, card.dataset.cardUrl));
+    return;
+  }
+
+  const observer = new IntersectionObserver(
+    (entries) => {
+      for (const entry of entries) {
+        if (entry.isIntersecting) {
+          observer.unobserve(entry.target);
+          loadCard(entry.target, entry.target.dataset.cardUrl);
+        }
+      }
+    },
+    { rootMargin: "200px" }
+  );
+  cards.forEach((card) => observer.observe(card));
+}
+
+// Page through cards, and mark videos watched, by swapping in the card alone
+// rather than reloading the page
+function swapCards(deck) {
+  deck.addEventListener("click", (event) => {
+    const link = event.target.closest("[data-card-link]");
+    if (link) {
+      event.preventDefault();
+      loadCard(link.closest("[data-card-url]"), link.href);
+    }
+  });
+
+  deck.addEventListener("submit", (event) => {
+    const card = event.target.closest("[data-card-url]");
+    if (!card) {
+      return;
+    }
+    event.preventDefault();
+    const body = new FormData(event.target);
+    // The watch views redirect to `next`, which renders the updated card
+    body.append("next", card.dataset.cardUrl);
+    loadCard(card, event.target.action, { method: "POST", body }).catch(() =>
+      event.target.submit()
+    );
+  });
+}
+
+function pollProgress(statusUrl, jobs) {
+  const url = `${statusUrl}?jobs=${jobs.join(",")}`;
+  return fetch(url, { credentials: "same-origin" })
+    .then((response) => response.json())
+    .then((progress) => {
+      showProgress(progress);
+      if (!progress.done) {
+        setTimeout(() => pollProgress(statusUrl, jobs), POLL_INTERVAL);
+        return;
+      }
+      // Show the new videos
+      for (const subscription of progress.subscriptions) {
+        const card = document.querySelector(
+          `[data-subscription-id="${subscription.id}"]`
+        );
+        if (card && subscription.new_videos > 0) {
+          loadCard(card, card.dataset.cardUrl);
+        }
+      }
+    });
+}
+
+function refreshInBackground(form) {
+  form.addEventListener("submit", (event) => {
+    event.preventDefault();
+    fetch(form.action, {
+      method: "POST",
+      body: new FormData(form),
+      credentials: "same-origin",
+      headers: { Accept: "application/json" },
+    })
+      .then((response) => response.json())
+      .then((result) => pollProgress(form.dataset.statusUrl, result.jobs))
+      .catch(() => form.submit());
+  });
+}
+
+const updateFeeds = document.getElementById("update-feeds");
+if (updateFeeds) {
+  refreshInBackground(updateFeeds);
+}
+
+const deck = document.getElementById("deck");
+if (deck) {
+  loadLazyCards(deck);
+  swapCards(deck);
+}
@@ -1,15 +1,36 @@
 from django.contrib import admin
 
-from .models import Subscription, Video
+from .models import CrawlJob, Feed, Subscription, Video, QuotaDay, QuotaUsage
+
+
+class FeedAdmin(admin.ModelAdmin):
+    fields = ["name", "last_checked"]
 
 
 class VideoAdmin(admin.ModelAdmin):
-    fields = ["name", "watched"]
+    fields = ["name"]
 
 
 class SubscriptionAdmin(admin.ModelAdmin):
-    fields = ["user", "name", "last_checked"]
+    fields = ["user", "name", "feed"]
+
+
+class CrawlJobAdmin(admin.ModelAdmin):
+    list_display = ["feed", "status", "run_after", "leased_by", "attempts"]
+    list_filter = ["status"]
+
+
+class QuotaDayAdmin(admin.ModelAdmin):
+    list_display = ["date", "units"]
+
+
+class QuotaUsageAdmin(admin.ModelAdmin):
+    list_display = ["date", "endpoint", "units"]
 
 
+admin.site.register(Feed, FeedAdmin)
 admin.site.register(Subscription, SubscriptionAdmin)
 admin.site.register(Video, VideoAdmin)
+admin.site.register(CrawlJob, CrawlJobAdmin)
+admin.site.register(QuotaDay, QuotaDayAdmin)
+admin.site.register(QuotaUsage, QuotaUsageAdmin)
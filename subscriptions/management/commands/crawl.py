@@ -1,8 +1,6 @@
+from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand, CommandError
-from django.utils import timezone
-from subscriptions.utils import YoutubeClient, Crawler
-from subscriptions.models import Subscription
-import os
+from subscriptions.services import CRAWLER
 import logging
 
 
@@ -10,35 +8,32 @@ LOGGER = logging.getLogger("ytvd.subscriptions.management.crawl")
 
 
 class Command(BaseCommand):
-    help = "Perform ad-hoc crawling"
+    help = "Perform ad-hoc crawling of every subscribed feed"
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "-r",
-            "--reset",
-            action="store_true",
-            default=False,
-            help="Reset the database to a known state",
+            "-u",
+            "--user",
+            help="Only crawl the feeds this user is subscribed to",
+        )
+        parser.add_argument(
+            "-t",
+            "--timeout",
+            type=float,
+            help="Give up on feeds not crawled within this many seconds",
         )
 
     def handle(self, *args, **options):
-        if options["reset"]:
-            LOGGER.info("Resetting database state")
-            Subscription.objects.all().delete()
-
-            last_checked = timezone.make_aware(timezone.datetime(2019, 9, 1))
-
-            LOGGER.info("Creating outside xbox subscription")
-            sub = Subscription.objects.create(
-                name="outsidexbox",
-                youtube_id="UCKk076mm-7JjLxJcFSXIPJA",
-                type="ItemType.CHANNEL",
-                last_checked=last_checked,
-            )
-
-        api_key = os.environ["GOOGLE_API_KEY"]
-        client = YoutubeClient(api_key)
-        crawler = Crawler(client)
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"No such user: {options['user']}")
 
         LOGGER.info("Performing crawl")
-        crawler.crawl()
+        result = CRAWLER.crawl(user=user, timeout=options["timeout"])
+        self.stdout.write(
+            f"Crawled {len(result.completed)} feeds, "
+            f"{len(result.pending)} left pending"
+        )
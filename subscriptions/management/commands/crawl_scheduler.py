@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from subscriptions.utils.jobs import enqueue
+from subscriptions.utils.schedule import due_feeds, next_due_at
+import logging
+import time
+
+
+LOGGER = logging.getLogger("ytvd.subscriptions.management.crawl_scheduler")
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep queueing crawls of feeds as they become due, for crawl_worker "
+        "processes to pick up, until interrupted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Queue the feeds that are due now, then exit",
+        )
+        parser.add_argument(
+            "--max-sleep",
+            type=float,
+            default=60.0,
+            help="Seconds to wait at most before looking for due feeds again",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.enqueue_due()
+            if options["once"]:
+                return
+
+            time.sleep(self.sleep_time(options["max_sleep"]))
+
+    def enqueue_due(self):
+        feeds = list(due_feeds(timezone.now()))
+        for feed in feeds:
+            enqueue(feed)
+
+        if feeds:
+            LOGGER.info("Queued crawls of %d due feeds", len(feeds))
+
+    def sleep_time(self, max_sleep):
+        """
+        Seconds until the next feed is due, at most `max_sleep`
+        """
+        due_at = next_due_at()
+        if due_at is None:
+            return max_sleep
+        return min(max((due_at - timezone.now()).total_seconds(), 0), max_sleep)
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from subscriptions.services import CRAWLER
+from subscriptions.utils import metrics
+from subscriptions.utils.jobs import CrawlWorker, LEASE_DURATION
+import logging
+import time
+
+
+LOGGER = logging.getLogger("ytvd.subscriptions.management.crawl_worker")
+
+
+class Command(BaseCommand):
+    help = "Keep crawling the feeds queued for crawling, until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Crawl a single batch of queued feeds, then exit",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Number of jobs to claim at a time",
+        )
+        parser.add_argument(
+            "--lease",
+            type=float,
+            default=LEASE_DURATION.total_seconds(),
+            help="Seconds a batch may take before other workers can take it over",
+        )
+        parser.add_argument(
+            "--idle-sleep",
+            type=float,
+            default=5.0,
+            help="Seconds to wait before checking an empty queue again",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            default=None,
+            help="Serve the metrics of the worker over HTTP on this port",
+        )
+
+    def handle(self, *args, **options):
+        worker = CrawlWorker(
+            CRAWLER,
+            batch_size=options["batch_size"],
+            lease=timezone.timedelta(seconds=options["lease"]),
+        )
+        if options["metrics_port"] is not None:
+            metrics.serve(options["metrics_port"])
+        LOGGER.info("Starting crawl worker %s", worker.name)
+        while True:
+            claimed = worker.run_once()
+            if options["once"]:
+                return
+
+            if not claimed:
+                time.sleep(options["idle_sleep"])
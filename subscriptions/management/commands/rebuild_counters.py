@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from subscriptions.models import Subscription
+from subscriptions.utils.counters import update_counters
+import logging
+
+
+LOGGER = logging.getLogger("ytvd.subscriptions.management.rebuild_counters")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the unwatched videos of every subscription, e.g. after "
+        "changing watched state or videos directly in the database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of subscriptions to update in each transaction",
+        )
+
+    def handle(self, *args, **options):
+        ids = list(Subscription.objects.order_by("id").values_list("id", flat=True))
+        batch_size = options["batch_size"]
+        for start in range(0, len(ids), batch_size):
+            update_counters(
+                Subscription.objects.filter(id__in=ids[start : start + batch_size])
+            )
+        LOGGER.info("Rebuilt the counters of %d subscriptions", len(ids))
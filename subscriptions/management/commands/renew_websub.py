@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from subscriptions.utils.websub import renew_leases
+import logging
+import time
+
+
+LOGGER = logging.getLogger("ytvd.subscriptions.management.renew_websub")
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep channel feeds subscribed to push notifications of new uploads "
+        "from the WebSub hub, renewing their leases before they expire"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            default=False,
+            help="Renew the leases that are due now, then exit",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60 * 60.0,
+            help="Seconds to wait before looking for leases to renew again",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.WEBSUB_CALLBACK_BASE_URL:
+            LOGGER.warning("WEBSUB_CALLBACK_BASE_URL is not set, push is disabled")
+            return
+
+        while True:
+            requested = renew_leases(timezone.now())
+            if requested:
+                LOGGER.info("Requested push subscriptions for %d feeds", requested)
+            if options["once"]:
+                return
+
+            time.sleep(options["interval"])
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0021_video_duration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='uploads_playlist_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0022_subscription_uploads_playlist_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('endpoint', models.CharField(max_length=63)),
+                ('units', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'endpoint')},
+            },
+        ),
+    ]
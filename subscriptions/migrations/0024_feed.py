@@ -0,0 +1,47 @@
+# Generated by Django 3.1.2 on 2026-10-18 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0023_quotausage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feed',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('youtube_id', models.CharField(max_length=255, unique=True)),
+                ('type', models.CharField(max_length=31)),
+                ('name', models.CharField(max_length=255)),
+                ('last_checked', models.DateTimeField(null=True)),
+                ('uploads_playlist_id', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='feed',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='subscriptions.feed'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='feed',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='videos', to='subscriptions.feed'),
+        ),
+        migrations.CreateModel(
+            name='SubscriptionVideo',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watched', models.BooleanField(default=False)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='subscriptions.subscription')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='subscriptions.video')),
+            ],
+            options={
+                'unique_together': {('subscription', 'video')},
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def populate_feeds(apps, schema_editor):
+    """
+    Create a feed for every distinct channel or playlist subscribed to, move
+    the videos onto it, and give every subscriber an entry for each video
+    """
+    Feed = apps.get_model("subscriptions", "Feed")
+    Subscription = apps.get_model("subscriptions", "Subscription")
+    SubscriptionVideo = apps.get_model("subscriptions", "SubscriptionVideo")
+    Video = apps.get_model("subscriptions", "Video")
+
+    for sub in Subscription.objects.order_by("id"):
+        (feed, created) = Feed.objects.get_or_create(
+            youtube_id=sub.youtube_id,
+            defaults={
+                "type": sub.type,
+                "name": sub.name,
+                "last_checked": sub.last_checked,
+                "uploads_playlist_id": sub.uploads_playlist_id,
+            },
+        )
+        if not created:
+            # Check again from the subscriber that is furthest behind
+            if sub.last_checked is not None and (
+                feed.last_checked is None or sub.last_checked < feed.last_checked
+            ):
+                feed.last_checked = sub.last_checked
+            feed.uploads_playlist_id = (
+                feed.uploads_playlist_id or sub.uploads_playlist_id
+            )
+            feed.save()
+
+        sub.feed = feed
+        sub.save(update_fields=["feed"])
+
+    Video.objects.update(
+        feed=Subquery(
+            Subscription.objects.filter(id=OuterRef("subscription_id")).values(
+                "feed_id"
+            )[:1]
+        )
+    )
+
+    subscribers = {}
+    for (sub_id, feed_id) in Subscription.objects.values_list("id", "feed_id"):
+        subscribers.setdefault(feed_id, []).append(sub_id)
+
+    entries = [
+        SubscriptionVideo(
+            subscription_id=sub_id,
+            video_id=video_id,
+            watched=watched and sub_id == owner_id,
+        )
+        for (video_id, feed_id, owner_id, watched) in Video.objects.values_list(
+            "id", "feed_id", "subscription_id", "watched"
+        ).iterator()
+        for sub_id in subscribers[feed_id]
+    ]
+    SubscriptionVideo.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0024_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.1.2 on 2026-10-18 10:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0025_populate_feeds'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='subscription',
+            name='last_checked',
+        ),
+        migrations.RemoveField(
+            model_name='subscription',
+            name='uploads_playlist_id',
+        ),
+        migrations.RemoveField(
+            model_name='video',
+            name='subscription',
+        ),
+        migrations.RemoveField(
+            model_name='video',
+            name='watched',
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='feed',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='subscriptions.feed'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='feed',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='videos', to='subscriptions.feed'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='youtube_id',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterUniqueTogether(
+            name='video',
+            unique_together={('feed', 'youtube_id')},
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='videos',
+            field=models.ManyToManyField(related_name='subscriptions', through='subscriptions.SubscriptionVideo', to='subscriptions.Video'),
+        ),
+    ]
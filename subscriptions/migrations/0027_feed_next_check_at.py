@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0026_remove_subscription_crawl_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='next_check_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0027_feed_next_check_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('leased_by', models.CharField(blank=True, max_length=255)),
+                ('lease_expires_at', models.DateTimeField(null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='crawl_jobs', to='subscriptions.feed')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='crawljob',
+            index=models.Index(fields=['status', 'run_after'], name='subscriptio_status_302cab_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='crawljob',
+            constraint=models.UniqueConstraint(condition=models.Q(status__in=['pending', 'running']), fields=('feed',), name='one_active_crawl_job_per_feed'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0028_crawljob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crawljob',
+            name='videos_added',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
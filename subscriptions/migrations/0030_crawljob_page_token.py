@@ -0,0 +1,23 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0029_crawljob_videos_added'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crawljob',
+            name='checked_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='crawljob',
+            name='page_token',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0030_crawljob_page_token'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='crawljob',
+            name='checked_at',
+        ),
+        migrations.RemoveField(
+            model_name='crawljob',
+            name='page_token',
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='checkpoint_page_token',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='checkpoint_since',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='high_water_mark',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2026-10-18 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0033_feed_push'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='atom_state',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
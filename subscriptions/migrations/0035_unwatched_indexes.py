@@ -0,0 +1,30 @@
+# Generated by Django 3.1.2 on 2026-10-18 09:19
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking out writes to the tables
+    atomic = False
+
+    dependencies = [
+        ('subscriptions', '0034_feed_atom_state'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='subscriptionvideo',
+            index=models.Index(condition=models.Q(watched=False), fields=['subscription', 'video'], name='unwatched_entries'),
+        ),
+        AddIndexConcurrently(
+            model_name='video',
+            index=models.Index(fields=['feed', '-published_at'], name='newest_videos'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='feed',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='videos', to='subscriptions.feed'),
+        ),
+    ]
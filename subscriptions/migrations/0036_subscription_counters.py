@@ -0,0 +1,53 @@
+# Generated by Django 3.1.2 on 2026-10-18 09:22
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0035_unwatched_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='latest_published_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='unwatched_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='unwatched_duration',
+            field=models.DurationField(default=datetime.timedelta(0)),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', '-unwatched_count', 'name'], name='deck'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE subscriptions_subscription AS s SET
+                unwatched_count = (
+                    SELECT COUNT(*) FROM subscriptions_subscriptionvideo AS e
+                    WHERE e.subscription_id = s.id AND NOT e.watched
+                ),
+                unwatched_duration = COALESCE((
+                    SELECT SUM(v.duration - TIME '00:00')
+                    FROM subscriptions_subscriptionvideo AS e
+                    JOIN subscriptions_video AS v ON v.id = e.video_id
+                    WHERE e.subscription_id = s.id AND NOT e.watched
+                ), INTERVAL '0'),
+                latest_published_at = (
+                    SELECT MAX(v.published_at) FROM subscriptions_video AS v
+                    WHERE v.feed_id = s.feed_id
+                )
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.2 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0036_subscription_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='push_requested_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='push_requested_mode',
+            field=models.CharField(blank=True, max_length=15),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.2 on 2026-10-18 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0037_feed_push_request'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaDay',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('units', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO subscriptions_quotaday (date, units)
+            SELECT date, SUM(units) FROM subscriptions_quotausage GROUP BY date
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,5 +1,52 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class Feed(models.Model):
+    """
+    A channel or playlist on Youtube, shared by every user subscribed to it
+
+    *Responsibilities*
+
+    * owns the videos found on the channel or playlist
+    * tracks the last time the feed was checked for new items
+    * checkpoints a crawl in progress, so that an interrupted crawl resumes
+    * schedules the next check from how often the feed posts
+    * stores whether the feed is a channel or playlist
+    * caches the "uploads" playlist of a channel feed
+    * remembers what it has seen of a playlist, to sync it incrementally
+    * tracks its subscription to push notifications of new uploads
+    """
+
+    youtube_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=31)
+    name = models.CharField(max_length=255)
+    last_checked = models.DateTimeField(null=True)
+    next_check_at = models.DateTimeField(null=True, db_index=True)
+    uploads_playlist_id = models.CharField(max_length=255, null=True, blank=True)
+    # Publish time of the newest video committed, which the next crawl starts
+    # from
+    high_water_mark = models.DateTimeField(null=True)
+    # Checkpoint of a crawl in progress: the time it fetches videos since, and
+    # the next page to fetch
+    checkpoint_since = models.DateTimeField(null=True)
+    checkpoint_page_token = models.CharField(max_length=255, null=True, blank=True)
+    # `PlaylistState` of a playlist feed, for syncing it incrementally
+    playlist_state = models.JSONField(null=True, blank=True)
+    # `AtomState` of a channel feed's Atom feed, for conditional requests
+    atom_state = models.JSONField(null=True, blank=True)
+    # Push notifications from the WebSub hub: the secret that signs them, and
+    # when the hub's lease on the subscription expires
+    push_secret = models.CharField(max_length=64, blank=True)
+    push_expires_at = models.DateTimeField(null=True)
+    # The request last made to the hub and not yet verified: its mode, and
+    # when it was made
+    push_requested_mode = models.CharField(max_length=15, blank=True)
+    push_requested_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return self.name
 
 
 class Subscription(models.Model):
@@ -8,9 +55,9 @@ class Subscription(models.Model):
 
     *Responsibilities*
 
-    * links the subscription ID to a series of videos
-    * tracks the last time the subscription was checked for new items
-    * stores whether the subscription is a channel or playlist
+    * links the user to the feed of a channel or playlist
+    * tracks which of the feed's videos the user has watched
+    * counts the videos left to watch, for ordering the user's subscriptions
     """
 
     user = models.ForeignKey(
@@ -19,14 +66,44 @@ class Subscription(models.Model):
     name = models.CharField(max_length=255)
     youtube_id = models.CharField(max_length=255)
     type = models.CharField(max_length=31)
-    last_checked = models.DateTimeField(null=True)
+    feed = models.ForeignKey(
+        Feed, related_name="subscriptions", on_delete=models.CASCADE
+    )
+    videos = models.ManyToManyField(
+        "Video", through="SubscriptionVideo", related_name="subscriptions"
+    )
+    # Kept up to date by `update_counters` whenever entries are added or
+    # watched: the number and total length of the unwatched videos, and the
+    # publish time of the feed's newest video
+    unwatched_count = models.PositiveIntegerField(default=0)
+    unwatched_duration = models.DurationField(default=timezone.timedelta(0))
+    latest_published_at = models.DateTimeField(null=True)
 
     class Meta:
         # Add a compound unique key on user and youtube id
         unique_together = ("user", "youtube_id")
+        # The order of the user's subscriptions on the index page
+        indexes = [
+            models.Index(fields=["user", "-unwatched_count", "name"], name="deck")
+        ]
+
+    def save(self, *args, **kwargs):
+        # Subscriptions to the same channel or playlist share a feed
+        if self.feed_id is None:
+            (self.feed, _) = Feed.objects.get_or_create(
+                youtube_id=self.youtube_id,
+                defaults={"type": self.type, "name": self.name},
+            )
+        super().save(*args, **kwargs)
+
+    @property
+    def last_checked(self):
+        return self.feed.last_checked
 
     def unwatched(self):
-        return self.videos.filter(watched=False).order_by("-published_at")
+        return Video.objects.filter(
+            entries__subscription=self, entries__watched=False
+        ).order_by("-published_at")
 
     def __str__(self):
         return self.name
@@ -34,11 +111,10 @@ class Subscription(models.Model):
 
 class Video(models.Model):
     """
-    Represents a single video, belonging to a subscription
+    Represents a single video, belonging to a feed
 
     *Responsibilities*
 
-    * track whether the user has watched the video
     * store the thumbnail
     * store the full url to video
     """
@@ -46,14 +122,19 @@ class Video(models.Model):
     name = models.CharField(max_length=255)
     thumbnail_url = models.CharField(max_length=255)
     description = models.TextField()
-    youtube_id = models.CharField(max_length=255, unique=True)
-    subscription = models.ForeignKey(
-        Subscription, related_name="videos", on_delete=models.CASCADE
+    youtube_id = models.CharField(max_length=255)
+    # Indexed by the unique key and index below, which lead with it
+    feed = models.ForeignKey(
+        Feed, related_name="videos", on_delete=models.CASCADE, db_index=False
     )
     published_at = models.DateTimeField()
-    watched = models.BooleanField(default=False)
     duration = models.TimeField(null=True)
 
+    class Meta:
+        unique_together = ("feed", "youtube_id")
+        # For a feed's newest videos, e.g. when backfilling a new subscriber
+        indexes = [models.Index(fields=["feed", "-published_at"], name="newest_videos")]
+
     @property
     def url(self):
         """
@@ -71,4 +152,158 @@ class Video(models.Model):
             return self.name
 
     def __str__(self):
-        return f"{self.youtube_id} from {self.subscription}"
+        return f"{self.youtube_id} from {self.feed}"
+
+
+class SubscriptionVideo(models.Model):
+    """
+    A video of a feed, as seen by one of its subscribers
+
+    *Responsibilities*
+
+    * track whether the user has watched the video
+    """
+
+    subscription = models.ForeignKey(
+        Subscription, related_name="entries", on_delete=models.CASCADE
+    )
+    video = models.ForeignKey(Video, related_name="entries", on_delete=models.CASCADE)
+    watched = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ("subscription", "video")
+        # Covers counting and listing a subscription's unwatched videos, which
+        # are usually a small part of its entries, without reading the table
+        indexes = [
+            models.Index(
+                fields=["subscription", "video"],
+                condition=models.Q(watched=False),
+                name="unwatched_entries",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.video} for {self.subscription.user}"
+
+
+def attach_newest_unwatched(subscriptions, limit):
+    """
+    Set `newest_unwatched` on each of the subscriptions to a list of its
+    `limit` newest unwatched videos, and return them as a list.
+
+    The videos of every subscription are fetched in a single query, which
+    numbers each subscription's unwatched videos newest first and keeps the
+    first `limit`, so its cost does not grow with the size of the backlog.
+    """
+    subscriptions = list(subscriptions)
+    by_id = {sub.id: sub for sub in subscriptions}
+    for sub in subscriptions:
+        sub.newest_unwatched = []
+    if not subscriptions:
+        return subscriptions
+
+    video = Video._meta.db_table
+    entry = SubscriptionVideo._meta.db_table
+    query = f"""
+        SELECT * FROM (
+            SELECT {video}.*, {entry}.subscription_id AS entry_subscription_id,
+                ROW_NUMBER() OVER (
+                    PARTITION BY {entry}.subscription_id
+                    ORDER BY {video}.published_at DESC, {video}.id DESC
+                ) AS position
+            FROM {video}
+            JOIN {entry} ON {entry}.video_id = {video}.id
+            WHERE NOT {entry}.watched
+                AND {entry}.subscription_id IN ({", ".join(["%s"] * len(by_id))})
+        ) AS ranked
+        WHERE position <= %s
+        ORDER BY entry_subscription_id, position
+    """
+    for unwatched in Video.objects.raw(query, [*by_id, limit]):
+        by_id[unwatched.entry_subscription_id].newest_unwatched.append(unwatched)
+    return subscriptions
+
+
+class CrawlJob(models.Model):
+    """
+    A queued crawl of a feed, leased by one crawl worker at a time
+
+    *Responsibilities*
+
+    * records when the feed should be crawled, and how often it was tried
+    * tracks which worker holds the job, and until when
+    * reports how many new videos the crawl found
+    * allows at most one queued or running job per feed
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    ACTIVE = [Status.PENDING, Status.RUNNING]
+
+    feed = models.ForeignKey(Feed, related_name="crawl_jobs", on_delete=models.CASCADE)
+    status = models.CharField(
+        max_length=15, choices=Status.choices, default=Status.PENDING
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    leased_by = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True)
+    videos_added = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["feed"],
+                condition=models.Q(status__in=["pending", "running"]),
+                name="one_active_crawl_job_per_feed",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.status} crawl of {self.feed}"
+
+
+class QuotaDay(models.Model):
+    """
+    Total Youtube API quota spent in a single quota day
+
+    *Responsibilities*
+
+    * caps the units charged in a day, with a conditional update that
+      concurrent processes cannot overspend
+    """
+
+    date = models.DateField(unique=True)
+    units = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.units} units on {self.date}"
+
+
+class QuotaUsage(models.Model):
+    """
+    Running total of the Youtube API quota spent on a single endpoint in a
+    single quota day
+
+    *Responsibilities*
+
+    * records the units charged for every API request
+    * lets the crawler find out how much of the daily quota remains
+    """
+
+    date = models.DateField()
+    endpoint = models.CharField(max_length=63)
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("date", "endpoint")
+
+    def __str__(self):
+        return f"{self.units} units of {self.endpoint} on {self.date}"
@@ -2,7 +2,7 @@ import graphene
 from graphene import relay
 from graphene_django.types import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
-from .models import Video, Subscription
+from .models import Feed, Video, Subscription, SubscriptionVideo
 from django.contrib.auth.models import User
 
 
@@ -13,9 +13,23 @@ class UserType(DjangoObjectType):
         interfaces = (relay.Node, )
 
 
+class FeedType(DjangoObjectType):
+    class Meta:
+        model = Feed
+        filter_fields = ["youtube_id"]
+        interfaces = (relay.Node, )
+
+
 class VideoType(DjangoObjectType):
     class Meta:
         model = Video
+        filter_fields = ["youtube_id"]
+        interfaces = (relay.Node, )
+
+
+class SubscriptionVideoType(DjangoObjectType):
+    class Meta:
+        model = SubscriptionVideo
         filter_fields = ["watched"]
         interfaces = (relay.Node, )
 
@@ -0,0 +1,26 @@
+"""
+The Youtube client, crawler and search cache shared by the views and the
+management commands of a process
+"""
+import os
+from django.conf import settings
+from .utils.crawler import Crawler
+from .utils.quota import QuotaLedger
+from .utils.ratelimit import TokenBucket
+from .utils.response_cache import ResponseCache
+from .utils.search_cache import SearchCache
+from .utils.types import CrawlMode
+from .utils.youtube_client import YoutubeClient
+
+
+YOUTUBE = YoutubeClient(
+    os.environ["GOOGLE_API_KEY"],
+    ledger=QuotaLedger(),
+    cache=ResponseCache(),
+    rate_limiter=TokenBucket(settings.YOUTUBE_REQUESTS_PER_SECOND),
+    timeout=settings.YOUTUBE_TIMEOUT,
+    base_url=settings.YOUTUBE_API_URL,
+    feeds_url=settings.YOUTUBE_FEEDS_URL,
+)
+CRAWLER = Crawler(YOUTUBE, channel_mode=CrawlMode(settings.CRAWL_CHANNEL_MODE))
+SEARCH_CACHE = SearchCache()
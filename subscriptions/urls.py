@@ -4,10 +4,28 @@ from graphene_django.views import GraphQLView
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path(
+        "subscriptions/<int:subscription_id>/",
+        views.subscription,
+        name="subscription",
+    ),
+    path(
+        "subscriptions/<int:subscription_id>/card/",
+        views.subscription_card,
+        name="subscription-card",
+    ),
     path("search/", views.search, name="search"),
     path("search/subscribe", views.subscribe, name="subscribe"),
     path("watched_sub/", views.mark_subscription_watched, name="sub-watched"),
     path("watched_video/", views.mark_video_watched, name="video-watched"),
+    path("watched/", views.mark_batch_watched, name="batch-watched"),
     path("update_feeds/", views.update_feeds, name="update-feeds"),
+    path(
+        "update_feeds/status/",
+        views.update_feeds_status,
+        name="update-feeds-status",
+    ),
+    path("websub/<int:feed_id>/", views.websub_callback, name="websub-callback"),
+    path("metrics", views.metrics, name="metrics"),
     # path("graphql/", GraphQLView.as_view(graphiql=True), name="graphql"),
 ]
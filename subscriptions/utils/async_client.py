@@ -0,0 +1,293 @@
+import aiohttp
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from . import metrics
+from .atom import EntryParser
+from .types import Page
+from .youtube_client import BaseYoutubeClient
+
+
+LOGGER = logging.getLogger("ytvd.subscriptions.utils.async_client")
+
+
+def loop_time():
+    return asyncio.get_event_loop().time()
+
+
+class AsyncYoutubeClient(BaseYoutubeClient):
+    """
+    asyncio version of `YoutubeClient`.
+
+    Offers the same methods, but `search` and the `fetch_latest_*` methods are
+    async generators, and the single-shot lookups are coroutines. All requests
+    share one `aiohttp` session, which holds at most `max_connections` open
+    connections however many coroutines are using the client.
+
+    The session is created on first use, and should be closed with `close`, or
+    by using the client as an async context manager.
+    """
+
+    def __init__(self, api_key, max_connections=100, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.max_connections = max_connections
+        self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _open(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=client_timeout(self.timeout),
+            )
+
+    async def _fetch(self, url, *, params=None, etag=None):
+        """
+        Helper method for fetching data from the Youtube API, mirroring
+        `YoutubeClient._fetch`
+        """
+        self._open()
+        caching = self._caches(url, params, etag)
+        cached = None
+        if caching:
+            cached = await sync_to_async(self._cached_response, thread_sensitive=True)(
+                url, params
+            )
+        attempt = 0
+        while True:
+            await sync_to_async(self._charge, thread_sensitive=True)(url)
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                self._record_throttle(wait)
+                await asyncio.sleep(wait)
+
+            started = loop_time()
+            try:
+                async with self.session.get(
+                    url,
+                    params=params,
+                    headers=self._conditional_headers(cached, etag),
+                    timeout=client_timeout(self._request_timeout()),
+                ) as response:
+                    body = await response.read()
+                    metrics.record_request(
+                        self._endpoint(url),
+                        response.status,
+                        loop_time() - started,
+                        len(body),
+                    )
+                    if response.status == 304 and cached is not None:
+                        return self._cache_hit(cached)
+                    if response.status == 304 and etag is not None:
+                        return None
+
+                    error = None
+                    if response.status >= 400:
+                        try:
+                            error = await response.json(content_type=None)
+                        except ValueError:
+                            # Not a JSON error response
+                            pass
+
+                    await sync_to_async(self._check_quota_error, thread_sensitive=True)(
+                        response.status, error
+                    )
+                    if not self._should_retry(response.status, error, attempt):
+                        response.raise_for_status()
+                        data = await response.json()
+                        break
+                    delay = self._retry_delay(
+                        attempt, response.headers.get("Retry-After")
+                    )
+                    if delay is None:
+                        response.raise_for_status()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                metrics.record_request(
+                    self._endpoint(url), "error", loop_time() - started, 0
+                )
+                delay = None
+                if attempt < self.max_retries:
+                    delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+                LOGGER.info("Connection error fetching %s, retrying", url)
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if caching:
+            await sync_to_async(self._store_response, thread_sensitive=True)(
+                url, params, response.headers.get("ETag"), data
+            )
+        return data
+
+    async def search(self, term):
+        data = await self._fetch(self.search_url, params=self._search_params(term))
+        for item in self._parse_search(data):
+            yield item
+
+    async def fetch_latest_from_channel(self, *, channel_id, since):
+        page_id = None
+        while True:
+            page = await self.fetch_channel_page(
+                channel_id=channel_id, since=since, page_id=page_id
+            )
+            for video in page.videos:
+                yield video
+
+            # Break condition, no more pages
+            if page.next_page_id is None:
+                break
+            page_id = page.next_page_id
+
+    async def fetch_channel_page(self, *, channel_id, since, page_id=None):
+        params = self._channel_page_params(channel_id, since, page_id)
+        data = await self._fetch(self.search_url, params=params)
+
+        items = self._parse_channel_page(data, since)
+        return Page(await self._build_videos(items), data.get("nextPageToken"))
+
+    async def fetch_channel_feed(self, *, channel_id, since, state):
+        self._open()
+        started = loop_time()
+        async with self.session.get(
+            self.feeds_url,
+            params=self._feed_params(channel_id),
+            headers=self._feed_headers(state),
+            timeout=client_timeout(self._request_timeout()),
+        ) as response:
+            parser = EntryParser()
+            entries = []
+            size = 0
+            if response.status == 200:
+                async for chunk in response.content.iter_chunked(self.FEED_CHUNK_SIZE):
+                    size += len(chunk)
+                    entries.extend(parser.feed(chunk))
+                entries.extend(parser.close())
+
+        metrics.record_request("feeds", response.status, loop_time() - started, size)
+        if response.status == 304:
+            self._count("feeds_unchanged")
+            return Page([])
+        response.raise_for_status()
+
+        new = self._new_feed_entries(entries, since)
+        self._update_feed_state(state, response.headers)
+        if not new:
+            return Page([])
+
+        details = await self.fetch_video_details(*[entry.video_id for entry in new])
+        return Page(self._make_feed_videos(new, details))
+
+    async def fetch_uploads_playlist_id(self, channel_id):
+        data = await self._fetch(
+            self.channels_url, params=self._uploads_params(channel_id)
+        )
+        return self._parse_uploads(data, channel_id)
+
+    async def fetch_latest_from_playlist(
+        self, *, playlist_id, since, newest_first=False
+    ):
+        page_id = None
+        while True:
+            page = await self.fetch_playlist_page(
+                playlist_id=playlist_id,
+                since=since,
+                page_id=page_id,
+                newest_first=newest_first,
+            )
+            for video in page.videos:
+                yield video
+
+            # Break condition, no more pages
+            if page.next_page_id is None:
+                break
+            page_id = page.next_page_id
+
+    async def fetch_playlist_page(
+        self, *, playlist_id, since, page_id=None, newest_first=False
+    ):
+        params = self._playlist_page_params(playlist_id, page_id)
+        data = await self._fetch(self.playlist_items_url, params=params)
+
+        items, reached_since = self._parse_playlist_page(data, since, newest_first)
+        next_page_id = None if reached_since else data.get("nextPageToken")
+        return Page(await self._build_videos(items), next_page_id)
+
+    async def sync_playlist_page(self, *, playlist_id, since, state, page_id=None):
+        first_page = page_id is None
+        params = self._playlist_page_params(playlist_id, page_id)
+        data = await self._fetch(
+            self.playlist_items_url,
+            params=params,
+            etag=state.etag if first_page else None,
+        )
+
+        synced = self._sync_playlist_page(data, since, state, first_page)
+        if synced is None:
+            self._count("playlists_unchanged")
+            return Page([])
+
+        (items, more) = synced
+        next_page_id = data.get("nextPageToken") if more else None
+        return Page(await self._build_videos(items), next_page_id)
+
+    async def _build_videos(self, items):
+        if not items:
+            return []
+
+        details = await self.fetch_video_details(
+            *[video_id for (video_id, _, _) in items]
+        )
+        return self._make_videos(items, details)
+
+    async def fetch_video_details(self, *video_ids):
+        # The chunks are independent, so request them concurrently
+        pages = await asyncio.gather(
+            *[
+                self._fetch(self.videos_url, params=self._video_details_params(chunk))
+                for chunk in self._chunk_video_ids(video_ids)
+            ]
+        )
+
+        results = {}
+        for data in pages:
+            for item in data["items"]:
+                results[item["id"]] = item["contentDetails"]
+        return results
+
+    async def fetch_videos(self, *video_ids):
+        pages = await asyncio.gather(
+            *[
+                self._fetch(
+                    self.videos_url,
+                    params=self._video_details_params(
+                        chunk, part="snippet,contentDetails"
+                    ),
+                )
+                for chunk in self._chunk_video_ids(video_ids)
+            ]
+        )
+
+        videos = []
+        for data in pages:
+            videos.extend(self._parse_videos(data))
+        return videos
+
+
+def client_timeout(timeout):
+    """
+    The aiohttp timeout of a request given (connect, read) timeouts
+    """
+    (connect_timeout, read_timeout) = timeout
+    return aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from .async_client import AsyncYoutubeClient
+from .crawler import (
+    CrawlDeadlineExceeded,
+    check_deadline,
+    commit_page,
+    crawl_mode,
+    finish_crawl,
+    plan_crawl,
+    recorded_crawl,
+    start_crawl,
+    subscribed_feeds,
+)
+from .ingest import IngestResult
+from .quota import QuotaExhausted
+from .types import AtomState, ItemType, CrawlMode, CrawlResult, PlaylistState
+from .youtube_client import FeedIncomplete, request_deadline
+
+LOGGER = logging.getLogger("ytvd.subscriptions.utils.async_crawler")
+
+
+class AsyncCrawler:
+    """
+    asyncio version of `Crawler`.
+
+    Every feed is crawled in its own task on a single event loop, with at most
+    `concurrency` feeds in flight at once. The Django ORM is
+    synchronous, so database access is handed to a single worker thread.
+
+    Feeds still in progress when a crawl's timeout passes stop after the page
+    in progress is committed, like those of `Crawler`, and are reported as
+    pending, to resume from their checkpoint on the next crawl.
+    """
+
+    def __init__(
+        self,
+        client: AsyncYoutubeClient,
+        concurrency: int = 50,
+        channel_mode: CrawlMode = CrawlMode.UPLOADS,
+    ):
+        self.client = client
+        self.concurrency = concurrency
+        self.channel_mode = channel_mode
+
+    async def crawl(self, *, user=None, timeout=None):
+        """
+        Go through all of the feeds subscribed to, or only those of `user`,
+        check for latest videos and update, giving up on any not finished
+        within `timeout` seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        feeds = await database(list)(subscribed_feeds(user))
+        planned = await database(self.plan)(feeds)
+
+        planned_ids = {feed.id for feed in planned}
+        result = CrawlResult(
+            pending=[feed for feed in feeds if feed.id not in planned_ids]
+        )
+        if not planned:
+            return result
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded_crawl(feed):
+            async with semaphore:
+                return await self._crawl_within_limits(feed, deadline)
+
+        # Rather than cancel feeds at the timeout, possibly while a page is
+        # being committed on the database thread, each feed checks the
+        # deadline between pages
+        ingested = await asyncio.gather(*[bounded_crawl(feed) for feed in planned])
+        for (feed, feed_ingested) in zip(planned, ingested):
+            result.add(feed, feed_ingested)
+        return result
+
+    def plan(self, feeds):
+        return plan_crawl(feeds, self.channel_mode, self.client.ledger)
+
+    async def _crawl_within_limits(self, feed, deadline):
+        """
+        Crawl the feed, returning its `IngestResult` if it completed within the
+        deadline and the quota, without error, or `None` otherwise
+        """
+        try:
+            check_deadline(deadline)
+            return await self.crawl_feed(feed, deadline=deadline)
+        except QuotaExhausted:
+            LOGGER.warning("Quota exhausted while crawling feed %s", feed)
+        except CrawlDeadlineExceeded:
+            LOGGER.warning("Deadline passed while crawling feed %s", feed)
+        except Exception:
+            # One broken feed should not hold up the rest
+            LOGGER.exception("Failed to crawl feed %s", feed)
+        return None
+
+    async def crawl_feed(self, feed, deadline=None):
+        """
+        Crawl the feed a page at a time from its checkpoint, like
+        `Crawler.crawl_feed`, and return the `IngestResult`
+        """
+        LOGGER.info("Crawling for feed %s", feed)
+        now = timezone.now()
+        result = IngestResult()
+        with recorded_crawl(feed, result) as stats, request_deadline(deadline):
+            await database(start_crawl)(feed, now)
+            while True:
+                page = await self.fetch_page(
+                    feed, feed.checkpoint_since, feed.checkpoint_page_token
+                )
+                result += await database(commit_page)(feed, page)
+                stats.pages += 1
+                if page.next_page_id is None:
+                    break
+                check_deadline(deadline)
+
+            await database(finish_crawl)(feed, now)
+        return result
+
+    async def fetch_page(self, feed, since, page_id=None):
+        item_type = ItemType.from_(feed.type)
+        channel_mode = crawl_mode(feed, self.channel_mode)
+        if item_type == ItemType.CHANNEL and channel_mode == CrawlMode.FEED:
+            if page_id is None:
+                state = AtomState.from_json(feed.atom_state)
+                try:
+                    page = await self.client.fetch_channel_feed(
+                        channel_id=feed.youtube_id, since=since, state=state
+                    )
+                except FeedIncomplete:
+                    LOGGER.info("Feed %s may be missing videos, crawling uploads", feed)
+                else:
+                    feed.atom_state = state.to_json()
+                    return page
+            # The Atom feed has no further pages, so this crawl falls back to
+            # the uploads playlist, and keeps paging through it
+            channel_mode = CrawlMode.UPLOADS
+
+        if item_type == ItemType.CHANNEL and channel_mode == CrawlMode.UPLOADS:
+            if not feed.uploads_playlist_id:
+                feed.uploads_playlist_id = await self.client.fetch_uploads_playlist_id(
+                    feed.youtube_id
+                )
+                await database(feed.save)(update_fields=["uploads_playlist_id"])
+
+            return await self.client.fetch_playlist_page(
+                playlist_id=feed.uploads_playlist_id,
+                since=since,
+                page_id=page_id,
+                newest_first=True,
+            )
+        elif item_type == ItemType.CHANNEL:
+            return await self.client.fetch_channel_page(
+                channel_id=feed.youtube_id, since=since, page_id=page_id
+            )
+        elif item_type == ItemType.PLAYLIST:
+            state = PlaylistState.from_json(feed.playlist_state)
+            page = await self.client.sync_playlist_page(
+                playlist_id=feed.youtube_id, since=since, state=state, page_id=page_id
+            )
+            feed.playlist_state = state.to_json()
+            return page
+        else:
+            raise ValueError(f"Unsupported item type: {item_type}")
+
+
+def database(func):
+    """
+    Wrap a synchronous function using the ORM to run on the database thread
+    """
+    return sync_to_async(func, thread_sensitive=True)
@@ -0,0 +1,91 @@
+"""
+Parsing of the Atom feeds Youtube publishes for channels, which are also the
+bodies of its WebSub notifications
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from xml.etree import ElementTree
+from django.utils.dateparse import parse_datetime
+
+NAMESPACES = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+    "media": "http://search.yahoo.com/mrss/",
+}
+
+ENTRY_TAG = "{http://www.w3.org/2005/Atom}entry"
+
+
+@dataclass
+class Entry:
+    """
+    A video listed in an Atom feed
+    """
+
+    video_id: str
+    channel_id: str
+    title: str
+    published_at: datetime
+    updated_at: datetime
+    description: str = ""
+    thumbnail_url: str = ""
+
+
+class EntryParser:
+    """
+    Incremental parser of the entries of an Atom document, which is fed a
+    chunk at a time so that a feed is parsed as it downloads, and each entry
+    is freed once it has been read.
+
+    Notifications of deleted videos use `at:deleted-entry` elements rather
+    than entries, so they are left out.
+    """
+
+    def __init__(self):
+        self.parser = ElementTree.XMLPullParser(events=("end",))
+
+    def feed(self, data):
+        """
+        Parse a chunk of the document, returning the entries it completes
+        """
+        self.parser.feed(data)
+        return self._read_entries()
+
+    def close(self):
+        """
+        Finish parsing the document, returning any entries left
+        """
+        self.parser.close()
+        return self._read_entries()
+
+    def _read_entries(self):
+        entries = []
+        for (_, element) in self.parser.read_events():
+            if element.tag == ENTRY_TAG:
+                entries.append(_parse_entry(element))
+                element.clear()
+        return entries
+
+
+def _parse_entry(element):
+    def text(path, default=None):
+        return element.findtext(path, default=default, namespaces=NAMESPACES)
+
+    thumbnail = element.find("media:group/media:thumbnail", NAMESPACES)
+    return Entry(
+        video_id=text("yt:videoId"),
+        channel_id=text("yt:channelId"),
+        title=text("atom:title", ""),
+        published_at=parse_datetime(text("atom:published")),
+        updated_at=parse_datetime(text("atom:updated")),
+        description=text("media:group/media:description", ""),
+        thumbnail_url=thumbnail.get("url", "") if thumbnail is not None else "",
+    )
+
+
+def parse_entries(body):
+    """
+    The video entries of a whole Atom document
+    """
+    parser = EntryParser()
+    return parser.feed(body) + parser.close()
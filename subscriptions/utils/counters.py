@@ -0,0 +1,52 @@
+from datetime import time, timedelta
+from django.db.models import (
+    Count,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    TimeField,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from ..models import SubscriptionVideo, Video
+
+# The length of a video, its duration being stored as a time of day
+LENGTH = ExpressionWrapper(
+    F("video__duration") - Value(time(0), output_field=TimeField()),
+    output_field=DurationField(),
+)
+
+
+def update_counters(subscriptions):
+    """
+    Recount the unwatched videos, their total length, and the newest video of
+    each of the subscriptions, in a single UPDATE.
+
+    Call it in the same transaction as any change to the entries or videos of
+    the subscriptions. Each count only reads the index of unwatched entries,
+    so its cost grows with the unwatched backlog rather than the history.
+    """
+    unwatched = (
+        SubscriptionVideo.objects.filter(subscription=OuterRef("pk"), watched=False)
+        .order_by()
+        .values("subscription")
+    )
+    newest = (
+        Video.objects.filter(feed=OuterRef("feed"))
+        .order_by("-published_at")
+        .values("published_at")[:1]
+    )
+    return subscriptions.update(
+        unwatched_count=Coalesce(
+            Subquery(unwatched.annotate(count=Count("*")).values("count")), 0
+        ),
+        unwatched_duration=Coalesce(
+            Subquery(unwatched.annotate(length=Sum(LENGTH)).values("length")),
+            Value(timedelta(0)),
+            output_field=DurationField(),
+        ),
+        latest_published_at=Subquery(newest),
+    )
@@ -1,67 +1,429 @@
+import asyncio
+import json
 import logging
-from ..models import Subscription
+import time
+from contextlib import contextmanager
+from ..models import Feed
+from django.db import transaction
 from django.utils import timezone
-from django.db.utils import IntegrityError
-from .types import ItemType
-from .youtube_client import YoutubeClient
-from concurrent.futures import ThreadPoolExecutor
+from . import metrics
+from .ingest import IngestResult, ingest_videos, link_videos
+from .schedule import schedule_next_check
+from .types import AtomState, ItemType, CrawlMode, CrawlResult, PlaylistState
+from .youtube_client import FeedIncomplete, YoutubeClient, request_deadline
+from .quota import QUOTA_COSTS, QuotaExhausted
+from concurrent.futures import ThreadPoolExecutor, wait
 
 LOGGER = logging.getLogger("ytvd.subscriptions.utils")
 
 
+class CrawlDeadlineExceeded(Exception):
+    """
+    Raised when a subscription cannot be finished before the crawl deadline
+    """
+
+
+def check_deadline(deadline):
+    """
+    Raise `CrawlDeadlineExceeded` if the `time.monotonic` deadline has passed
+    """
+    if deadline is not None and time.monotonic() > deadline:
+        raise CrawlDeadlineExceeded()
+
+
+# How far back the first crawl of a feed, or a new subscriber, goes
+BACKFILL_PERIOD = timezone.timedelta(days=90)
+
+
+def crawl_since(feed, now):
+    """
+    The time after which videos of the feed have not been seen yet: the
+    publish time of the newest video stored, falling back to when the feed was
+    last checked, or the backfill period for a feed never crawled
+    """
+    if feed.high_water_mark is not None:
+        return feed.high_water_mark
+    if feed.last_checked is not None:
+        return feed.last_checked
+    return now - BACKFILL_PERIOD
+
+
+def start_crawl(feed, now):
+    """
+    Set the checkpoint of the feed at the start of a new crawl, unless it holds
+    the progress of an interrupted crawl, which is resumed instead
+    """
+    if feed.checkpoint_since is None:
+        feed.checkpoint_since = crawl_since(feed, now)
+        feed.checkpoint_page_token = None
+        feed.save(update_fields=["checkpoint_since", "checkpoint_page_token"])
+
+
+def commit_page(feed, page):
+    """
+    Store a crawled page of videos and move the checkpoint of the feed past it,
+    in one transaction, returning the `IngestResult`
+    """
+    with transaction.atomic():
+        result = ingest_videos(feed, page.videos)
+        newest = max((video.published_at for video in page.videos), default=None)
+        if newest is not None and (
+            feed.high_water_mark is None or newest > feed.high_water_mark
+        ):
+            feed.high_water_mark = newest
+        feed.checkpoint_page_token = page.next_page_id
+        feed.save(
+            update_fields=[
+                "checkpoint_page_token",
+                "high_water_mark",
+                "playlist_state",
+                "atom_state",
+            ]
+        )
+    return result
+
+
+def finish_crawl(feed, now):
+    """
+    Clear the checkpoint of a crawl that has fetched every page, and record
+    that the feed has been checked at `now`, and when it is next due
+    """
+    feed.checkpoint_since = None
+    feed.checkpoint_page_token = None
+    feed.last_checked = now
+    schedule_next_check(feed, now)
+    feed.save(
+        update_fields=[
+            "checkpoint_since",
+            "checkpoint_page_token",
+            "last_checked",
+            "next_check_at",
+        ]
+    )
+
+
+@contextmanager
+def recorded_crawl(feed, result):
+    """
+    Time the crawl of the feed made within the block, collecting the requests
+    it makes in the `CrawlStats` yielded, and on leaving the block record it in
+    the metrics and log a line describing it, whatever the outcome.
+
+    `result` is the `IngestResult` the crawl adds its counts to.
+    """
+    started = time.monotonic()
+    outcome = "failed"
+    with metrics.crawl_stats() as stats:
+        try:
+            yield stats
+            outcome = "completed"
+        except (CrawlDeadlineExceeded, asyncio.CancelledError):
+            outcome = "deadline"
+            raise
+        except QuotaExhausted:
+            outcome = "quota"
+            raise
+        finally:
+            record_crawl(feed, outcome, time.monotonic() - started, result, stats)
+
+
+def record_crawl(feed, outcome, seconds, result, stats):
+    metrics.CRAWLS.inc(outcome=outcome)
+    metrics.CRAWL_SECONDS.observe(seconds, type=feed.type)
+    metrics.CRAWL_VIDEOS.inc(result.inserted, result="inserted")
+    metrics.CRAWL_VIDEOS.inc(result.updated, result="updated")
+    metrics.CRAWL_VIDEOS.inc(result.skipped, result="skipped")
+
+    # A JSON object, for log processors to parse
+    LOGGER.info(
+        "Crawled feed %s",
+        json.dumps(
+            {
+                "feed_id": feed.id,
+                "feed": feed.name,
+                "type": feed.type,
+                "outcome": outcome,
+                "seconds": round(seconds, 3),
+                "pages": stats.pages,
+                "requests": dict(stats.requests),
+                "request_seconds": round(stats.request_seconds, 3),
+                "response_bytes": stats.response_bytes,
+                "quota_units": stats.quota_units,
+                "inserted": result.inserted,
+                "updated": result.updated,
+                "skipped": result.skipped,
+            },
+            sort_keys=True,
+        ),
+    )
+
+
+def backfill_subscription(sub, now):
+    """
+    Give a new subscriber of a feed the recent videos already stored for it
+    """
+    link_videos(
+        [sub.id],
+        sub.feed.videos.filter(published_at__gt=now - BACKFILL_PERIOD).values_list(
+            "id", flat=True
+        ),
+    )
+
+
+def crawl_mode(feed, channel_mode):
+    """
+    How a channel feed is crawled: as `channel_mode` says, except that a
+    channel never crawled is backfilled through its uploads playlist, as its
+    Atom feed only lists the latest uploads
+    """
+    if channel_mode == CrawlMode.FEED and feed.last_checked is None:
+        return CrawlMode.UPLOADS
+    return channel_mode
+
+
+def estimate_cost(feed, channel_mode):
+    """
+    Estimate the quota units needed to crawl a feed, assuming a single page of
+    new items
+    """
+    item_type = ItemType.from_(feed.type)
+    if item_type == ItemType.CHANNEL:
+        channel_mode = crawl_mode(feed, channel_mode)
+    if item_type == ItemType.CHANNEL and channel_mode == CrawlMode.SEARCH:
+        return QUOTA_COSTS["search"] + QUOTA_COSTS["videos"]
+    if item_type == ItemType.CHANNEL and channel_mode == CrawlMode.FEED:
+        return QUOTA_COSTS["videos"]
+
+    cost = QUOTA_COSTS["playlistItems"] + QUOTA_COSTS["videos"]
+    if item_type == ItemType.CHANNEL and not feed.uploads_playlist_id:
+        cost += QUOTA_COSTS["channels"]
+    return cost
+
+
+def plan_crawl(feeds, channel_mode, ledger):
+    """
+    Order the feeds so that those never crawled come first, followed by the
+    longest unchecked, and drop any that the remaining quota in the ledger
+    cannot pay for
+    """
+    ordered = sorted(
+        feeds, key=lambda feed: (feed.last_checked is not None, feed.last_checked)
+    )
+    if ledger is None:
+        return ordered
+
+    budget = ledger.remaining()
+    planned = []
+    for feed in ordered:
+        cost = estimate_cost(feed, channel_mode)
+        if cost > budget:
+            LOGGER.warning(
+                "Skipping feed %s, needs %d quota units but %d remain",
+                feed,
+                cost,
+                budget,
+            )
+            continue
+
+        planned.append(feed)
+        budget -= cost
+    return planned
+
+
+def subscribed_feeds(user=None):
+    """
+    The feeds with at least one subscriber, or only those `user` subscribes to
+    """
+    if user is None:
+        return Feed.objects.filter(subscriptions__isnull=False).distinct()
+    return Feed.objects.filter(subscriptions__user=user).distinct()
+
+
 class Crawler:
     """
-    Given a subscription id and type, crawl the videos for that
-    subscription to find any new ones.
+    Given a feed id and type, crawl the videos for that feed to find any new
+    ones, and share them with every subscriber of the feed. A feed followed by
+    several users is crawled once.
+
+    Channels are crawled according to `channel_mode`: by default through the
+    channel's uploads playlist, which is looked up once and stored on the
+    feed, or through the channel's public Atom feed, which costs no quota once
+    the channel has been crawled the first time. Other playlists are synced
+    incrementally, only paging as far as
+    needed to find the items added since the last crawl.
+
+    If the client has a quota ledger, each crawl is planned to fit the
+    remaining daily quota: the most out of date feeds are crawled first, and
+    those the quota cannot cover are skipped until it resets.
+
+    A crawl may be given a timeout, after which the feeds still in progress
+    are abandoned. The pages they committed so far are kept, and their next
+    crawl picks up from the page after.
     """
 
-    def __init__(self, client: YoutubeClient, concurrent: bool = True):
+    def __init__(
+        self,
+        client: YoutubeClient,
+        concurrent: bool = True,
+        channel_mode: CrawlMode = CrawlMode.UPLOADS,
+    ):
         self.client = client
         self.concurrent = concurrent
+        self.channel_mode = channel_mode
         self.pool = ThreadPoolExecutor(20)
 
-    def crawl(self, *, user):
+    def crawl(self, *, user=None, timeout=None):
+        """
+        Go through all of the feeds subscribed to, or only those of `user`,
+        check for latest videos and update, giving up on any not finished
+        within `timeout` seconds
+        """
+        return self.crawl_feeds(list(subscribed_feeds(user)), timeout=timeout)
+
+    def crawl_feeds(self, feeds, timeout=None):
         """
-        Go through all of the subscriptions, check for latest videos
-        and update
+        Check the feeds for latest videos and update, giving up on any not
+        finished within `timeout` seconds. Feeds being crawled at the timeout
+        are given up after the page in progress is committed.
         """
-        subscriptions = Subscription.objects.filter(user__username=user.username).all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        planned = self.plan(feeds)
+
+        planned_ids = {feed.id for feed in planned}
+        result = CrawlResult(
+            pending=[feed for feed in feeds if feed.id not in planned_ids]
+        )
+
         if self.concurrent:
-            for item in self.pool.map(self.crawl_subscription, subscriptions):
-                pass
+            futures = {
+                self.pool.submit(self._crawl_within_limits, feed, deadline): feed
+                for feed in planned
+            }
+            remaining = None if deadline is None else deadline - time.monotonic()
+            (_, not_done) = wait(futures, timeout=remaining)
+            # Cancelling only stops the feeds not started yet. Those being
+            # crawled stop after the page in progress, and are waited for, so
+            # that none is still committing pages once its feed is reported
+            # pending and the caller has put it back in the queue.
+            for future in not_done:
+                future.cancel()
+            wait(not_done)
+
+            for (future, feed) in futures.items():
+                ingested = None if future.cancelled() else future.result()
+                result.add(feed, ingested)
         else:
-            for sub in subscriptions:
-                self.crawl_subscription(sub)
+            for feed in planned:
+                result.add(feed, self._crawl_within_limits(feed, deadline))
+
+        if result.pending:
+            LOGGER.info(
+                "Crawled %d feeds, %d left pending",
+                len(result.completed),
+                len(result.pending),
+            )
+        return result
+
+    def plan(self, feeds):
+        return plan_crawl(feeds, self.channel_mode, self.client.ledger)
+
+    def _crawl_within_limits(self, feed, deadline):
+        """
+        Crawl the feed, returning its `IngestResult` if it completed within the
+        deadline and the quota, without error, or `None` otherwise
+        """
+        try:
+            check_deadline(deadline)
+            return self.crawl_feed(feed, deadline=deadline)
+        except QuotaExhausted:
+            LOGGER.warning("Quota exhausted while crawling feed %s", feed)
+        except CrawlDeadlineExceeded:
+            LOGGER.warning("Deadline passed while crawling feed %s", feed)
+        except Exception:
+            # One broken feed should not hold up the rest
+            LOGGER.exception("Failed to crawl feed %s", feed)
+        return None
+
+    def crawl_feed(self, feed, deadline=None, progress=None):
+        """
+        Crawl the feed a page at a time from its checkpoint, and return the
+        `IngestResult`.
 
-    def crawl_subscription(self, sub):
-        LOGGER.info("Crawling for subscription %s", sub)
+        Each page is committed together with the checkpoint, so if the crawl is
+        interrupted, by the deadline or an error, the next crawl of the feed
+        resumes from the page after the last one committed, over the same
+        period. The deadline is checked after each page, so at least one is
+        committed, and the requests for a page are not retried past it. Counts for the pages committed are added to `progress`, if
+        given, whether or not the crawl finishes.
+        """
+        LOGGER.info("Crawling for feed %s", feed)
         now = timezone.now()
-        if sub.last_checked is None:
-            since = now - timezone.timedelta(days=90)
-        else:
-            since = sub.last_checked
+        result = progress if progress is not None else IngestResult()
+        with recorded_crawl(feed, result) as stats, request_deadline(deadline):
+            start_crawl(feed, now)
+            while True:
+                page = self.fetch_page(
+                    feed, feed.checkpoint_since, feed.checkpoint_page_token
+                )
+                result += commit_page(feed, page)
+                stats.pages += 1
+                if page.next_page_id is None:
+                    break
+                check_deadline(deadline)
+
+            finish_crawl(feed, now)
+        return result
+
+    def fetch_page(self, feed, since, page_id=None):
+        """
+        Fetch a single page of the videos published on the feed after `since`
+        """
+        item_type = ItemType.from_(feed.type)
+        channel_mode = crawl_mode(feed, self.channel_mode)
+        if item_type == ItemType.CHANNEL and channel_mode == CrawlMode.FEED:
+            if page_id is None:
+                state = AtomState.from_json(feed.atom_state)
+                try:
+                    page = self.client.fetch_channel_feed(
+                        channel_id=feed.youtube_id, since=since, state=state
+                    )
+                except FeedIncomplete:
+                    LOGGER.info("Feed %s may be missing videos, crawling uploads", feed)
+                else:
+                    feed.atom_state = state.to_json()
+                    return page
+            # The Atom feed has no further pages, so this crawl falls back to
+            # the uploads playlist, and keeps paging through it
+            channel_mode = CrawlMode.UPLOADS
 
-        item_type = ItemType.from_(sub.type)
-        if item_type == ItemType.CHANNEL:
-            videos = self.client.fetch_latest_from_channel(
-                channel_id=sub.youtube_id, since=since
+        if item_type == ItemType.CHANNEL and channel_mode == CrawlMode.UPLOADS:
+            return self.client.fetch_playlist_page(
+                playlist_id=self.uploads_playlist_id(feed),
+                since=since,
+                page_id=page_id,
+                newest_first=True,
+            )
+        elif item_type == ItemType.CHANNEL:
+            return self.client.fetch_channel_page(
+                channel_id=feed.youtube_id, since=since, page_id=page_id
             )
         elif item_type == ItemType.PLAYLIST:
-            videos = self.client.fetch_latest_from_playlist(
-                playlist_id=sub.youtube_id, since=since
+            state = PlaylistState.from_json(feed.playlist_state)
+            page = self.client.sync_playlist_page(
+                playlist_id=feed.youtube_id, since=since, state=state, page_id=page_id
             )
+            feed.playlist_state = state.to_json()
+            return page
         else:
             raise ValueError(f"Unsupported item type: {item_type}")
 
-        for video in videos:
-            video.subscription = sub
-            try:
-                video.save()
-            except IntegrityError:
-                # Video already exists, so do not bother updating, and silently
-                # skip this
-                continue
-
-        # Finally update the last_checked field
-        sub.last_checked = now
-        sub.save()
+    def uploads_playlist_id(self, feed):
+        """
+        The uploads playlist of a channel feed, looked up once and stored
+        """
+        if not feed.uploads_playlist_id:
+            feed.uploads_playlist_id = self.client.fetch_uploads_playlist_id(
+                feed.youtube_id
+            )
+            feed.save(update_fields=["uploads_playlist_id"])
+        return feed.uploads_playlist_id
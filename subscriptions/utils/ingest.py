@@ -0,0 +1,134 @@
+from dataclasses import dataclass
+from django.db import transaction
+from ..models import Feed, Subscription, SubscriptionVideo, Video
+from .counters import update_counters
+
+# Fields refreshed when a crawled video is already stored, e.g. after the
+# uploader renames it
+UPDATE_FIELDS = ["name", "description", "thumbnail_url", "duration"]
+
+
+@dataclass
+class IngestResult:
+    """
+    Counts of the videos written by an ingest
+    """
+
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    def __add__(self, other):
+        return IngestResult(
+            inserted=self.inserted + other.inserted,
+            updated=self.updated + other.updated,
+            skipped=self.skipped + other.skipped,
+        )
+
+    def __iadd__(self, other):
+        # In place, so that a result passed around to collect progress sees it
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+
+def ingest_videos(feed, videos, batch_size=500):
+    """
+    Store crawled videos for a feed, in batches of `batch_size`, and fan the
+    new ones out to every subscriber of the feed.
+
+    Each batch costs one query to lock the feed against concurrent ingests,
+    one query to find the videos already stored, one bulk insert of the new
+    videos, one bulk insert of their subscriber entries, and at most one bulk
+    update of stored videos whose details have changed, plus an update of the
+    subscribers' counters, all in one transaction. Stored videos that are
+    unchanged are skipped.
+
+    If iterating over `videos` raises, the videos buffered so far are still
+    stored before the exception propagates.
+    """
+    result = IngestResult()
+    batch = []
+    try:
+        for video in videos:
+            batch.append(video)
+            if len(batch) == batch_size:
+                (full, batch) = (batch, [])
+                result += _ingest_batch(feed, full)
+    finally:
+        if batch:
+            result += _ingest_batch(feed, batch)
+    return result
+
+
+def _ingest_batch(feed, batch):
+    # The API can list a video twice, e.g. when it moves between pages
+    videos = {}
+    for video in batch:
+        video.feed = feed
+        videos.setdefault(video.youtube_id, video)
+
+    result = IngestResult(skipped=len(batch) - len(videos))
+    with transaction.atomic():
+        # Concurrent crawls of the feed take turns, so that the videos found
+        # stored are all the videos that exist, and the new ones are counted
+        # exactly
+        Feed.objects.select_for_update().only("id").get(id=feed.id)
+        stored = {
+            video.youtube_id: video
+            for video in Video.objects.filter(feed=feed, youtube_id__in=videos)
+        }
+
+        new = [video for video in videos.values() if video.youtube_id not in stored]
+        Video.objects.bulk_create(new)
+        result.inserted += len(new)
+        if new:
+            link_videos(
+                feed.subscriptions.values_list("id", flat=True),
+                Video.objects.filter(
+                    feed=feed, youtube_id__in=[video.youtube_id for video in new]
+                ).values_list("id", flat=True),
+            )
+
+        changed = []
+        for (youtube_id, existing) in stored.items():
+            video = videos[youtube_id]
+            if all(
+                getattr(existing, field) == getattr(video, field)
+                for field in UPDATE_FIELDS
+            ):
+                result.skipped += 1
+                continue
+
+            for field in UPDATE_FIELDS:
+                setattr(existing, field, getattr(video, field))
+            changed.append(existing)
+
+        Video.objects.bulk_update(changed, UPDATE_FIELDS)
+        result.updated += len(changed)
+        if changed and not new:
+            # A changed duration changes the length of the unwatched videos
+            update_counters(Subscription.objects.filter(feed=feed))
+
+    return result
+
+
+def link_videos(subscription_ids, video_ids):
+    """
+    Add unwatched entries for the videos to the subscriptions, leaving any
+    existing entries as they are, and update the counters of the subscriptions
+    """
+    subscription_ids = list(subscription_ids)
+    video_ids = list(video_ids)
+    # Without a savepoint when ingesting, which is already in a transaction
+    with transaction.atomic(savepoint=False):
+        SubscriptionVideo.objects.bulk_create(
+            [
+                SubscriptionVideo(subscription_id=subscription_id, video_id=video_id)
+                for subscription_id in subscription_ids
+                for video_id in video_ids
+            ],
+            ignore_conflicts=True,
+        )
+        update_counters(Subscription.objects.filter(id__in=subscription_ids))
@@ -0,0 +1,236 @@
+import logging
+import os
+import socket
+import time
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from ..models import CrawlJob, Feed
+from .crawler import Crawler, CrawlDeadlineExceeded
+from .ingest import IngestResult
+
+LOGGER = logging.getLogger("ytvd.subscriptions.utils.jobs")
+
+# How long a worker holds the jobs it claims before other workers may take
+# them over
+LEASE_DURATION = timezone.timedelta(minutes=5)
+
+# Attempts at a job before it is given up on
+MAX_ATTEMPTS = 5
+
+# Delay before the first retry of a job, doubling with every attempt
+RETRY_DELAY = timezone.timedelta(seconds=30)
+
+
+def enqueue(feed, run_after=None):
+    """
+    Queue a crawl of the feed, returning the new job, or the one already
+    queued or running for the feed
+    """
+    try:
+        with transaction.atomic():
+            return CrawlJob.objects.create(
+                feed=feed, run_after=run_after or timezone.now()
+            )
+    except IntegrityError:
+        return CrawlJob.objects.get(feed=feed, status__in=CrawlJob.ACTIVE)
+
+
+def claim(worker, batch_size, lease=LEASE_DURATION):
+    """
+    Lease up to `batch_size` jobs that are ready to run to the worker.
+
+    Jobs locked by a concurrent claim are skipped rather than waited for, so
+    workers never block each other or claim the same job. Running jobs whose
+    lease has expired, because their worker died, are claimed again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            CrawlJob.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("feed")
+            .filter(
+                Q(status=CrawlJob.Status.PENDING, run_after__lte=now)
+                | Q(status=CrawlJob.Status.RUNNING, lease_expires_at__lt=now)
+            )
+            .order_by("run_after")[:batch_size]
+        )
+
+        claimed = []
+        for job in jobs:
+            if job.attempts >= MAX_ATTEMPTS:
+                give_up(job, now)
+                continue
+
+            job.status = CrawlJob.Status.RUNNING
+            job.leased_by = worker
+            job.lease_expires_at = now + lease
+            job.attempts += 1
+            claimed.append(job)
+
+        CrawlJob.objects.bulk_update(
+            jobs, ["status", "leased_by", "lease_expires_at", "attempts", "finished_at"]
+        )
+    return claimed
+
+
+def _leased(job):
+    """
+    The job, if it is still leased to the worker that claimed it
+    """
+    return CrawlJob.objects.filter(
+        id=job.id, status=CrawlJob.Status.RUNNING, leased_by=job.leased_by
+    )
+
+
+def complete(job, videos_added=0):
+    """
+    Mark a claimed job done, returning `False` if its lease was lost
+    """
+    return bool(
+        _leased(job).update(
+            status=CrawlJob.Status.DONE,
+            finished_at=timezone.now(),
+            videos_added=videos_added,
+        )
+    )
+
+
+def release(job):
+    """
+    Put a claimed job that is making progress back in the queue, to be
+    continued straight away. Returns `False` if its lease was lost.
+    """
+    return bool(
+        _leased(job).update(
+            videos_added=job.videos_added,
+            status=CrawlJob.Status.PENDING,
+            run_after=timezone.now(),
+            lease_expires_at=None,
+            attempts=0,
+        )
+    )
+
+
+def retry(job):
+    """
+    Put a claimed job back in the queue after a delay growing with each
+    attempt, or give up on it once it runs out of attempts. Returns `False` if
+    its lease was lost.
+    """
+    now = timezone.now()
+    if job.attempts >= MAX_ATTEMPTS:
+        with transaction.atomic():
+            leased = _leased(job).select_for_update().first()
+            if leased is not None:
+                give_up(leased, now)
+                leased.save()
+            return leased is not None
+
+    return bool(
+        _leased(job).update(
+            videos_added=job.videos_added,
+            status=CrawlJob.Status.PENDING,
+            run_after=now + RETRY_DELAY * 2 ** (job.attempts - 1),
+            lease_expires_at=None,
+        )
+    )
+
+
+def give_up(job, now):
+    """
+    Mark the job failed, and leave its feed alone until the scheduler's longest
+    polling interval has passed
+    """
+    LOGGER.warning("Giving up on %s after %d attempts", job, job.attempts)
+    job.status = CrawlJob.Status.FAILED
+    job.finished_at = now
+    Feed.objects.filter(id=job.feed_id).update(
+        next_check_at=now + timezone.timedelta(seconds=settings.CRAWL_MAX_INTERVAL)
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CrawlWorker:
+    """
+    Claims batches of queued crawl jobs and crawls their feeds.
+
+    Any number of workers, on any number of hosts, can share the queue. Each
+    batch is crawled within most of the lease, so that a job is only taken
+    over by another worker if its worker has died or stalled; jobs that fail
+    or run out of time or quota are retried later.
+    """
+
+    def __init__(
+        self,
+        crawler: Crawler,
+        name: str = None,
+        batch_size: int = 10,
+        lease: timezone.timedelta = LEASE_DURATION,
+    ):
+        self.crawler = crawler
+        self.name = name if name is not None else worker_name()
+        self.batch_size = batch_size
+        self.lease = lease
+
+    def run_once(self):
+        """
+        Claim and crawl a batch of jobs, returning how many were claimed
+        """
+        jobs = claim(self.name, self.batch_size, self.lease)
+        if not jobs:
+            return 0
+
+        deadline = time.monotonic() + 0.8 * self.lease.total_seconds()
+        # A feed's first crawl can page through months of uploads, so rather
+        # than count against the job's attempts, running out of time on one
+        # puts it back in the queue to be resumed
+        crawls = [job for job in jobs if job.feed.last_checked is not None]
+        first_crawls = [job for job in jobs if job.feed.last_checked is None]
+
+        if crawls:
+            self.crawl(crawls, deadline)
+        for job in first_crawls:
+            if not self.crawl_paged(job, deadline):
+                LOGGER.warning("Lease on %s expired before it was finished", job)
+        return len(jobs)
+
+    def crawl(self, jobs, deadline):
+        result = self.crawler.crawl_feeds(
+            [job.feed for job in jobs], timeout=deadline - time.monotonic()
+        )
+        completed = {feed.id for feed in result.completed}
+        for job in jobs:
+            if job.feed_id in completed:
+                ingested = result.ingested.get(job.feed_id)
+                finished = complete(job, ingested.inserted if ingested else 0)
+            else:
+                finished = retry(job)
+
+            if not finished:
+                LOGGER.warning("Lease on %s expired before it was finished", job)
+
+    def crawl_paged(self, job, deadline):
+        """
+        Crawl the job's feed, which resumes from the feed's checkpoint.
+
+        If the deadline passes the job goes back in the queue to be continued,
+        and if a page fails it is retried. Returns `False` if the job's lease
+        was lost.
+        """
+        progress = IngestResult()
+        try:
+            self.crawler.crawl_feed(job.feed, deadline=deadline, progress=progress)
+        except CrawlDeadlineExceeded:
+            job.videos_added += progress.inserted
+            return release(job)
+        except Exception:
+            LOGGER.exception("Failed to crawl %s", job)
+            job.videos_added += progress.inserted
+            return retry(job)
+
+        return complete(job, job.videos_added + progress.inserted)
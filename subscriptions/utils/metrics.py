@@ -0,0 +1,255 @@
+"""
+Counters and histograms describing crawls and the requests they make to the
+Youtube API, exposed in the Prometheus text format.
+
+Metrics are kept in memory by each process: the web app serves its own on
+`/metrics`, and a crawl worker serves its own when given a `--metrics-port`.
+
+Requests made while a feed is crawled are also added up in the `CrawlStats`
+of that crawl, so that they can be logged with it.
+"""
+import bisect
+import collections
+import contextvars
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Counter as CounterType
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """
+    A metric with a value for every combination of its label values
+    """
+
+    type = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for (k, v) in pairs) + "}"
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self.lock:
+            for key in sorted(self.values):
+                lines.extend(self._render_value(key, self.values[key]))
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def value(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def _render_value(self, key, value):
+        yield f"{self.name}{self._format_labels(key)} {value}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    # Upper bounds, spanning a quick API request to a long crawl in seconds
+    BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, name, description, labels=(), buckets=BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            # A count per bucket, the last for values above every bound, and
+            # the sum of the values
+            (counts, total) = self.values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        (counts, _) = self.values.get(self._key(labels), ([], 0))
+        return sum(counts)
+
+    def _render_value(self, key, value):
+        (counts, total) = value
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        cumulative = 0
+        for (bound, count) in zip(bounds, counts):
+            cumulative += count
+            labels = self._format_labels(key, [("le", bound)])
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        yield f"{self.name}_sum{self._format_labels(key)} {total}"
+        yield f"{self.name}_count{self._format_labels(key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Every metric in the Prometheus text format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(
+    Counter(
+        "youtube_requests_total",
+        "Requests made to the Youtube API, by endpoint and response status",
+        ["endpoint", "status"],
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "youtube_request_duration_seconds",
+        "Time taken by requests to the Youtube API",
+        ["endpoint"],
+    )
+)
+RESPONSE_BYTES = REGISTRY.register(
+    Counter(
+        "youtube_response_bytes_total",
+        "Bytes received in responses from the Youtube API",
+        ["endpoint"],
+    )
+)
+QUOTA_UNITS = REGISTRY.register(
+    Counter(
+        "youtube_quota_units_total",
+        "Youtube API quota units spent",
+        ["endpoint"],
+    )
+)
+CRAWLS = REGISTRY.register(
+    Counter(
+        "crawl_feeds_total",
+        "Crawls of feeds, by whether they completed, ran out of time or failed",
+        ["outcome"],
+    )
+)
+CRAWL_SECONDS = REGISTRY.register(
+    Histogram(
+        "crawl_feed_duration_seconds",
+        "Time taken to crawl a feed",
+        ["type"],
+    )
+)
+CRAWL_VIDEOS = REGISTRY.register(
+    Counter(
+        "crawl_videos_total",
+        "Videos found by crawls, by whether they were inserted, updated or skipped",
+        ["result"],
+    )
+)
+
+
+@dataclass
+class CrawlStats:
+    """
+    The requests made on behalf of a single crawl of a feed
+    """
+
+    pages: int = 0
+    requests: CounterType[str] = field(default_factory=collections.Counter)
+    request_seconds: float = 0.0
+    response_bytes: int = 0
+    quota_units: int = 0
+
+
+_current_crawl = contextvars.ContextVar("current_crawl", default=None)
+
+
+@contextmanager
+def crawl_stats():
+    """
+    Collect the requests made within the block, in this thread or task, in a
+    new `CrawlStats`
+    """
+    stats = CrawlStats()
+    token = _current_crawl.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_crawl.reset(token)
+
+
+def record_request(endpoint, status, seconds, size):
+    REQUESTS.inc(endpoint=endpoint, status=status)
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+    RESPONSE_BYTES.inc(size, endpoint=endpoint)
+
+    stats = _current_crawl.get()
+    if stats is not None:
+        stats.requests[endpoint] += 1
+        stats.request_seconds += seconds
+        stats.response_bytes += size
+
+
+def record_quota(endpoint, units):
+    QUOTA_UNITS.inc(units, endpoint=endpoint)
+
+    stats = _current_crawl.get()
+    if stats is not None:
+        stats.quota_units += units
+
+
+def serve(port, registry=REGISTRY):
+    """
+    Serve the metrics over HTTP on `port` from a background thread, for
+    processes other than the web app
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            payload = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,128 @@
+import logging
+import pytz
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import QuotaDay, QuotaUsage
+
+LOGGER = logging.getLogger("ytvd.subscriptions.utils.quota")
+
+# Cost in quota units of a single request to each endpoint
+# https://developers.google.com/youtube/v3/determine_quota_cost
+QUOTA_COSTS = {
+    "search": 100,
+    "channels": 1,
+    "playlistItems": 1,
+    "playlists": 1,
+    "videos": 1,
+}
+
+# The quota resets at midnight Pacific time
+QUOTA_TIMEZONE = pytz.timezone("America/Los_Angeles")
+
+
+class QuotaExhausted(Exception):
+    """
+    Raised instead of making a request that the remaining quota cannot pay for
+    """
+
+
+class QuotaLedger:
+    """
+    Tracks the Youtube API quota spent today in the `QuotaDay` table, and the
+    share of each endpoint in the `QuotaUsage` table.
+
+    The ledger is stored in the database so that every process sharing the
+    API key sees the same remaining budget.
+    """
+
+    def __init__(self, daily_limit=None):
+        if daily_limit is None:
+            daily_limit = settings.YOUTUBE_DAILY_QUOTA
+        self.daily_limit = daily_limit
+
+    @staticmethod
+    def cost(url):
+        """
+        Return the endpoint name and the unit cost of a request to `url`
+        """
+        endpoint = url.rstrip("/").rsplit("/", 1)[-1]
+        return endpoint, QUOTA_COSTS.get(endpoint, 1)
+
+    @staticmethod
+    def today():
+        return timezone.localtime(timezone.now(), QUOTA_TIMEZONE).date()
+
+    def used(self):
+        units = (
+            QuotaDay.objects.filter(date=self.today())
+            .values_list("units", flat=True)
+            .first()
+        )
+        return units or 0
+
+    def remaining(self):
+        return max(self.daily_limit - self.used(), 0)
+
+    def charge(self, endpoint, units):
+        """
+        Charge `units` against the endpoint, raising `QuotaExhausted` if the
+        remaining quota cannot cover them
+        """
+        date = self.today()
+        with transaction.atomic():
+            # The first charge of the day creates the day's row
+            if not self._spend(date, units):
+                QuotaDay.objects.get_or_create(date=date)
+                if not self._spend(date, units):
+                    raise QuotaExhausted(
+                        f"Cannot spend {units} units on {endpoint}, "
+                        "daily quota used up"
+                    )
+            self._record(date, endpoint, units)
+
+    def _spend(self, date, units):
+        """
+        Add `units` to the day's total if they fit in the daily limit, in a
+        single conditional update, and return whether they did
+        """
+        return QuotaDay.objects.filter(
+            date=date, units__lte=self.daily_limit - units
+        ).update(units=F("units") + units)
+
+    @staticmethod
+    def _record(date, endpoint, units):
+        updated = QuotaUsage.objects.filter(date=date, endpoint=endpoint).update(
+            units=F("units") + units
+        )
+        if updated:
+            return
+
+        try:
+            with transaction.atomic():
+                QuotaUsage.objects.create(date=date, endpoint=endpoint, units=units)
+        except IntegrityError:
+            # Another process created today's row first
+            QuotaUsage.objects.filter(date=date, endpoint=endpoint).update(
+                units=F("units") + units
+            )
+
+    def exhaust(self):
+        """
+        Record that the API reported the quota as used up, so no more
+        requests are attempted until the quota resets
+        """
+        date = self.today()
+        with transaction.atomic():
+            (day, _) = QuotaDay.objects.select_for_update().get_or_create(date=date)
+            remaining = self.daily_limit - day.units
+            if remaining <= 0:
+                return
+
+            LOGGER.warning(
+                "API reported quota exhausted with %d units unaccounted for",
+                remaining,
+            )
+            QuotaDay.objects.filter(id=day.id).update(units=self.daily_limit)
+            self._record(date, "unaccounted", remaining)
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens accumulate at `rate` per second up to `capacity`, and each request
+    takes one. A request arriving at an empty bucket reserves the next token
+    to become available, so concurrent callers are spaced out evenly rather
+    than all retrying at once.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token, returning the number of seconds the caller must wait
+        before using it
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            # Tokens may go negative, representing reservations of future
+            # tokens by callers that are still waiting
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """
+        Block until a token is available, returning the time spent waiting
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,51 @@
+import hashlib
+from django.core.cache import caches
+
+
+class ResponseCache:
+    """
+    Stores Youtube API responses alongside their ETags, so that unchanged
+    responses can be revalidated with a conditional request rather than
+    downloaded and parsed again.
+
+    Entries live in the "youtube" Django cache, which is shared by every
+    process and bounded by its `MAX_ENTRIES` option.
+    """
+
+    # Only the first pages of playlists are requested again, on every crawl
+    # of their feeds. Later pages, video lookups by id, and searches for the
+    # videos published after a time that moves with every crawl are hardly
+    # ever repeated, so caching them would only add database writes.
+    CACHED_ENDPOINTS = {"playlistItems"}
+
+    def __init__(self, cache=None):
+        if cache is None:
+            cache = caches["youtube"]
+        self.cache = cache
+
+    @staticmethod
+    def key(url, params):
+        """
+        Cache key for a request, ignoring the API key so that it survives key
+        rotation
+        """
+        params = sorted((name, str(value)) for (name, value) in (params or {}).items())
+        fingerprint = repr((url, [param for param in params if param[0] != "key"]))
+        return "response:" + hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def cacheable(cls, url, params):
+        """
+        Whether the response to a request is worth caching
+        """
+        endpoint = url.rstrip("/").rsplit("/", 1)[-1]
+        return endpoint in cls.CACHED_ENDPOINTS and "pageToken" not in (params or {})
+
+    def get(self, url, params):
+        """
+        Return the `(etag, data)` pair stored for a request, or `None`
+        """
+        return self.cache.get(self.key(url, params))
+
+    def set(self, url, params, etag, data):
+        self.cache.set(self.key(url, params), (etag, data))
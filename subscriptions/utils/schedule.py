@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+from ..models import CrawlJob, Feed
+
+# Number of recent uploads used to estimate how often a feed posts
+HISTORY = 10
+
+# Polls per expected upload, so that new videos show up a fraction of an
+# upload interval after they are published
+POLLS_PER_UPLOAD = 4
+
+
+def poll_interval(published, now, min_interval=None, max_interval=None):
+    """
+    How long to wait before polling a feed again, given the publish times of
+    its most recent videos.
+
+    The expected time between uploads is the time since the oldest of them
+    divided by their number. Counting up to `now` rather than to the newest
+    upload means a feed that stops posting is polled less and less often.
+    """
+    if min_interval is None:
+        min_interval = timezone.timedelta(seconds=settings.CRAWL_MIN_INTERVAL)
+    if max_interval is None:
+        max_interval = timezone.timedelta(seconds=settings.CRAWL_MAX_INTERVAL)
+
+    if not published:
+        return max_interval
+
+    upload_interval = (now - min(published)) / len(published)
+    return min(max(upload_interval / POLLS_PER_UPLOAD, min_interval), max_interval)
+
+
+def schedule_next_check(feed, now):
+    """
+    Set when the feed is next due to be crawled, from its recent uploads.
+
+    Feeds pushed by the WebSub hub are only polled as a fallback, at the
+    longest interval.
+    """
+    if feed.push_expires_at is not None and feed.push_expires_at > now:
+        feed.next_check_at = now + timezone.timedelta(
+            seconds=settings.CRAWL_MAX_INTERVAL
+        )
+        return
+
+    published = list(
+        feed.videos.order_by("-published_at").values_list("published_at", flat=True)[
+            :HISTORY
+        ]
+    )
+    feed.next_check_at = now + poll_interval(published, now)
+
+
+def unqueued_feeds():
+    """
+    The subscribed feeds without a crawl job queued or running
+    """
+    return (
+        Feed.objects.filter(subscriptions__isnull=False)
+        .exclude(crawl_jobs__status__in=CrawlJob.ACTIVE)
+        .distinct()
+    )
+
+
+def due_feeds(now):
+    """
+    The subscribed feeds due to be crawled, that are not queued already
+    """
+    return unqueued_feeds().filter(
+        Q(next_check_at__isnull=True) | Q(next_check_at__lte=now)
+    )
+
+
+def next_due_at():
+    """
+    The earliest time a subscribed feed that is not queued becomes due, or
+    `None` if there are none
+    """
+    return unqueued_feeds().aggregate(next_due_at=Min("next_check_at"))["next_due_at"]
@@ -0,0 +1,77 @@
+import hashlib
+import time
+import unicodedata
+from django.core.cache import caches
+
+
+class SearchCache:
+    """
+    Caches the results of searching Youtube, keyed on the normalised search
+    term, as each search costs 100 quota units.
+
+    Results are held in two tiers:
+
+    * the "search" Django cache, stored in the database and shared by every
+      process, and
+    * the "search-local" Django cache, an in-process LRU cache of the most
+      recently used results, so repeated searches skip the database as well.
+
+    Both tiers expire an entry `timeout` seconds after it was searched for.
+    """
+
+    def __init__(self, shared=None, local=None, timeout=None):
+        self.shared = shared if shared is not None else caches["search"]
+        self.local = local if local is not None else caches["search-local"]
+        self.timeout = timeout if timeout is not None else self.shared.default_timeout
+
+    @staticmethod
+    def normalize(term):
+        """
+        Reduce search terms differing only in case, unicode form or whitespace
+        to the same term
+        """
+        return " ".join(unicodedata.normalize("NFKC", term).casefold().split())
+
+    @staticmethod
+    def key(term):
+        return "search:" + hashlib.sha1(term.encode("utf-8")).hexdigest()
+
+    def get(self, term):
+        """
+        Return the cached search items for a normalised term, or `None`
+        """
+        key = self.key(term)
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self.shared.get(key)
+            if entry is None:
+                return None
+            self._set_local(key, entry)
+
+        (expires_at, items) = entry
+        if expires_at <= time.time():
+            return None
+        return items
+
+    def set(self, term, items):
+        key = self.key(term)
+        entry = (time.time() + self.timeout, items)
+        self.shared.set(key, entry, self.timeout)
+        self._set_local(key, entry)
+
+    def _set_local(self, key, entry):
+        # Never keep an entry locally for longer than it is valid
+        remaining = entry[0] - time.time()
+        if remaining > 0:
+            self.local.set(key, entry, remaining)
+
+    def search(self, client, term):
+        """
+        Search Youtube for a term through the cache
+        """
+        term = self.normalize(term)
+        items = self.get(term)
+        if items is None:
+            items = list(client.search(term=term))
+            self.set(term, items)
+        return items
@@ -1,6 +1,7 @@
 import enum
-from dataclasses import dataclass
-from typing import Optional
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
 
 class ItemType(enum.Enum):
@@ -20,6 +21,23 @@ class ItemType(enum.Enum):
             raise ValueError(f"Invalid item type: {value}")
 
 
+class CrawlMode(enum.Enum):
+    """
+    How the videos of a channel subscription are discovered.
+
+    * `SEARCH` queries the search endpoint (100 quota units per page)
+    * `UPLOADS` pages through the channel's uploads playlist (1 unit per page)
+    * `FEED` reads the channel's public Atom feed (no quota), only looking up
+      the durations of new videos (1 unit per 50 videos). The feed lists the
+      15 latest uploads, so the first crawl of a channel goes through its
+      uploads playlist instead.
+    """
+
+    SEARCH = "search"
+    UPLOADS = "uploads"
+    FEED = "feed"
+
+
 @dataclass
 class Thumbnail:
     url: str
@@ -35,3 +53,113 @@ class SearchItem:
     thumbnail: Thumbnail
     channel_title: str
     item_type: ItemType
+
+
+@dataclass
+class Page:
+    """
+    A page of videos, and the id of the next page if there is one to fetch
+    """
+
+    videos: List
+    next_page_id: Optional[str] = None
+
+
+@dataclass
+class PlaylistState:
+    """
+    What an incremental sync of a playlist remembers between crawls: the ETag
+    of the playlist's first page, how many items the playlist has, and a short
+    hash of each of its items, in playlist order, concatenated. `synced` holds
+    the hashes of the items on the pages a sync in progress has fetched.
+    """
+
+    # Hex digits of the hash of an item id, enough to tell apart the items of
+    # a playlist in a fifth of the space of the ids
+    HASH_LENGTH = 8
+
+    etag: Optional[str] = None
+    item_count: int = 0
+    item_hashes: str = ""
+    synced: str = ""
+
+    @classmethod
+    def hash_item(cls, item_id):
+        return hashlib.blake2b(
+            item_id.encode(), digest_size=cls.HASH_LENGTH // 2
+        ).hexdigest()
+
+    @classmethod
+    def split(cls, hashes):
+        return [
+            hashes[i : i + cls.HASH_LENGTH]
+            for i in range(0, len(hashes), cls.HASH_LENGTH)
+        ]
+
+    @classmethod
+    def from_json(cls, data):
+        if not data or "item_hashes" not in data:
+            # Nothing, or the item ids of an older sync, which the next sync
+            # replaces by paging through the playlist once
+            return cls()
+
+        return cls(
+            etag=data["etag"],
+            item_count=data["item_count"],
+            item_hashes=data["item_hashes"],
+            synced=data["synced"],
+        )
+
+    def to_json(self):
+        return {
+            "etag": self.etag,
+            "item_count": self.item_count,
+            "item_hashes": self.item_hashes,
+            "synced": self.synced,
+        }
+
+
+@dataclass
+class AtomState:
+    """
+    Validators of the last response for a channel's Atom feed, to make the
+    next request for it conditional
+    """
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data):
+        if not data:
+            return cls()
+        return cls(etag=data["etag"], last_modified=data["last_modified"])
+
+    def to_json(self):
+        return {"etag": self.etag, "last_modified": self.last_modified}
+
+
+@dataclass
+class CrawlResult:
+    """
+    The outcome of crawling a set of feeds.
+
+    `pending` feeds were not refreshed, because the crawl ran out of time or
+    quota, and are left for the next crawl. `ingested` maps the id of each
+    completed feed to the `IngestResult` of storing its videos.
+    """
+
+    completed: List = field(default_factory=list)
+    pending: List = field(default_factory=list)
+    ingested: Dict = field(default_factory=dict)
+
+    def add(self, feed, ingested):
+        """
+        Record the outcome of crawling a feed, completed if it has an
+        `IngestResult`
+        """
+        if ingested is None:
+            self.pending.append(feed)
+        else:
+            self.completed.append(feed)
+            self.ingested[feed.id] = ingested
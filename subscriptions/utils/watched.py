@@ -0,0 +1,33 @@
+from django.db import transaction
+from ..models import Subscription, SubscriptionVideo
+from .counters import update_counters
+
+
+def mark_watched(user, *, subscription_id=None, before=None, video_ids=None):
+    """
+    Mark the user's unwatched videos watched, in a single UPDATE, and return
+    how many were marked. The counters of the subscriptions affected are
+    updated in the same transaction.
+
+    The videos can be narrowed down to those of a subscription, those
+    published before `before`, and those in `video_ids`, in any combination.
+    """
+    entries = SubscriptionVideo.objects.filter(subscription__user=user, watched=False)
+    if subscription_id is not None:
+        entries = entries.filter(subscription_id=subscription_id)
+    if before is not None:
+        entries = entries.filter(video__published_at__lt=before)
+    if video_ids is not None:
+        entries = entries.filter(video_id__in=video_ids)
+
+    with transaction.atomic():
+        if subscription_id is not None:
+            affected = [subscription_id]
+        else:
+            affected = list(
+                entries.order_by().values_list("subscription_id", flat=True).distinct()
+            )
+        marked = entries.update(watched=True)
+        if marked:
+            update_counters(Subscription.objects.filter(id__in=affected))
+    return marked
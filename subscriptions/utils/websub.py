@@ -0,0 +1,186 @@
+"""
+Push notifications of new uploads, through Youtube's WebSub (PubSubHubbub) hub.
+
+Each subscribed channel feed asks the hub to call back with an Atom
+notification whenever the channel uploads or updates a video. The hub first
+verifies the request by calling back with a challenge, which is when the lease
+starts, and leases have to be renewed before they expire.
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+import requests
+from django.conf import settings
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from ..models import Feed
+from .atom import parse_entries
+from .crawler import BACKFILL_PERIOD
+from .ingest import IngestResult, ingest_videos
+
+LOGGER = logging.getLogger("ytvd.subscriptions.utils.websub")
+
+TOPIC_URL = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={}"
+
+# Leases are renewed when they are due to expire within this long
+RENEW_MARGIN = timezone.timedelta(days=1)
+
+# How long the hub has to verify a request made to it
+VERIFY_WINDOW = timezone.timedelta(hours=1)
+
+# Signature methods the hub may use in the `X-Hub-Signature` header
+SIGNATURE_METHODS = {"sha1": hashlib.sha1, "sha256": hashlib.sha256}
+
+
+def topic_url(feed):
+    return TOPIC_URL.format(feed.youtube_id)
+
+
+def callback_url(feed):
+    return settings.WEBSUB_CALLBACK_BASE_URL.rstrip("/") + reverse(
+        "websub-callback", args=[feed.id]
+    )
+
+
+def request_subscription(feed, mode="subscribe"):
+    """
+    Ask the hub to subscribe the feed's callback to its channel's uploads, or
+    to unsubscribe it
+    """
+    if not feed.push_secret:
+        feed.push_secret = secrets.token_hex(20)
+    # Recorded first, as the hub may verify the request before responding
+    feed.push_requested_mode = mode
+    feed.push_requested_at = timezone.now()
+    feed.save(update_fields=["push_secret", "push_requested_mode", "push_requested_at"])
+
+    response = requests.post(
+        settings.WEBSUB_HUB_URL,
+        data={
+            "hub.callback": callback_url(feed),
+            "hub.topic": topic_url(feed),
+            "hub.mode": mode,
+            "hub.verify": "async",
+            "hub.secret": feed.push_secret,
+            "hub.lease_seconds": settings.WEBSUB_LEASE_SECONDS,
+        },
+        timeout=settings.YOUTUBE_TIMEOUT,
+    )
+    response.raise_for_status()
+
+
+def feeds_to_renew(now):
+    """
+    The subscribed channel feeds without a lease, or with one about to expire
+    """
+    return (
+        Feed.objects.filter(type="ItemType.CHANNEL", subscriptions__isnull=False)
+        .filter(
+            Q(push_expires_at__isnull=True) | Q(push_expires_at__lte=now + RENEW_MARGIN)
+        )
+        .distinct()
+    )
+
+
+def renew_leases(now):
+    """
+    Request a new lease for every feed that needs one, returning how many were
+    requested
+    """
+    requested = 0
+    for feed in feeds_to_renew(now):
+        try:
+            request_subscription(feed)
+        except requests.RequestException:
+            LOGGER.exception("Failed to renew the push subscription of %s", feed)
+            continue
+        requested += 1
+    return requested
+
+
+def verify_intent(feed, params, now):
+    """
+    Check a verification request from the hub against the feed, recording the
+    lease it grants, and return the challenge to echo back, or `None` if the
+    request is not one the feed made.
+
+    Only the request the feed made last is verified, within `VERIFY_WINDOW` of
+    making it, so that nobody else can set or clear the feed's lease.
+    """
+    if params.get("hub.topic") != topic_url(feed) or "hub.challenge" not in params:
+        return None
+
+    mode = params.get("hub.mode")
+    if (
+        mode != feed.push_requested_mode
+        or feed.push_requested_at is None
+        or feed.push_requested_at < now - VERIFY_WINDOW
+    ):
+        return None
+
+    if mode == "subscribe":
+        if not feed.subscriptions.exists():
+            # Nobody follows the feed any more
+            return None
+        try:
+            lease_seconds = int(
+                params.get("hub.lease_seconds", settings.WEBSUB_LEASE_SECONDS)
+            )
+        except ValueError:
+            return None
+        # The hub may grant a shorter lease than asked for, but not a longer one
+        lease_seconds = min(max(lease_seconds, 1), settings.WEBSUB_LEASE_SECONDS)
+        feed.push_expires_at = now + timezone.timedelta(seconds=lease_seconds)
+    elif mode == "unsubscribe":
+        feed.push_expires_at = None
+    else:
+        return None
+
+    feed.push_requested_mode = ""
+    feed.push_requested_at = None
+    feed.save(
+        update_fields=["push_expires_at", "push_requested_mode", "push_requested_at"]
+    )
+    return params["hub.challenge"]
+
+
+def verify_signature(secret, body, header):
+    """
+    Whether the `X-Hub-Signature` header is the HMAC of the body under the
+    feed's secret, which only the hub knows
+    """
+    if not secret or not header or "=" not in header:
+        return False
+
+    (method, signature) = header.split("=", 1)
+    if method not in SIGNATURE_METHODS:
+        return False
+
+    digest = hmac.new(secret.encode(), body, SIGNATURE_METHODS[method]).hexdigest()
+    return hmac.compare_digest(digest, signature)
+
+
+def ingest_notification(feed, body, client, now):
+    """
+    Store the videos a notification announces for the feed, looking them up
+    in batches through `client`, and return the `IngestResult`.
+
+    Notifications also announce edits to old videos, so only videos published
+    within the backfill period are stored.
+    """
+    video_ids = [
+        entry.video_id
+        for entry in parse_entries(body)
+        if entry.channel_id == feed.youtube_id
+        and entry.published_at > now - BACKFILL_PERIOD
+    ]
+    if not video_ids:
+        return IngestResult()
+
+    result = ingest_videos(feed, client.fetch_videos(*video_ids))
+    LOGGER.info(
+        "Feed %s: %d videos pushed, %d inserted", feed, len(video_ids), result.inserted
+    )
+    return result
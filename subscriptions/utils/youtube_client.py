@@ -1,26 +1,67 @@
+import collections
+import contextvars
+import random
 import requests
 import re
 import logging
+import threading
+import time as clock
 from ..models import Video
-from .types import ItemType, Thumbnail, SearchItem
+from .atom import EntryParser
+from .types import ItemType, Page, Thumbnail, SearchItem
+from . import metrics
+from .quota import QuotaExhausted, QuotaLedger
 from django.utils.dateparse import parse_datetime
+from contextlib import contextmanager
 from datetime import time
 
 
 LOGGER = logging.getLogger("ytvd.subscriptions.utils.youtube_client")
 
 
-class YoutubeClient(object):
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def request_deadline(deadline):
     """
-    Provides an abstraction over the Youtube API.
+    Keep the requests made within the block, in this thread or task, from
+    running or retrying past the `time.monotonic` deadline, if one is given
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
 
-    This object decouples the domain models from the Youtube API. It supports
-    the following methods:
 
-    * Search Youtube for either the channel or playlist with the given name
-    * Fetch new items (videos) since a specified time
+class FeedIncomplete(Exception):
+    """
+    Raised when a channel's Atom feed may not list every video published since
+    the last crawl
+    """
+
+
+class BaseYoutubeClient(object):
+    """
+    Request building and response parsing shared by the blocking and asyncio
+    Youtube clients.
+
+    None of these methods talk to the API, so the two clients only differ in
+    how they make requests and drive the pagination.
     """
 
+    BASE_URL = "https://www.googleapis.com/youtube/v3"
+
+    # Public Atom feeds of channels, outside the Data API and its quota
+    FEEDS_URL = "https://www.youtube.com/feeds/videos.xml"
+
+    # Bytes of an Atom feed read at a time
+    FEED_CHUNK_SIZE = 8192
+
+    # Latest uploads listed in a channel's Atom feed
+    FEED_LENGTH = 15
+
     duration_re = re.compile(
         r"""
         (
@@ -36,25 +77,193 @@ class YoutubeClient(object):
         re.VERBOSE,
     )
 
-    def __init__(self, api_key):
+    # The `videos` endpoint accepts at most this many ids per request
+    MAX_VIDEO_IDS = 50
+
+    # Error reasons returned with a 403 once the daily quota is used up
+    QUOTA_ERROR_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+
+    # Responses worth retrying after a backoff: transient server errors, and
+    # rate limiting (which the API reports as either a 429 or a 403)
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    RATE_LIMIT_ERROR_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+    def __init__(
+        self,
+        api_key,
+        ledger=None,
+        cache=None,
+        rate_limiter=None,
+        max_retries=5,
+        backoff=0.5,
+        max_backoff=32.0,
+        timeout=(3.05, 10.0),
+        base_url=BASE_URL,
+        feeds_url=FEEDS_URL,
+    ):
         self.api_key = api_key
-        self.session = requests.Session()
-        # TODO: add any request parameters
+        self.search_url = f"{base_url}/search"
+        self.channels_url = f"{base_url}/channels"
+        self.playlist_items_url = f"{base_url}/playlistItems"
+        self.videos_url = f"{base_url}/videos"
+        self.feeds_url = feeds_url
+        # (connect, read) timeouts in seconds for each request
+        self.timeout = timeout
+        self.ledger = ledger
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Counters describing the requests made, e.g. cache hits
+        self.stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, value=1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _caches(self, url, params, etag):
+        """
+        Whether the response to a request goes through the response cache: not
+        if the caller revalidates it with its own `etag`, nor if it is unlikely
+        to be requested again
+        """
+        return (
+            self.cache is not None
+            and etag is None
+            and self.cache.cacheable(url, params)
+        )
 
-    def _fetch(self, url, *, params=None):
+    def _cached_response(self, url, params):
         """
-        Helper method for fetching data from the Youtube API. This:
+        Return the `(etag, data)` pair stored for the request in the response
+        cache, if any
+        """
+        return self.cache.get(url, params)
 
-        * provides a mocking point for testing the rest of the API, and
-        * unifies request making
+    def _conditional_headers(self, cached, etag=None):
+        if cached is not None:
+            return {"If-None-Match": cached[0]}
+        if etag is not None:
+            return {"If-None-Match": etag}
+        return {}
+
+    def _cache_hit(self, cached):
         """
-        response = self.session.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        The cached response was confirmed to be unchanged by a 304 response
+        """
+        self._count("cache_hits")
+        return cached[1]
 
-    def search(self, term):
-        url = "https://www.googleapis.com/youtube/v3/search"
-        params = {
+    def _store_response(self, url, params, etag, data):
+        self._count("cache_misses")
+        if etag:
+            self.cache.set(url, params, etag, data)
+
+    def _charge(self, url):
+        """
+        Charge the cost of a request to `url` to the quota ledger, if any, and
+        record it in the metrics
+        """
+        (endpoint, units) = QuotaLedger.cost(url)
+        if self.ledger is not None:
+            self.ledger.charge(endpoint, units)
+        metrics.record_quota(endpoint, units)
+
+    @staticmethod
+    def _endpoint(url):
+        return url.rstrip("/").rsplit("/", 1)[-1]
+
+    @staticmethod
+    def _error_reasons(data):
+        """
+        The reasons given in the body of an API error response
+        """
+        if not isinstance(data, dict):
+            return set()
+
+        errors = data.get("error", {}).get("errors", [])
+        return {error.get("reason") for error in errors}
+
+    def _check_quota_error(self, status, data):
+        """
+        Raise `QuotaExhausted` if the response reports that the daily quota is
+        used up, recording this in the quota ledger
+        """
+        if status != 403:
+            return
+
+        if self._error_reasons(data) & self.QUOTA_ERROR_REASONS:
+            if self.ledger is not None:
+                self.ledger.exhaust()
+            raise QuotaExhausted("Youtube API reported the daily quota used up")
+
+    def _should_retry(self, status, data, attempt):
+        if attempt >= self.max_retries:
+            return False
+
+        if status in self.RETRY_STATUSES:
+            return True
+        return status == 403 and bool(
+            self._error_reasons(data) & self.RATE_LIMIT_ERROR_REASONS
+        )
+
+    # Shortest read timeout a request is given when its deadline is close
+    MIN_READ_TIMEOUT = 1.0
+
+    @staticmethod
+    def _time_left():
+        """
+        Seconds left until the deadline of the requests, or `None` if they
+        have none
+        """
+        deadline = _deadline.get()
+        return None if deadline is None else deadline - clock.monotonic()
+
+    def _request_timeout(self):
+        """
+        The (connect, read) timeouts of a request, with the read timeout cut
+        short so that the request ends around its deadline
+        """
+        time_left = self._time_left()
+        if time_left is None:
+            return self.timeout
+
+        (connect_timeout, read_timeout) = self.timeout
+        return (
+            connect_timeout,
+            max(min(read_timeout, time_left), self.MIN_READ_TIMEOUT),
+        )
+
+    def _retry_delay(self, attempt, retry_after=None):
+        """
+        Exponential backoff with full jitter, honouring any `Retry-After`
+        header given in seconds, or `None` if the retry would start past the
+        deadline of the request
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                # An HTTP date rather than a number of seconds
+                pass
+
+        time_left = self._time_left()
+        if time_left is not None and delay >= time_left:
+            return None
+
+        self._count("retries")
+        self._count("retry_wait_seconds", delay)
+        return delay
+
+    def _record_throttle(self, wait):
+        if wait > 0:
+            self._count("throttle_wait_seconds", wait)
+
+    def _search_params(self, term):
+        return {
             "key": self.api_key,
             "part": "snippet",
             "q": term,
@@ -62,8 +271,7 @@ class YoutubeClient(object):
             "maxResults": 50,
         }
 
-        data = self._fetch(url, params=params)
-
+    def _parse_search(self, data):
         for item in data["items"]:
             title = item["snippet"]["title"]
             description = item["snippet"]["description"]
@@ -95,123 +303,236 @@ class YoutubeClient(object):
             else:
                 raise ValueError(f"Invalid item kind: {item['id']['kind']}")
 
-    def fetch_latest_from_channel(self, *, channel_id, since):
-        page_id = None
-        url = "https://www.googleapis.com/youtube/v3/search"
-        while True:
-            params = {
-                "key": self.api_key,
-                "part": "snippet",
-                "maxResults": 50,
-                "channelId": channel_id,
-                "type": "video",
-                "publishedAfter": since.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            }
+    def _channel_page_params(self, channel_id, since, page_id):
+        params = {
+            "key": self.api_key,
+            "part": "snippet",
+            "maxResults": 50,
+            "channelId": channel_id,
+            "type": "video",
+            "publishedAfter": since.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
 
-            if page_id is not None:
-                params["pageToken"] = (page_id,)
+        if page_id is not None:
+            params["pageToken"] = page_id
 
-            data = self._fetch(url, params=params)
+        return params
 
-            for item in data["items"]:
-                if item["id"]["kind"] != "youtube#video":
-                    LOGGER.warning(
-                        "Unexpected item found in list: %s, expected youtube#video",
-                        item["id"]["kind"],
-                    )
-                    continue
-
-                published_at = parse_datetime(item["snippet"]["publishedAt"])
-
-                if published_at <= since:
-                    # Should never happen as we are querying the API since the
-                    # `since` parameter. We want to log this case in case our
-                    # assumptions are incorrect.
-                    LOGGER.warning(
-                        "API returned an item later than the `since` value, despite giving a `publishedAt` value. This is unexpected."
-                    )
-                    continue
-
-                video_id = item["id"]["videoId"]
-                details = self.fetch_video_details(video_id)
-                duration = self._parse_duration(details[video_id]["duration"])
-
-                yield Video(
-                    youtube_id=video_id,
-                    name=item["snippet"]["title"],
-                    description=item["snippet"]["description"],
-                    published_at=published_at,
-                    thumbnail_url=item["snippet"]["thumbnails"]["high"]["url"],
-                    duration=duration,
+    def _parse_channel_page(self, data, since):
+        """
+        Return the `(video_id, published_at, snippet)` tuples of a page of
+        channel search results
+        """
+        items = []
+        for item in data["items"]:
+            if item["id"]["kind"] != "youtube#video":
+                LOGGER.warning(
+                    "Unexpected item found in list: %s, expected youtube#video",
+                    item["id"]["kind"],
                 )
+                continue
 
-            # Break condition, no more pages
-            if "nextPageToken" in data:
-                page_id = data["nextPageToken"]
-            else:
-                break
+            published_at = parse_datetime(item["snippet"]["publishedAt"])
 
-    def fetch_latest_from_playlist(self, *, playlist_id, since):
-        page_id = None
-        url = "https://www.googleapis.com/youtube/v3/playlistItems"
-        while True:
-            params = {
-                "key": self.api_key,
-                "part": "snippet",
-                "maxResults": 50,
-                "playlistId": playlist_id,
-            }
+            if published_at <= since:
+                # Should never happen as we are querying the API since the
+                # `since` parameter. We want to log this case in case our
+                # assumptions are incorrect.
+                LOGGER.warning(
+                    "API returned an item later than the `since` value, despite giving a `publishedAt` value. This is unexpected."
+                )
+                continue
 
-            if page_id is not None:
-                params["pageToken"] = (page_id,)
+            items.append((item["id"]["videoId"], published_at, item["snippet"]))
 
-            data = self._fetch(url, params=params)
+        return items
 
-            for item in data["items"]:
-                resource = item["snippet"]["resourceId"]
-                if resource["kind"] != "youtube#video":
-                    LOGGER.warning(
-                        "Unexpected item found in list: %s, expected youtube#playlistItem",
-                        resource["kind"],
-                    )
-                    continue
-
-                published_at = parse_datetime(item["snippet"]["publishedAt"])
-
-                if published_at <= since:
-                    continue
-
-                video_id = resource["videoId"]
-                details = self.fetch_video_details(video_id)
-                duration = self._parse_duration(details[video_id]["duration"])
-
-                yield Video(
-                    youtube_id=video_id,
-                    name=item["snippet"]["title"],
-                    description=item["snippet"]["description"],
-                    published_at=published_at,
-                    thumbnail_url=item["snippet"]["thumbnails"]["high"]["url"],
-                    duration=duration,
-                )
+    def _uploads_params(self, channel_id):
+        return {
+            "key": self.api_key,
+            "part": "contentDetails",
+            "id": channel_id,
+        }
 
-            # Break condition, no more pages
-            if "nextPageToken" in data:
-                page_id = data["nextPageToken"]
-            else:
-                break
+    def _parse_uploads(self, data, channel_id):
+        if not data["items"]:
+            raise ValueError(f"Channel not found: {channel_id}")
 
-    def fetch_video_details(self, *video_ids):
-        url = "https://www.googleapis.com/youtube/v3/videos"
+        return data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+
+    def _playlist_page_params(self, playlist_id, page_id):
         params = {
             "key": self.api_key,
-            "id": ",".join(video_ids),
-            "part": "contentDetails",
+            "part": "snippet",
+            "maxResults": 50,
+            "playlistId": playlist_id,
         }
-        data = self._fetch(url, params=params)
-        results = {}
+
+        if page_id is not None:
+            params["pageToken"] = page_id
+
+        return params
+
+    def _parse_playlist_page(self, data, since, newest_first):
+        """
+        Return the `(video_id, published_at, snippet)` tuples of a page of
+        playlist items, and whether an item older than `since` was reached in a
+        playlist ordered newest first
+        """
+        items = []
         for item in data["items"]:
-            results[item["id"]] = item["contentDetails"]
-        return results
+            resource = item["snippet"]["resourceId"]
+            if resource["kind"] != "youtube#video":
+                LOGGER.warning(
+                    "Unexpected item found in list: %s, expected youtube#playlistItem",
+                    resource["kind"],
+                )
+                continue
+
+            published_at = parse_datetime(item["snippet"]["publishedAt"])
+
+            if published_at <= since:
+                if newest_first:
+                    return items, True
+                continue
+
+            items.append((resource["videoId"], published_at, item["snippet"]))
+
+        return items, False
+
+    def _sync_playlist_page(self, data, since, state, first_page):
+        """
+        Update the `PlaylistState` of a playlist from a page of its items.
+
+        Return the `(video_id, published_at, snippet)` tuples of the page, and
+        whether the sync has to go on to later pages, or `None` if the first
+        page shows the playlist is unchanged since the last sync.
+        """
+        if first_page:
+            if data is None or (
+                state.etag is not None and data.get("etag") == state.etag
+            ):
+                return None
+
+            state.etag = data.get("etag")
+            state.item_count = data["pageInfo"]["totalResults"]
+            state.synced = ""
+
+        page = [state.hash_item(item["id"]) for item in data["items"]]
+        state.synced += "".join(page)
+        (items, _) = self._parse_playlist_page(data, since, newest_first=False)
+        if data.get("nextPageToken") is None:
+            (state.item_hashes, state.synced) = (state.synced, "")
+            return items, False
+
+        # Items are added and removed in places, shifting the items after
+        # them. Once a page ends on an item shifted by as many places as the
+        # playlist has grown, the rest of it is as it was, shifted too.
+        synced = state.split(state.synced)
+        old = state.split(state.item_hashes)
+        positions = {item_hash: position for (position, item_hash) in enumerate(old)}
+        if page and page[-1] in positions:
+            shift = len(synced) - 1 - positions[page[-1]]
+            if shift == state.item_count - len(old):
+                state.item_hashes = state.synced + "".join(old[len(synced) - shift :])
+                state.synced = ""
+                return items, False
+        return items, True
+
+    def _video_details_params(self, video_ids, part="contentDetails"):
+        return {
+            "key": self.api_key,
+            "id": ",".join(video_ids),
+            "part": part,
+        }
+
+    def _chunk_video_ids(self, video_ids):
+        for start in range(0, len(video_ids), self.MAX_VIDEO_IDS):
+            yield video_ids[start : start + self.MAX_VIDEO_IDS]
+
+    def _make_videos(self, items, details):
+        """
+        Turn a page of `(video_id, published_at, snippet)` tuples into `Video`
+        objects, using the content details looked up for the whole page
+        """
+        return [
+            Video(
+                youtube_id=video_id,
+                name=snippet["title"],
+                description=snippet["description"],
+                published_at=published_at,
+                thumbnail_url=snippet["thumbnails"]["high"]["url"],
+                duration=self._duration(video_id, details),
+            )
+            for (video_id, published_at, snippet) in items
+        ]
+
+    def _make_feed_videos(self, entries, details):
+        """
+        Turn Atom feed entries into `Video` objects, using the content details
+        looked up for them
+        """
+        return [
+            Video(
+                youtube_id=entry.video_id,
+                name=entry.title,
+                description=entry.description,
+                published_at=entry.published_at,
+                thumbnail_url=entry.thumbnail_url,
+                duration=self._duration(entry.video_id, details),
+            )
+            for entry in entries
+        ]
+
+    def _duration(self, video_id, details):
+        if video_id not in details:
+            # The video may have been removed or made private since the page
+            # was listed
+            LOGGER.warning("No details found for video %s", video_id)
+            return None
+        return self._parse_duration(details[video_id]["duration"])
+
+    def _feed_params(self, channel_id):
+        return {"channel_id": channel_id}
+
+    def _feed_headers(self, state):
+        headers = {}
+        if state.etag is not None:
+            headers["If-None-Match"] = state.etag
+        if state.last_modified is not None:
+            headers["If-Modified-Since"] = state.last_modified
+        return headers
+
+    def _new_feed_entries(self, entries, since):
+        """
+        The Atom feed entries published after `since`, raising
+        `FeedIncomplete` if the feed lists no older entry, as videos published
+        between `since` and its oldest entry may then be missing from it
+        """
+        new = [entry for entry in entries if entry.published_at > since]
+        if len(new) >= self.FEED_LENGTH:
+            raise FeedIncomplete(f"Every entry of the feed is newer than {since}")
+        return new
+
+    def _update_feed_state(self, state, headers):
+        state.etag = headers.get("ETag")
+        state.last_modified = headers.get("Last-Modified")
+
+    def _parse_videos(self, data):
+        """
+        Turn a page of `videos` results, including their snippets, into
+        `Video` objects
+        """
+        items = [
+            (
+                item["id"],
+                parse_datetime(item["snippet"]["publishedAt"]),
+                item["snippet"],
+            )
+            for item in data["items"]
+        ]
+        details = {item["id"]: item["contentDetails"] for item in data["items"]}
+        return self._make_videos(items, details)
 
     @classmethod
     def _parse_duration(cls, duration: str) -> time:
@@ -224,3 +545,300 @@ class YoutubeClient(object):
         seconds = int(match.group("seconds") or 0)
 
         return time(hours, minutes, seconds)
+
+
+class YoutubeClient(BaseYoutubeClient):
+    """
+    Provides an abstraction over the Youtube API.
+
+    This object decouples the domain models from the Youtube API. It supports
+    the following methods:
+
+    * Search Youtube for either the channel or playlist with the given name
+    * Fetch new items (videos) since a specified time
+    * Look up the "uploads" playlist of a channel
+
+    If a `QuotaLedger` is given, every request is charged to it, and
+    `QuotaExhausted` is raised rather than making requests the remaining quota
+    cannot cover.
+
+    If a `ResponseCache` is given, the responses it deems worth caching are
+    stored in it, later requests for them are made conditional on their ETag,
+    and an unchanged (304) response is served from the cache.
+
+    Requests are spaced out by the `rate_limiter` token bucket, if given, which
+    may be shared between clients. Rate limited, server error and connection
+    error responses are retried up to `max_retries` times with exponential
+    backoff.
+    """
+
+    def __init__(self, api_key, **kwargs):
+        super().__init__(api_key, **kwargs)
+        self.session = requests.Session()
+        # TODO: add any request parameters
+
+    def _fetch(self, url, *, params=None, etag=None):
+        """
+        Helper method for fetching data from the Youtube API. This:
+
+        * provides a mocking point for testing the rest of the API, and
+        * unifies request making
+
+        If an `etag` is given and no response is cached, the request is made
+        conditional on it, and `None` is returned if the response is unchanged.
+        """
+        caching = self._caches(url, params, etag)
+        cached = self._cached_response(url, params) if caching else None
+        attempt = 0
+        while True:
+            # Every attempt is billed, retries included
+            self._charge(url)
+            if self.rate_limiter is not None:
+                self._record_throttle(self.rate_limiter.acquire())
+
+            started = clock.monotonic()
+            try:
+                response = self.session.get(
+                    url,
+                    params=params,
+                    headers=self._conditional_headers(cached, etag),
+                    timeout=self._request_timeout(),
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.record_request(
+                    self._endpoint(url), "error", clock.monotonic() - started, 0
+                )
+                delay = None
+                if attempt < self.max_retries:
+                    delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+                LOGGER.info("Connection error fetching %s, retrying", url)
+                clock.sleep(delay)
+                attempt += 1
+                continue
+
+            metrics.record_request(
+                self._endpoint(url),
+                response.status_code,
+                clock.monotonic() - started,
+                len(response.content),
+            )
+            if response.status_code == 304 and cached is not None:
+                return self._cache_hit(cached)
+            if response.status_code == 304 and etag is not None:
+                return None
+
+            error = None
+            if response.status_code >= 400:
+                try:
+                    error = response.json()
+                except ValueError:
+                    # Not a JSON error response
+                    pass
+
+            self._check_quota_error(response.status_code, error)
+            if not self._should_retry(response.status_code, error, attempt):
+                break
+            delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+            if delay is None:
+                break
+
+            LOGGER.info("Got status %d from %s, retrying", response.status_code, url)
+            clock.sleep(delay)
+            attempt += 1
+
+        response.raise_for_status()
+        data = response.json()
+        if caching:
+            self._store_response(url, params, response.headers.get("ETag"), data)
+        return data
+
+    def search(self, term):
+        data = self._fetch(self.search_url, params=self._search_params(term))
+        yield from self._parse_search(data)
+
+    def fetch_latest_from_channel(self, *, channel_id, since):
+        page_id = None
+        while True:
+            page = self.fetch_channel_page(
+                channel_id=channel_id, since=since, page_id=page_id
+            )
+            yield from page.videos
+
+            # Break condition, no more pages
+            if page.next_page_id is None:
+                break
+            page_id = page.next_page_id
+
+    def fetch_channel_page(self, *, channel_id, since, page_id=None):
+        """
+        Fetch a single page of the videos published on a channel after `since`
+        """
+        params = self._channel_page_params(channel_id, since, page_id)
+        data = self._fetch(self.search_url, params=params)
+
+        items = self._parse_channel_page(data, since)
+        return Page(self._build_videos(items), data.get("nextPageToken"))
+
+    def fetch_channel_feed(self, *, channel_id, since, state):
+        """
+        Fetch the videos published on a channel after `since` from its public
+        Atom feed, which costs no quota, updating the feed's `AtomState`.
+
+        The request is conditional on the validators of the last response, and
+        the feed is parsed as it downloads. Only the durations of the new
+        videos are looked up through the API. The feed lists the 15 latest
+        uploads of the channel, so if they are all new, `FeedIncomplete` is
+        raised instead.
+        """
+        started = clock.monotonic()
+        response = self.session.get(
+            self.feeds_url,
+            params=self._feed_params(channel_id),
+            headers=self._feed_headers(state),
+            timeout=self._request_timeout(),
+            stream=True,
+        )
+        with response:
+            parser = EntryParser()
+            entries = []
+            size = 0
+            if response.status_code == 200:
+                for chunk in response.iter_content(self.FEED_CHUNK_SIZE):
+                    size += len(chunk)
+                    entries.extend(parser.feed(chunk))
+                entries.extend(parser.close())
+
+        metrics.record_request(
+            "feeds", response.status_code, clock.monotonic() - started, size
+        )
+        if response.status_code == 304:
+            self._count("feeds_unchanged")
+            return Page([])
+        response.raise_for_status()
+
+        new = self._new_feed_entries(entries, since)
+        self._update_feed_state(state, response.headers)
+        if not new:
+            return Page([])
+
+        details = self.fetch_video_details(*[entry.video_id for entry in new])
+        return Page(self._make_feed_videos(new, details))
+
+    def fetch_uploads_playlist_id(self, channel_id):
+        """
+        Look up the id of the playlist containing every upload of a channel.
+
+        Crawling this playlist through `playlistItems` costs 1 quota unit per
+        page, compared to 100 for the `search` endpoint.
+        """
+        data = self._fetch(self.channels_url, params=self._uploads_params(channel_id))
+        return self._parse_uploads(data, channel_id)
+
+    def fetch_latest_from_playlist(self, *, playlist_id, since, newest_first=False):
+        """
+        Fetch the videos added to a playlist after `since`.
+
+        If the playlist is known to be ordered newest first (such as a channel's
+        uploads playlist), set `newest_first` to stop paging as soon as an item
+        older than `since` is seen.
+        """
+        page_id = None
+        while True:
+            page = self.fetch_playlist_page(
+                playlist_id=playlist_id,
+                since=since,
+                page_id=page_id,
+                newest_first=newest_first,
+            )
+            yield from page.videos
+
+            # Break condition, no more pages
+            if page.next_page_id is None:
+                break
+            page_id = page.next_page_id
+
+    def fetch_playlist_page(
+        self, *, playlist_id, since, page_id=None, newest_first=False
+    ):
+        """
+        Fetch a single page of the videos added to a playlist after `since`
+        """
+        params = self._playlist_page_params(playlist_id, page_id)
+        data = self._fetch(self.playlist_items_url, params=params)
+
+        items, reached_since = self._parse_playlist_page(data, since, newest_first)
+        next_page_id = None if reached_since else data.get("nextPageToken")
+        return Page(self._build_videos(items), next_page_id)
+
+    def sync_playlist_page(self, *, playlist_id, since, state, page_id=None):
+        """
+        Fetch a single page of the videos added to a playlist after `since`, as
+        part of an incremental sync which updates the playlist's
+        `PlaylistState`.
+
+        The first page is requested conditionally on the ETag of the last
+        sync, so an unchanged playlist costs a single request. Paging stops
+        once the rest of the playlist is known to be as it was, shifted by the
+        items added and removed, rather than going through the whole playlist.
+        """
+        first_page = page_id is None
+        params = self._playlist_page_params(playlist_id, page_id)
+        data = self._fetch(
+            self.playlist_items_url,
+            params=params,
+            etag=state.etag if first_page else None,
+        )
+
+        synced = self._sync_playlist_page(data, since, state, first_page)
+        if synced is None:
+            self._count("playlists_unchanged")
+            return Page([])
+
+        (items, more) = synced
+        next_page_id = data.get("nextPageToken") if more else None
+        return Page(self._build_videos(items), next_page_id)
+
+    def _build_videos(self, items):
+        """
+        Turn a page of `(video_id, published_at, snippet)` tuples into `Video`
+        objects.
+
+        The durations for the whole page are looked up together, so a page of
+        results costs one `videos` request rather than one per item.
+        """
+        if not items:
+            return []
+
+        details = self.fetch_video_details(*[video_id for (video_id, _, _) in items])
+        return self._make_videos(items, details)
+
+    def fetch_video_details(self, *video_ids):
+        """
+        Fetch the content details for the given videos, keyed by video id.
+
+        The ids are requested in chunks of `MAX_VIDEO_IDS`, so any number of
+        ids costs the minimum number of requests.
+        """
+        results = {}
+        for chunk in self._chunk_video_ids(video_ids):
+            params = self._video_details_params(chunk)
+            data = self._fetch(self.videos_url, params=params)
+            for item in data["items"]:
+                results[item["id"]] = item["contentDetails"]
+        return results
+
+    def fetch_videos(self, *video_ids):
+        """
+        Fetch the videos with the given ids, in chunks of `MAX_VIDEO_IDS`.
+
+        Videos that are not found, e.g. because they were removed or made
+        private, are left out.
+        """
+        videos = []
+        for chunk in self._chunk_video_ids(video_ids):
+            params = self._video_details_params(chunk, part="snippet,contentDetails")
+            data = self._fetch(self.videos_url, params=params)
+            videos.extend(self._parse_videos(data))
+        return videos
@@ -1,18 +1,53 @@
-from django.shortcuts import render, redirect
-from django.http import HttpResponseRedirect
+import json
+import logging
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q
 from django.contrib.auth.models import User
-from .utils.youtube_client import YoutubeClient
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.csrf import csrf_exempt
 from .utils.types import ItemType
-from .utils.crawler import Crawler
-from .models import Subscription, Video
+from .utils.crawler import backfill_subscription, subscribed_feeds
+from .utils.jobs import enqueue
+from .utils.metrics import CONTENT_TYPE, REGISTRY
+from .utils.watched import mark_watched
+from .utils.websub import ingest_notification, verify_intent, verify_signature
+from .models import CrawlJob, Feed, Subscription, attach_newest_unwatched
 from .forms import SearchForm
-import os
+from .services import SEARCH_CACHE, YOUTUBE
 
+LOGGER = logging.getLogger("ytvd.subscriptions.views")
 
-YOUTUBE = YoutubeClient(os.environ["GOOGLE_API_KEY"])
-CRAWLER = Crawler(YOUTUBE)
+# Unwatched videos shown on each page of a subscription's card, and on each
+# page of a single subscription's videos
+VIDEOS_PER_SUBSCRIPTION = 10
+VIDEOS_PER_PAGE = 50
+# Cards rendered with the index page, the rest being loaded as they are
+# scrolled into view
+EAGER_CARDS = 12
+
+
+def redirect_next(request):
+    """
+    Redirect to the `next` URL posted with the request, if it is on this site,
+    or else to the index page
+    """
+    url = request.POST.get("next")
+    if url and url_has_allowed_host_and_scheme(url, allowed_hosts={request.get_host()}):
+        return redirect(url)
+    return redirect("/")
+
+
+def is_id(value):
+    """
+    Whether a value parsed from JSON is an integer id, and not `true` or
+    `false`, which are parsed as bools, a subclass of int
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
 
 
 @login_required
@@ -21,12 +56,44 @@ def index(request):
     current_users_subscriptions = Subscription.objects.filter(
         user__username=request.user
     )
-    subscriptions = current_users_subscriptions.annotate(
-        unwatched_video_count=Count("videos", filter=Q(videos__watched=False))
+    sorted_subscriptions = list(
+        current_users_subscriptions.order_by("-unwatched_count", "name")
+    )
+    return render(
+        request,
+        "subscriptions/index.html",
+        {
+            "cards": attach_newest_unwatched(
+                sorted_subscriptions[:EAGER_CARDS], VIDEOS_PER_SUBSCRIPTION
+            ),
+            "lazy_cards": sorted_subscriptions[EAGER_CARDS:],
+        },
+    )
+
+
+@login_required
+def subscription_card(request, subscription_id):
+    """
+    The card of a single subscription on the index page, showing a page of its
+    unwatched videos
+    """
+    sub = get_object_or_404(Subscription, id=subscription_id, user=request.user)
+    page = Paginator(sub.unwatched(), VIDEOS_PER_SUBSCRIPTION).get_page(
+        request.GET.get("page")
+    )
+    return render(
+        request,
+        "subscriptions/card.html",
+        {"sub": sub, "videos": page, "page": page},
     )
-    sorted_subscriptions = subscriptions.order_by("-unwatched_video_count", "name")
+
+
+@login_required
+def subscription(request, subscription_id):
+    sub = get_object_or_404(Subscription, id=subscription_id, user=request.user)
+    page = Paginator(sub.unwatched(), VIDEOS_PER_PAGE).get_page(request.GET.get("page"))
     return render(
-        request, "subscriptions/index.html", {"subscriptions": sorted_subscriptions}
+        request, "subscriptions/subscription.html", {"sub": sub, "page": page}
     )
 
 
@@ -36,7 +103,7 @@ def search(request):
         form = SearchForm(request.POST)
         if form.is_valid():
             term = form.cleaned_data["term"]
-            search_items = list(YOUTUBE.search(term=term))
+            search_items = SEARCH_CACHE.search(YOUTUBE, term)
             return render(
                 request,
                 "subscriptions/search-results.html",
@@ -68,8 +135,13 @@ def subscribe(request):
             type=ItemType.from_(item_type),
         )
 
-        # XXX: break this out of band?
-        CRAWLER.crawl_subscription(sub)
+        # The feed may have videos even if it was never checked, from the
+        # pages committed so far by a first crawl in progress
+        backfill_subscription(sub, timezone.now())
+        if sub.feed.last_checked is None:
+            # The first crawl of a feed pages through months of uploads, so
+            # leave it to the crawl workers, which commit it page by page
+            enqueue(sub.feed)
 
     return redirect("/")
 
@@ -77,30 +149,143 @@ def subscribe(request):
 @login_required
 def mark_subscription_watched(request):
     if request.method == "POST":
-        sub_id = request.POST["subscription-id"]
-        sub = Subscription.objects.get(id=sub_id)
-        for video in sub.videos.all():
-            video.watched = True
-            video.save()
+        mark_watched(request.user, subscription_id=request.POST["subscription-id"])
 
-    return redirect("/")
+    return redirect_next(request)
 
 
 @login_required
 def mark_video_watched(request):
     if request.method == "POST":
-        video_id = request.POST["video-id"]
-        video = Video.objects.get(id=video_id)
-        video.watched = True
-        video.save()
+        mark_watched(request.user, video_ids=[request.POST["video-id"]])
 
-    return redirect("/")
+    return redirect_next(request)
+
+
+@login_required
+def mark_batch_watched(request):
+    """
+    Mark the user's unwatched videos watched in one go, narrowed down by the
+    JSON object posted: `subscription`, a subscription id, `before`, an ISO
+    8601 date and time the videos were published before, and `videos`, a list
+    of video ids. At least one must be given.
+    """
+    if request.method != "POST":
+        return HttpResponse(status=405)
+
+    try:
+        batch = json.loads(request.body)
+        subscription_id = batch.get("subscription")
+        before = batch.get("before")
+        video_ids = batch.get("videos")
+        if subscription_id is not None and not is_id(subscription_id):
+            raise ValueError("Subscription id must be an integer")
+        if before is not None:
+            before = parse_datetime(before)
+            if before is None:
+                raise ValueError("Invalid date and time for before")
+        if video_ids is not None and not all(is_id(i) for i in video_ids):
+            raise ValueError("Video ids must be integers")
+        if subscription_id is None and before is None and video_ids is None:
+            raise ValueError("Give at least one of subscription, before and videos")
+    except (AttributeError, TypeError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    marked = mark_watched(
+        request.user,
+        subscription_id=subscription_id,
+        before=before,
+        video_ids=video_ids,
+    )
+    return JsonResponse({"marked": marked})
 
 
 @login_required
 def update_feeds(request):
+    """
+    Queue crawls of the user's feeds for the crawl workers. Requests accepting
+    JSON get the ids of the jobs, to follow with `update_feeds_status`.
+    """
     if request.method == "POST":
         user = User.objects.get(username=request.user)
-        CRAWLER.crawl(user=user)
+        jobs = [enqueue(feed) for feed in subscribed_feeds(user)]
+        if "application/json" in request.headers.get("Accept", ""):
+            return JsonResponse({"jobs": [job.id for job in jobs]})
+
+        messages.info(request, f"Refreshing {len(jobs)} feeds in the background")
 
     return redirect("/")
+
+
+@login_required
+def update_feeds_status(request):
+    """
+    Progress of the crawl jobs listed in the `jobs` parameter, for each of the
+    user's subscriptions they cover
+    """
+    job_ids = [int(i) for i in request.GET.get("jobs", "").split(",") if i.isdigit()]
+    jobs = {
+        job.feed_id: job
+        for job in CrawlJob.objects.filter(
+            id__in=job_ids, feed__subscriptions__user__username=request.user
+        )
+    }
+    subscriptions = Subscription.objects.filter(
+        user__username=request.user, feed_id__in=jobs
+    )
+
+    progress = [
+        {
+            "id": sub.id,
+            "name": sub.name,
+            "status": jobs[sub.feed_id].status,
+            "new_videos": jobs[sub.feed_id].videos_added,
+            "unwatched_videos": sub.unwatched_count,
+        }
+        for sub in subscriptions.order_by("name")
+    ]
+    return JsonResponse(
+        {
+            "done": all(job.status not in CrawlJob.ACTIVE for job in jobs.values()),
+            "subscriptions": progress,
+        }
+    )
+
+
+@csrf_exempt
+def websub_callback(request, feed_id):
+    """
+    Callback for the WebSub hub: GET requests verify a subscription of the
+    feed, and POST requests notify it of new or updated uploads
+    """
+    feed = get_object_or_404(Feed, id=feed_id)
+    if request.method == "GET":
+        challenge = verify_intent(feed, request.GET, timezone.now())
+        if challenge is None:
+            return HttpResponse(status=404)
+        return HttpResponse(challenge, content_type="text/plain")
+
+    if request.method != "POST":
+        return HttpResponse(status=405)
+
+    if not verify_signature(
+        feed.push_secret, request.body, request.headers.get("X-Hub-Signature")
+    ):
+        LOGGER.warning("Ignoring notification for %s with a bad signature", feed)
+        # The hub expects a success response either way
+        return HttpResponse(status=202)
+
+    try:
+        ingest_notification(feed, request.body, YOUTUBE, timezone.now())
+    except Exception:
+        # Fall back to crawling the feed, rather than have the hub retry
+        LOGGER.exception("Failed to ingest notification for %s", feed)
+        enqueue(feed)
+    return HttpResponse(status=204)
+
+
+def metrics(request):
+    """
+    The metrics of this process, in the Prometheus text format
+    """
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
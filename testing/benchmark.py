@@ -0,0 +1,153 @@
+"""
+Crawler throughput benchmarks against the local fake Youtube API.
+
+Each crawl mode in `CRAWL_MODES` crawls every channel of a `FakeYoutube`
+server for a single user, and is measured in videos stored per second, API
+requests per video and database writes per video. Add new crawl modes to
+`CRAWL_MODES` to include them in the benchmarks.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from subscriptions.models import Feed, Subscription, Video
+from subscriptions.utils.async_client import AsyncYoutubeClient
+from subscriptions.utils.async_crawler import AsyncCrawler
+from subscriptions.utils.crawler import Crawler
+from subscriptions.utils.types import CrawlMode
+from subscriptions.utils.youtube_client import YoutubeClient
+
+
+@dataclass
+class BenchmarkResult:
+    mode: str
+    videos: int
+    seconds: float
+    requests: int
+    db_writes: int
+
+    @property
+    def videos_per_second(self):
+        return self.videos / self.seconds
+
+    @property
+    def requests_per_video(self):
+        return self.requests / self.videos
+
+    @property
+    def db_writes_per_video(self):
+        return self.db_writes / self.videos
+
+    def __str__(self):
+        return (
+            f"{self.mode:>12}: {self.videos} videos in {self.seconds:.2f}s, "
+            f"{self.videos_per_second:.1f} videos/s, "
+            f"{self.requests_per_video:.3f} requests/video, "
+            f"{self.db_writes_per_video:.3f} DB writes/video"
+        )
+
+
+@contextmanager
+def count_db_writes():
+    """
+    Count the INSERT, UPDATE and DELETE statements run on any thread
+    """
+    writes = []
+
+    def counting(method):
+        def _inner(self, sql, *args, **kwargs):
+            if sql.lstrip().split(None, 1)[0].upper() in {"INSERT", "UPDATE", "DELETE"}:
+                writes.append(sql)
+            return method(self, sql, *args, **kwargs)
+
+        return _inner
+
+    with mock.patch.object(
+        CursorWrapper, "execute", counting(CursorWrapper.execute)
+    ), mock.patch.object(
+        CursorWrapper, "executemany", counting(CursorWrapper.executemany)
+    ):
+        yield writes
+
+
+def crawl_sync(fake, user):
+    Crawler(YoutubeClient("key", base_url=fake.base_url), concurrent=False).crawl(
+        user=user
+    )
+
+
+def crawl_concurrent(fake, user):
+    crawler = Crawler(YoutubeClient("key", base_url=fake.base_url))
+    crawler.crawl(user=user)
+    crawler.pool.shutdown()
+
+
+def crawl_search(fake, user):
+    Crawler(
+        YoutubeClient("key", base_url=fake.base_url), channel_mode=CrawlMode.SEARCH
+    ).crawl(user=user)
+
+
+def crawl_feed(fake, user):
+    """
+    Crawl as deployed by default: the channels are backfilled through their
+    uploads playlists, and crawled again through their Atom feeds
+    """
+    crawler = Crawler(
+        YoutubeClient("key", base_url=fake.base_url, feeds_url=fake.feeds_url),
+        channel_mode=CrawlMode.FEED,
+    )
+    crawler.crawl(user=user)
+    crawler.crawl(user=user)
+    crawler.pool.shutdown()
+
+
+def crawl_async(fake, user):
+    async def crawl():
+        async with AsyncYoutubeClient("key", base_url=fake.base_url) as client:
+            await AsyncCrawler(client).crawl(user=user)
+        await sync_to_async(connections.close_all, thread_sensitive=True)()
+
+    asyncio.run(crawl())
+
+
+CRAWL_MODES = {
+    "sync": crawl_sync,
+    "concurrent": crawl_concurrent,
+    "search": crawl_search,
+    "feed": crawl_feed,
+    "async": crawl_async,
+}
+
+
+def run_benchmark(mode, fake, user):
+    """
+    Crawl every channel of the fake API for the user with the given crawl
+    mode, starting from an empty database
+    """
+    Feed.objects.all().delete()
+    for (channel_id, channel) in fake.channels.items():
+        Subscription.objects.create(
+            user=user,
+            name=channel["title"],
+            youtube_id=channel_id,
+            type="ItemType.CHANNEL",
+        )
+
+    fake.requests.clear()
+    with count_db_writes() as writes:
+        start = time.perf_counter()
+        CRAWL_MODES[mode](fake, user)
+        seconds = time.perf_counter() - start
+
+    return BenchmarkResult(
+        mode=mode,
+        videos=Video.objects.count(),
+        seconds=seconds,
+        requests=sum(fake.requests.values()),
+        db_writes=len(writes),
+    )
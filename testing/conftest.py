@@ -1,6 +1,10 @@
+import json
+import os
 import pytest
+from django.test import Client
 from subscriptions.models import Subscription
 from subscriptions.utils.youtube_client import YoutubeClient
+from ytvd.settings import BASE_DIR
 
 
 @pytest.fixture
@@ -8,6 +12,13 @@ def user(django_user_model):
     return django_user_model.objects.create_user("a", "a@example.com", "password")
 
 
+@pytest.fixture
+def web(user):
+    web = Client()
+    web.force_login(user)
+    return web
+
+
 @pytest.fixture
 def subscription(user):
     return Subscription.objects.create(user=user, name="foo")
@@ -21,3 +32,15 @@ def api_key():
 @pytest.fixture
 def client(api_key):
     return YoutubeClient(api_key)
+
+
+@pytest.fixture(scope="session")
+def response():
+    def _inner(name):
+        filename = os.path.join(
+            BASE_DIR, "testing", "fixtures", f"{name}_response.json"
+        )
+        with open(filename) as infile:
+            return json.load(infile)
+
+    return _inner
@@ -0,0 +1,133 @@
+"""
+A local stand-in for the WebSub hub Youtube publishes upload notifications
+through.
+
+The hub accepts subscription requests, verifies them by calling back the
+subscriber with a challenge as the real hub does, and then delivers the
+notifications passed to `publish` to every verified subscriber of the topic,
+signed with the subscriber's secret.
+
+Use it as a context manager, and point the app's hub setting at its `url`:
+
+    with FakeHub() as hub:
+        settings.WEBSUB_HUB_URL = hub.url
+"""
+import hashlib
+import hmac
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import requests
+from testing.fake_youtube import atom_feed
+
+
+def notification(video, channel_id):
+    """
+    The Atom notification the hub sends when a video of `FakeYoutube` is
+    uploaded
+    """
+    return atom_feed(channel_id, [video])
+
+
+class FakeHub:
+    def __init__(self):
+        # Verified subscriptions: callback URL by topic, with its secret
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        (host, port) = self.server.server_address
+        return f"http://{host}:{port}/subscribe"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _handler(self):
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                status = hub._subscribe(
+                    {name: values[0] for (name, values) in form.items()}
+                )
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _subscribe(self, form):
+        """
+        Verify a subscription request with the subscriber before accepting it.
+
+        The real hub verifies after responding; verifying first keeps tests
+        free of waiting.
+        """
+        try:
+            (callback, topic, mode) = (
+                form["hub.callback"],
+                form["hub.topic"],
+                form["hub.mode"],
+            )
+        except KeyError:
+            return 400
+
+        challenge = secrets.token_hex(8)
+        response = requests.get(
+            callback,
+            params={
+                "hub.mode": mode,
+                "hub.topic": topic,
+                "hub.challenge": challenge,
+                "hub.lease_seconds": form.get("hub.lease_seconds", 432000),
+            },
+            timeout=10,
+        )
+        if response.status_code != 200 or response.text != challenge:
+            return 202
+
+        with self.lock:
+            subscribers = self.subscriptions.setdefault(topic, {})
+            if mode == "subscribe":
+                subscribers[callback] = form.get("hub.secret")
+            else:
+                subscribers.pop(callback, None)
+        return 202
+
+    def publish(self, topic, body):
+        """
+        Deliver a notification to every subscriber of the topic, returning the
+        status codes of their responses
+        """
+        with self.lock:
+            subscribers = dict(self.subscriptions.get(topic, {}))
+
+        statuses = []
+        for (callback, secret) in subscribers.items():
+            headers = {"Content-Type": "application/atom+xml"}
+            if secret:
+                signature = hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+                headers["X-Hub-Signature"] = f"sha1={signature}"
+            statuses.append(
+                requests.post(
+                    callback, data=body, headers=headers, timeout=10
+                ).status_code
+            )
+        return statuses
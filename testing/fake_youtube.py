@@ -0,0 +1,355 @@
+"""
+A local stand-in for the parts of the Youtube Data API used by the crawler,
+and for the public Atom feeds of channels.
+
+The server generates synthetic channels, each with an uploads playlist of
+videos published at regular intervals up to the present, and serves them
+through the `search`, `channels`, `playlistItems` and `videos` endpoints with
+the same pagination and response shapes as the real API. Response latency and
+a rate of transient (503) errors can be configured, and the requests made to
+each endpoint are counted.
+
+Use it as a context manager, and point a client at its `base_url`:
+
+    with FakeYoutube(channels=10, videos_per_channel=100) as fake:
+        client = YoutubeClient("key", base_url=fake.base_url)
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+def isoformat(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def parse_isoformat(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+def atom_feed(channel_id, videos):
+    """
+    The Atom feed of a channel listing the videos, in the format of both
+    Youtube's channel feeds and its WebSub notifications
+    """
+    entries = "".join(
+        f"""
+  <entry>
+    <id>yt:video:{video["id"]}</id>
+    <yt:videoId>{video["id"]}</yt:videoId>
+    <yt:channelId>{channel_id}</yt:channelId>
+    <title>{video["title"]}</title>
+    <link rel="alternate" href="https://www.youtube.com/watch?v={video["id"]}"/>
+    <published>{video["published_at"].isoformat()}</published>
+    <updated>{video["published_at"].isoformat()}</updated>
+    <media:group>
+      <media:title>{video["title"]}</media:title>
+      <media:thumbnail url="https://i.ytimg.com/vi/{video["id"]}/hqdefault.jpg" width="480" height="360"/>
+      <media:description>Description of {video["title"]}</media:description>
+    </media:group>
+  </entry>"""
+        for video in videos
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns:media="http://search.yahoo.com/mrss/" xmlns="http://www.w3.org/2005/Atom">
+  <link rel="self" href="http://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"/>
+  <id>yt:channel:{channel_id}</id>
+  <yt:channelId>{channel_id}</yt:channelId>
+  <title>Channel</title>{entries}
+</feed>
+""".encode()
+
+
+class FakeYoutube:
+    def __init__(
+        self,
+        channels=10,
+        videos_per_channel=100,
+        upload_interval=timedelta(hours=12),
+        page_size=50,
+        latency=0.0,
+        error_rate=0.0,
+        seed=0,
+    ):
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.channels = {}
+        self.playlists = {}
+        self.videos = {}
+        for c in range(channels):
+            channel_id = f"UCfake{c:018d}"
+            uploads_id = "UU" + channel_id[2:]
+            uploads = []
+            for v in range(videos_per_channel):
+                video = {
+                    "id": f"c{c}v{v}",
+                    "channel_id": channel_id,
+                    "title": f"Video {v} of channel {c}",
+                    "published_at": now - upload_interval * (v + 1),
+                    "duration": f"PT{v % 60}M{v % 59}S",
+                }
+                self.videos[video["id"]] = video
+                # Newest first, like a real uploads playlist
+                uploads.append(video)
+
+            self.channels[channel_id] = {
+                "title": f"Channel {c}",
+                "uploads": uploads_id,
+            }
+            self.playlists[uploads_id] = uploads
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def upload(self, channel_id, title="New video"):
+        """
+        Publish a new video on a channel, at the top of its uploads playlist
+        """
+        uploads = self.playlists[self.channels[channel_id]["uploads"]]
+        video = {
+            "id": f"{channel_id}-new{len(uploads)}",
+            "channel_id": channel_id,
+            "title": title,
+            "published_at": datetime.now(timezone.utc).replace(microsecond=0),
+            "duration": "PT1M1S",
+        }
+        with self.lock:
+            self.videos[video["id"]] = video
+            uploads.insert(0, video)
+        return video
+
+    @property
+    def base_url(self):
+        (host, port) = self.server.server_address
+        return f"http://{host}:{port}/youtube/v3"
+
+    @property
+    def feeds_url(self):
+        (host, port) = self.server.server_address
+        return f"http://{host}:{port}/feeds/videos.xml"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _handle(self, request):
+        url = urlsplit(request.path)
+        endpoint = url.path.rsplit("/", 1)[-1]
+        params = {name: values[0] for (name, values) in parse_qs(url.query).items()}
+
+        with self.lock:
+            self.requests[endpoint] += 1
+            fail = self.random.random() < self.error_rate
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if fail:
+            return self._respond(request, 503, {"error": {"code": 503}})
+
+        if url.path == "/feeds/videos.xml":
+            return self._feed(request, params)
+
+        handler = getattr(self, f"_{endpoint}", None)
+        if handler is None:
+            return self._respond(request, 404, {"error": {"code": 404}})
+
+        try:
+            body = handler(params)
+        except (KeyError, ValueError) as e:
+            return self._respond(request, 400, {"error": {"message": str(e)}})
+
+        etag = '"' + hashlib.sha1(json.dumps(body).encode()).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return self._respond(request, 304, None, etag=etag)
+        body["etag"] = etag
+        return self._respond(request, 200, body, etag=etag)
+
+    def _respond(self, request, status, body, etag=None):
+        payload = b"" if body is None else json.dumps(body).encode()
+        request.send_response(status)
+        if etag is not None:
+            request.send_header("ETag", etag)
+        if body is not None:
+            request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def _feed(self, request, params):
+        """
+        Serve the Atom feed of the 15 latest uploads of a channel, honouring
+        conditional requests
+        """
+        channel = self.channels.get(params.get("channel_id"))
+        if channel is None:
+            request.send_response(404)
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return
+
+        videos = self.playlists[channel["uploads"]][:15]
+        payload = atom_feed(params["channel_id"], videos)
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        last_modified = formatdate(videos[0]["published_at"].timestamp(), usegmt=True)
+        if request.headers.get("If-None-Match") == etag:
+            (status, payload) = (304, b"")
+        else:
+            status = 200
+
+        request.send_response(status)
+        request.send_header("ETag", etag)
+        request.send_header("Last-Modified", last_modified)
+        request.send_header("Content-Type", "application/atom+xml")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def _paginate(self, items, params):
+        start = int(params.get("pageToken", 0))
+        size = min(int(params.get("maxResults", 5)), self.page_size)
+        page = {
+            "items": items[start : start + size],
+            "pageInfo": {"totalResults": len(items), "resultsPerPage": size},
+        }
+        if start + size < len(items):
+            page["nextPageToken"] = str(start + size)
+        return page
+
+    def _snippet(self, video, **extra):
+        return dict(
+            publishedAt=isoformat(video["published_at"]),
+            channelId=video["channel_id"],
+            title=video["title"],
+            description=f"Description of {video['title']}",
+            thumbnails={
+                "high": {
+                    "url": f"https://i.ytimg.com/vi/{video['id']}/hqdefault.jpg",
+                    "width": 480,
+                    "height": 360,
+                }
+            },
+            channelTitle=self.channels[video["channel_id"]]["title"],
+            **extra,
+        )
+
+    def _search(self, params):
+        if "channelId" in params:
+            since = parse_isoformat(params["publishedAfter"])
+            videos = [
+                video
+                for video in self.playlists[
+                    self.channels[params["channelId"]]["uploads"]
+                ]
+                if video["published_at"] > since
+            ]
+            items = [
+                {
+                    "kind": "youtube#searchResult",
+                    "id": {"kind": "youtube#video", "videoId": video["id"]},
+                    "snippet": self._snippet(video),
+                }
+                for video in videos
+            ]
+        else:
+            term = params["q"].lower()
+            items = [
+                {
+                    "kind": "youtube#searchResult",
+                    "id": {"kind": "youtube#channel", "channelId": channel_id},
+                    "snippet": {
+                        "title": channel["title"],
+                        "description": "",
+                        "channelTitle": channel["title"],
+                        "thumbnails": {"high": {"url": "https://example.com"}},
+                    },
+                }
+                for (channel_id, channel) in self.channels.items()
+                if term in channel["title"].lower()
+            ]
+        return self._paginate(items, params)
+
+    def _channels(self, params):
+        items = [
+            {
+                "kind": "youtube#channel",
+                "id": channel_id,
+                "contentDetails": {
+                    "relatedPlaylists": {
+                        "uploads": self.channels[channel_id]["uploads"]
+                    }
+                },
+            }
+            for channel_id in params["id"].split(",")
+            if channel_id in self.channels
+        ]
+        return {"items": items}
+
+    def _playlistItems(self, params):
+        items = [
+            {
+                "kind": "youtube#playlistItem",
+                "id": f"{params['playlistId']}.{video['id']}",
+                "snippet": self._snippet(
+                    video,
+                    playlistId=params["playlistId"],
+                    position=position,
+                    resourceId={"kind": "youtube#video", "videoId": video["id"]},
+                ),
+            }
+            for (position, video) in enumerate(self.playlists[params["playlistId"]])
+        ]
+        return self._paginate(items, params)
+
+    def _videos(self, params):
+        video_ids = params["id"].split(",")
+        if len(video_ids) > 50:
+            raise ValueError("Too many video ids")
+
+        items = []
+        for video_id in video_ids:
+            if video_id not in self.videos:
+                continue
+
+            video = self.videos[video_id]
+            item = {
+                "kind": "youtube#video",
+                "id": video_id,
+                "contentDetails": {"duration": video["duration"]},
+            }
+            if "snippet" in params["part"].split(","):
+                item["snippet"] = self._snippet(video)
+            items.append(item)
+        return {"items": items}
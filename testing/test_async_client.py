@@ -0,0 +1,207 @@
+import asyncio
+import pytest
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.utils import timezone
+from subscriptions.models import Feed, Subscription, Video
+from subscriptions.utils.async_client import AsyncYoutubeClient
+from subscriptions.utils.async_crawler import AsyncCrawler
+from subscriptions.utils.types import ItemType, Page
+
+
+@pytest.fixture
+def async_client(api_key):
+    return AsyncYoutubeClient(api_key)
+
+
+def returning(*responses):
+    """
+    Build a side effect for a mocked `_fetch` coroutine
+    """
+    responses = iter(responses)
+
+    async def _inner(url, *, params=None):
+        return next(responses)
+
+    return _inner
+
+
+async def collect(agen):
+    return [item async for item in agen]
+
+
+def test_search_for_term(async_client, response, mocker):
+    fetch = mocker.patch.object(
+        async_client, "_fetch", side_effect=returning(response("search"))
+    )
+
+    results = asyncio.run(collect(async_client.search("outsidexbox")))
+
+    assert fetch.call_args[0][0] == "https://www.googleapis.com/youtube/v3/search"
+    assert results[0].id == "UCKk076mm-7JjLxJcFSXIPJA"
+    assert results[0].item_type == ItemType.CHANNEL
+    assert results[2].item_type == ItemType.PLAYLIST
+
+
+def test_fetch_from_playlist(async_client, response, mocker):
+    mocker.patch.object(
+        async_client,
+        "_fetch",
+        side_effect=returning(
+            response("playlist_1"),
+            {"items": []},
+            response("playlist_2"),
+        ),
+    )
+
+    videos = asyncio.run(
+        collect(
+            async_client.fetch_latest_from_playlist(
+                playlist_id="PL7bmigfV0EqQzxcNpmcdTJ9eFRPBe-iZa",
+                since=timezone.make_aware(timezone.datetime(2019, 10, 24)),
+            )
+        )
+    )
+
+    assert len(videos) == 2
+    assert videos[0].youtube_id == "XxVHNWoZO_c"
+    assert videos[0].published_at == timezone.make_aware(
+        timezone.datetime(2019, 11, 1, 21, 54, 51)
+    )
+
+
+def test_fetch_video_details_chunks_ids(async_client, response, mocker):
+    stub_response = response("video_details")
+    fetch = mocker.patch.object(
+        async_client, "_fetch", side_effect=returning(*[stub_response] * 3)
+    )
+
+    meta = asyncio.run(
+        async_client.fetch_video_details(*[f"video{i}" for i in range(120)])
+    )
+
+    assert fetch.call_count == 3
+    assert meta["78XKGNmBmHw"]["duration"] == "PT29M46S"
+
+
+LAST_CHECKED = timezone.make_aware(timezone.datetime(2019, 9, 1))
+
+
+def playlist_feeds(user, count):
+    feeds = []
+    for i in range(count):
+        feed = Feed.objects.create(
+            name=f"playlist{i}",
+            youtube_id=f"PL{i}",
+            type="ItemType.PLAYLIST",
+            last_checked=LAST_CHECKED,
+        )
+        Subscription.objects.create(
+            user=user,
+            name=f"playlist{i}",
+            youtube_id=f"PL{i}",
+            type="ItemType.PLAYLIST",
+            feed=feed,
+        )
+        feeds.append(feed)
+    return feeds
+
+
+def run_crawl(crawler, **kwargs):
+    async def crawl():
+        result = await crawler.crawl(**kwargs)
+        # Release the database connection held by the ORM worker thread
+        await sync_to_async(connections.close_all, thread_sensitive=True)()
+        return result
+
+    return asyncio.run(crawl())
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_crawler(async_client, user, mocker):
+    playlist_feeds(user, 5)
+
+    in_flight = 0
+    max_in_flight = 0
+
+    async def sync_playlist_page(*, playlist_id, since, state, page_id=None):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return Page(
+            [
+                Video(
+                    youtube_id=f"{playlist_id}-video",
+                    published_at=timezone.make_aware(timezone.datetime(2019, 10, 1)),
+                )
+            ]
+        )
+
+    mocker.patch.object(
+        async_client, "sync_playlist_page", side_effect=sync_playlist_page
+    )
+
+    run_crawl(AsyncCrawler(async_client, concurrency=2), user=user)
+
+    assert sorted(v.youtube_id for v in Video.objects.all()) == [
+        f"PL{i}-video" for i in range(5)
+    ]
+    assert max_in_flight == 2
+    assert all(feed.last_checked > LAST_CHECKED for feed in Feed.objects.all())
+
+
+def video_page(playlist_id, next_page_id=None):
+    return Page(
+        [
+            Video(
+                youtube_id=f"{playlist_id}-{next_page_id}",
+                published_at=timezone.make_aware(timezone.datetime(2019, 10, 1)),
+            )
+        ],
+        next_page_id=next_page_id,
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_crawler_survives_failing_feed(async_client, user, mocker):
+    (broken, working) = playlist_feeds(user, 2)
+
+    async def sync_playlist_page(*, playlist_id, since, state, page_id=None):
+        if playlist_id == broken.youtube_id:
+            raise RuntimeError("Broken feed")
+        return video_page(playlist_id)
+
+    mocker.patch.object(
+        async_client, "sync_playlist_page", side_effect=sync_playlist_page
+    )
+
+    result = run_crawl(AsyncCrawler(async_client), user=user)
+
+    assert result.completed == [working]
+    assert result.pending == [broken]
+    assert [v.youtube_id for v in Video.objects.all()] == ["PL1-None"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_crawler_stops_feeds_between_pages_at_timeout(async_client, user, mocker):
+    (feed,) = playlist_feeds(user, 1)
+    pages = []
+
+    async def sync_playlist_page(*, playlist_id, since, state, page_id=None):
+        pages.append(page_id)
+        await asyncio.sleep(0.5)
+        return video_page(playlist_id, next_page_id=f"page{len(pages) + 1}")
+
+    mocker.patch.object(
+        async_client, "sync_playlist_page", side_effect=sync_playlist_page
+    )
+
+    result = run_crawl(AsyncCrawler(async_client), user=user, timeout=0.1)
+
+    # The page in progress at the timeout is committed, and no more fetched
+    assert result.pending == [feed]
+    assert pages == [None]
+    assert Feed.objects.get(id=feed.id).checkpoint_page_token == "page2"
+    assert [v.youtube_id for v in Video.objects.all()] == ["PL0-page2"]
@@ -0,0 +1,61 @@
+from subscriptions.utils.atom import EntryParser, parse_entries
+
+DELETED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:at="http://purl.org/atompub/tombstones/1.0" xmlns="http://www.w3.org/2005/Atom">
+  <at:deleted-entry ref="yt:video:gone" when="2019-10-01T00:00:00+00:00"/>
+</feed>
+"""
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns:media="http://search.yahoo.com/mrss/" xmlns="http://www.w3.org/2005/Atom">
+  <title>Channel</title>
+  <entry>
+    <yt:videoId>first</yt:videoId>
+    <yt:channelId>UCchannel</yt:channelId>
+    <title>First &amp; best</title>
+    <published>2019-10-02T17:15:22+00:00</published>
+    <updated>2019-10-03T00:00:00+00:00</updated>
+    <media:group>
+      <media:thumbnail url="https://i.ytimg.com/vi/first/hqdefault.jpg"/>
+      <media:description>About the first video</media:description>
+    </media:group>
+  </entry>
+  <entry>
+    <yt:videoId>second</yt:videoId>
+    <yt:channelId>UCchannel</yt:channelId>
+    <title>Second</title>
+    <published>2019-10-01T17:15:22+00:00</published>
+    <updated>2019-10-01T17:15:22+00:00</updated>
+  </entry>
+</feed>
+"""
+
+
+def test_parse_entries():
+    (first, second) = parse_entries(FEED)
+
+    assert first.video_id == "first"
+    assert first.channel_id == "UCchannel"
+    assert first.title == "First & best"
+    assert first.published_at.isoformat() == "2019-10-02T17:15:22+00:00"
+    assert first.description == "About the first video"
+    assert first.thumbnail_url == "https://i.ytimg.com/vi/first/hqdefault.jpg"
+    assert (second.video_id, second.description, second.thumbnail_url) == (
+        "second",
+        "",
+        "",
+    )
+
+
+def test_entries_are_parsed_as_they_arrive():
+    parser = EntryParser()
+    entries = []
+    for start in range(0, len(FEED), 16):
+        entries.extend(parser.feed(FEED[start : start + 16]))
+    entries.extend(parser.close())
+
+    assert entries == parse_entries(FEED)
+
+
+def test_deleted_entries_are_left_out():
+    assert parse_entries(DELETED) == []
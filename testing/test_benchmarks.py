@@ -0,0 +1,31 @@
+from datetime import timedelta
+import pytest
+from testing.benchmark import CRAWL_MODES, run_benchmark
+from testing.fake_youtube import FakeYoutube
+
+
+@pytest.fixture(scope="module")
+def fake():
+    # 20 channels with 90 days of uploads each, four times a day
+    with FakeYoutube(
+        channels=20,
+        videos_per_channel=4 * 90,
+        upload_interval=timedelta(hours=6),
+        latency=0.01,
+    ) as fake:
+        yield fake
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("mode", list(CRAWL_MODES))
+def test_crawl_throughput(mode, fake, user):
+    result = run_benchmark(mode, fake, user)
+    print()
+    print(result)
+
+    # Everything within the 90 day backfill window is stored
+    assert result.videos == 20 * (4 * 90 - 1)
+    if mode == "feed":
+        # The second crawl reads every channel's Atom feed
+        assert fake.requests["videos.xml"] == 20
@@ -1,78 +1,88 @@
+import threading
 from unittest import mock
 import pytest
 from django.utils import timezone
-from subscriptions.models import Subscription, Video
-from subscriptions.utils.crawler import Crawler
+from subscriptions.models import Feed, Subscription, Video
+from subscriptions.utils.crawler import Crawler, backfill_subscription
+from subscriptions.utils.quota import QuotaExhausted
+from subscriptions.utils.types import CrawlMode, Page
+
+
+def subscribe(user, name, youtube_id, type, last_checked=None):
+    """
+    Subscribe the user to a feed, creating the feed if needed
+    """
+    (feed, _) = Feed.objects.get_or_create(
+        youtube_id=youtube_id,
+        defaults={"name": name, "type": type, "last_checked": last_checked},
+    )
+    return Subscription.objects.create(
+        user=user, name=name, youtube_id=youtube_id, type=type, feed=feed
+    )
 
 
 @pytest.mark.django_db
 def test_crawler(client, user, mocker):
     last_checked = timezone.make_aware(timezone.datetime(2019, 9, 1))
     # Set up the database contents
-    sub1 = Subscription.objects.create(
-        user=user,
-        name="outsidexbox",
-        youtube_id="UCKk076mm-7JjLxJcFSXIPJA",
-        type="ItemType.CHANNEL",
-        last_checked=last_checked,
+    subscribe(
+        user,
+        "outsidexbox",
+        "UCKk076mm-7JjLxJcFSXIPJA",
+        "ItemType.CHANNEL",
+        last_checked,
     )
+    subscribe(user, "outsidextra", "ytid", "ItemType.CHANNEL", last_checked)
 
-    sub2 = Subscription.objects.create(
-        user=user,
-        name="outsidextra",
-        youtube_id="ytid",
-        type="ItemType.CHANNEL",
-        last_checked=last_checked,
-    )
-
-    videos = [
-        Video(
-            youtube_id="123",
-            subscription=sub1,
-            published_at=timezone.make_aware(
-                timezone.datetime(2019, 9, 26, 17, 15, 22)
-            ),
-        ),
-        Video(
-            youtube_id="456",
-            subscription=sub2,
-            published_at=timezone.make_aware(
-                timezone.datetime(2019, 9, 26, 17, 15, 22)
-            ),
-        ),
-    ]
+    def fetch_channel_page(*, channel_id, since, page_id=None):
+        return Page(
+            [
+                Video(
+                    youtube_id=f"{channel_id}-123",
+                    published_at=timezone.make_aware(
+                        timezone.datetime(2019, 9, 26, 17, 15, 22)
+                    ),
+                )
+            ]
+        )
 
     custom_now = timezone.now()
-    mocker.patch.object(client, "fetch_latest_from_channel", return_value=videos)
+    mocker.patch.object(client, "fetch_channel_page", side_effect=fetch_channel_page)
     mocker.patch("subscriptions.utils.crawler.timezone.now", return_value=custom_now)
 
-    crawler = Crawler(client, concurrent=False)
+    crawler = Crawler(client, concurrent=False, channel_mode=CrawlMode.SEARCH)
     crawler.crawl(user=user)
 
-    assert [v.youtube_id for v in Video.objects.all()] == [v.youtube_id for v in videos]
-    assert Subscription.objects.get(name="outsidexbox").last_checked == custom_now
-    assert Subscription.objects.get(name="outsidextra").last_checked == custom_now
+    assert sorted(v.youtube_id for v in Video.objects.all()) == [
+        "UCKk076mm-7JjLxJcFSXIPJA-123",
+        "ytid-123",
+    ]
+    assert [
+        v.youtube_id for v in Subscription.objects.get(name="outsidextra").unwatched()
+    ] == ["ytid-123"]
+    assert Feed.objects.get(name="outsidexbox").last_checked == custom_now
+    assert Feed.objects.get(name="outsidextra").last_checked == custom_now
 
 
 @pytest.mark.django_db
 def test_crawler_with_existing_videos(client, user):
     last_checked = timezone.make_aware(timezone.datetime(2019, 9, 1))
     # Set up the database contents
-    sub = Subscription.objects.create(
-        user=user,
-        name="outsidexbox",
-        youtube_id="UCKk076mm-7JjLxJcFSXIPJA",
-        type="ItemType.CHANNEL",
-        last_checked=last_checked,
+    sub = subscribe(
+        user,
+        "outsidexbox",
+        "UCKk076mm-7JjLxJcFSXIPJA",
+        "ItemType.CHANNEL",
+        last_checked,
     )
 
     existing_video = Video(
         youtube_id="7v-KIxHOhrs",
         published_at=timezone.make_aware(timezone.datetime(2019, 9, 26, 17, 15, 22)),
     )
-    existing_video.subscription = sub
-    existing_video.watched = True
+    existing_video.feed = sub.feed
     existing_video.save()
+    sub.videos.add(existing_video, through_defaults={"watched": True})
 
     assert len(Video.objects.all()) == 1
 
@@ -85,49 +95,263 @@ def test_crawler_with_existing_videos(client, user):
     ]
 
     custom_now = timezone.now()
-    with mock.patch.object(client, "fetch_latest_from_channel") as fetch_latest:
+    with mock.patch.object(client, "fetch_channel_page") as fetch_page:
         with mock.patch("subscriptions.utils.crawler.timezone.now") as mock_now:
             mock_now.return_value = custom_now
-            fetch_latest.return_value = videos
+            fetch_page.return_value = Page(videos)
 
-            crawler = Crawler(client, concurrent=False)
+            crawler = Crawler(client, concurrent=False, channel_mode=CrawlMode.SEARCH)
             crawler.crawl(user=user)
 
     db_videos = Video.objects.all()
     assert [v.youtube_id for v in db_videos] == [v.youtube_id for v in videos]
-    assert db_videos[0].watched
-    assert not db_videos[1].watched
-    assert Subscription.objects.get(name="outsidexbox").last_checked == custom_now
+    assert [v.youtube_id for v in sub.unwatched()] == ["_vdipCXyrFw"]
+    assert Feed.objects.get(name="outsidexbox").last_checked == custom_now
 
 
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "last_checked", [None, timezone.make_aware(timezone.datetime(2019, 9, 1))]
 )
-def test_crawler_for_single_subscription(client, last_checked, user):
+def test_crawler_for_single_feed(client, last_checked, user):
     latest_update = timezone.make_aware(timezone.datetime(2019, 10, 1))
 
-    # Create two subscriptions that have one new video each
-    sub = Subscription.objects.create(
-        user=user,
-        name="outsidexbox",
-        youtube_id="UCKk076mm-7JjLxJcFSXIPJA",
-        type="ItemType.CHANNEL",
-        last_checked=last_checked,
+    sub = subscribe(
+        user,
+        "outsidexbox",
+        "UCKk076mm-7JjLxJcFSXIPJA",
+        "ItemType.CHANNEL",
+        last_checked,
     )
 
-    videos = [Video(youtube_id="123", subscription=sub, published_at=latest_update)]
+    videos = [Video(youtube_id="123", published_at=latest_update)]
 
     custom_now = timezone.now()
-    with mock.patch.object(client, "fetch_latest_from_channel") as fetch_latest:
+    with mock.patch.object(client, "fetch_channel_page") as fetch_page:
         with mock.patch("subscriptions.utils.crawler.timezone.now") as mock_now:
             mock_now.return_value = custom_now
-            fetch_latest.return_value = videos
+            fetch_page.return_value = Page(videos)
 
-            crawler = Crawler(client, concurrent=False)
-            crawler.crawl_subscription(sub)
+            crawler = Crawler(client, concurrent=False, channel_mode=CrawlMode.SEARCH)
+            crawler.crawl_feed(sub.feed)
 
     db_videos = Video.objects.all()
     assert len(db_videos) == 1
     assert db_videos[0].youtube_id == "123"
-    assert Subscription.objects.get(name="outsidexbox").last_checked == custom_now
+    assert Feed.objects.get(name="outsidexbox").last_checked == custom_now
+
+
+@pytest.mark.django_db
+def test_crawler_fetches_shared_feeds_once(client, django_user_model, mocker):
+    users = [django_user_model.objects.create_user(name) for name in ("a", "b")]
+    subs = [
+        subscribe(user, "outsidexbox", "PLoutsidexbox", "ItemType.PLAYLIST")
+        for user in users
+    ]
+    fetch_playlist = mocker.patch.object(
+        client,
+        "sync_playlist_page",
+        return_value=Page([Video(youtube_id="123", published_at=timezone.now())]),
+    )
+
+    result = Crawler(client, concurrent=False).crawl()
+
+    assert result.completed == [subs[0].feed]
+    fetch_playlist.assert_called_once()
+    for sub in subs:
+        assert [v.youtube_id for v in sub.unwatched()] == ["123"]
+
+
+@pytest.mark.django_db
+def test_backfill_subscription(user, django_user_model):
+    now = timezone.now()
+    sub = subscribe(user, "outsidexbox", "PLoutsidexbox", "ItemType.PLAYLIST", now)
+    sub.feed.videos.create(
+        youtube_id="old", published_at=now - timezone.timedelta(days=91)
+    )
+    sub.feed.videos.create(
+        youtube_id="new", published_at=now - timezone.timedelta(days=1)
+    )
+
+    late = subscribe(
+        django_user_model.objects.create_user("b"),
+        "outsidexbox",
+        "PLoutsidexbox",
+        "ItemType.PLAYLIST",
+    )
+    backfill_subscription(late, now)
+
+    assert [v.youtube_id for v in late.unwatched()] == ["new"]
+
+
+@pytest.mark.django_db
+def test_crawler_uses_uploads_playlist(client, user, mocker):
+    last_checked = timezone.make_aware(timezone.datetime(2019, 9, 1))
+    sub = subscribe(
+        user,
+        "outsidexbox",
+        "UCKk076mm-7JjLxJcFSXIPJA",
+        "ItemType.CHANNEL",
+        last_checked,
+    )
+
+    videos = [
+        Video(
+            youtube_id="123",
+            published_at=timezone.make_aware(timezone.datetime(2019, 10, 1)),
+        )
+    ]
+    fetch_uploads = mocker.patch.object(
+        client, "fetch_uploads_playlist_id", return_value="UUKk076mm-7JjLxJcFSXIPJA"
+    )
+    fetch_playlist = mocker.patch.object(
+        client, "fetch_playlist_page", return_value=Page(videos)
+    )
+    fetch_channel = mocker.patch.object(client, "fetch_channel_page")
+
+    crawler = Crawler(client, concurrent=False)
+    crawler.crawl_feed(sub.feed)
+
+    fetch_uploads.assert_called_once_with("UCKk076mm-7JjLxJcFSXIPJA")
+    fetch_playlist.assert_called_once_with(
+        playlist_id="UUKk076mm-7JjLxJcFSXIPJA",
+        since=last_checked,
+        page_id=None,
+        newest_first=True,
+    )
+    fetch_channel.assert_not_called()
+    assert (
+        Feed.objects.get(name="outsidexbox").uploads_playlist_id
+        == "UUKk076mm-7JjLxJcFSXIPJA"
+    )
+    assert [v.youtube_id for v in Video.objects.all()] == ["123"]
+
+    # The uploads playlist is only looked up once
+    fetch_playlist.return_value = Page([])
+    crawler.crawl_feed(Feed.objects.get(name="outsidexbox"))
+    fetch_uploads.assert_called_once()
+
+
+def playlist_feed(user, name):
+    return subscribe(
+        user,
+        name,
+        f"PL{name}",
+        "ItemType.PLAYLIST",
+        timezone.make_aware(timezone.datetime(2019, 9, 1)),
+    ).feed
+
+
+@pytest.mark.django_db
+def test_crawl_timeout_leaves_feeds_pending(client, user, mocker):
+    first = playlist_feed(user, "first")
+    second = playlist_feed(user, "second")
+    monotonic = mocker.patch(
+        "subscriptions.utils.crawler.time.monotonic", return_value=0
+    )
+
+    def sync_playlist_page(*, playlist_id, since, state, page_id=None):
+        # The crawl runs out of time part-way through the first feed
+        monotonic.return_value = 100
+        return Page(
+            [
+                Video(
+                    youtube_id=f"{playlist_id}-1",
+                    published_at=timezone.make_aware(timezone.datetime(2019, 10, 1)),
+                )
+            ],
+            next_page_id="page2",
+        )
+
+    mocker.patch.object(client, "sync_playlist_page", side_effect=sync_playlist_page)
+
+    result = Crawler(client, concurrent=False).crawl(user=user, timeout=10)
+
+    assert result.completed == []
+    assert sorted(result.pending, key=str) == [first, second]
+    # The page committed before the deadline is kept, but the feed is not
+    # marked as checked
+    assert [v.youtube_id for v in Video.objects.all()] == ["PLfirst-1"]
+    feed = Feed.objects.get(name="first")
+    assert feed.last_checked == first.last_checked
+    assert feed.checkpoint_page_token == "page2"
+
+
+@pytest.mark.django_db
+def test_interrupted_crawl_resumes_from_checkpoint(client, user, mocker):
+    feed = playlist_feed(user, "first")
+    since = feed.last_checked
+    published = [
+        timezone.make_aware(timezone.datetime(2019, 10, day)) for day in (1, 2, 3)
+    ]
+    fetch_page = mocker.patch.object(
+        client,
+        "sync_playlist_page",
+        side_effect=[
+            Page([Video(youtube_id="1", published_at=published[0])], "page2"),
+            QuotaExhausted(),
+            Page([Video(youtube_id="2", published_at=published[1])], None),
+            Page([Video(youtube_id="3", published_at=published[2])], None),
+        ],
+    )
+    crawler = Crawler(client, concurrent=False)
+
+    with pytest.raises(QuotaExhausted):
+        crawler.crawl_feed(feed)
+    feed = Feed.objects.get(id=feed.id)
+    assert feed.checkpoint_page_token == "page2"
+    assert feed.high_water_mark == published[0]
+
+    # The committed page is not fetched again, and the resumed crawl covers the
+    # same period
+    crawler.crawl_feed(feed)
+    # The next crawl starts from the newest video published
+    crawler.crawl_feed(feed)
+
+    assert [
+        (kwargs["since"], kwargs["page_id"])
+        for (_, kwargs) in fetch_page.call_args_list
+    ] == [
+        (since, None),
+        (since, "page2"),
+        (since, "page2"),
+        (published[1], None),
+    ]
+    assert sorted(v.youtube_id for v in Video.objects.all()) == ["1", "2", "3"]
+    feed.refresh_from_db()
+    assert feed.checkpoint_since is None
+    assert feed.checkpoint_page_token is None
+    assert feed.high_water_mark == published[2]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_crawl_stops_feeds_in_progress_at_timeout(client, user, mocker):
+    fast = playlist_feed(user, "fast")
+    slow = playlist_feed(user, "slow")
+    release = threading.Event()
+    slow_pages = []
+
+    def sync_playlist_page(*, playlist_id, since, state, page_id=None):
+        if playlist_id == "PLslow":
+            release.wait(5)
+            slow_pages.append(page_id)
+            return Page([], next_page_id=f"page{len(slow_pages) + 1}")
+        return Page([])
+
+    mocker.patch.object(client, "sync_playlist_page", side_effect=sync_playlist_page)
+    crawler = Crawler(client)
+    timer = threading.Timer(1, release.set)
+    timer.start()
+    try:
+        result = crawler.crawl(user=user, timeout=0.5)
+        # The page in progress at the timeout is committed before the crawl
+        # returns, and no more are fetched
+        assert Feed.objects.get(name="slow").checkpoint_page_token == "page2"
+    finally:
+        release.set()
+        crawler.pool.shutdown()
+
+    assert result.completed == [fast]
+    assert result.pending == [slow]
+    assert Feed.objects.get(name="fast").last_checked > fast.last_checked
+    assert slow_pages == [None]
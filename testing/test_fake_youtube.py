@@ -0,0 +1,298 @@
+from datetime import timedelta
+import asyncio
+import pytest
+from django.db import connections
+from django.utils import timezone
+from subscriptions.models import Feed, Subscription
+from subscriptions.utils.async_client import AsyncYoutubeClient
+from subscriptions.utils.async_crawler import AsyncCrawler, database
+from subscriptions.utils.crawler import Crawler
+from subscriptions.utils.jobs import CrawlWorker, enqueue
+from subscriptions.utils.response_cache import ResponseCache
+from subscriptions.utils.types import CrawlMode, PlaylistState
+from subscriptions.utils.youtube_client import YoutubeClient
+from testing.fake_youtube import FakeYoutube
+
+
+@pytest.fixture(scope="module")
+def fake():
+    with FakeYoutube(channels=2, videos_per_channel=120) as fake:
+        yield fake
+
+
+@pytest.fixture
+def fake_client(fake):
+    fake.requests.clear()
+    return YoutubeClient("key", base_url=fake.base_url)
+
+
+def test_fetch_uploads_playlist(fake, fake_client):
+    (channel_id, channel) = next(iter(fake.channels.items()))
+    since = timezone.now() - timedelta(days=30)
+
+    playlist_id = fake_client.fetch_uploads_playlist_id(channel_id)
+    videos = list(
+        fake_client.fetch_latest_from_playlist(
+            playlist_id=playlist_id, since=since, newest_first=True
+        )
+    )
+
+    assert playlist_id == channel["uploads"]
+    # Two uploads a day over 30 days
+    assert len(videos) == 59
+    assert all(video.published_at > since for video in videos)
+    assert all(video.duration is not None for video in videos)
+    assert fake.requests == {"channels": 1, "playlistItems": 2, "videos": 2}
+
+
+def test_fetch_from_channel_search(fake, fake_client):
+    channel_id = next(iter(fake.channels))
+    since = timezone.now() - timedelta(days=30)
+
+    videos = list(
+        fake_client.fetch_latest_from_channel(channel_id=channel_id, since=since)
+    )
+
+    assert len(videos) == 59
+    assert fake.requests == {"search": 2, "videos": 2}
+
+
+def test_search(fake, fake_client):
+    results = list(fake_client.search("channel 1"))
+
+    assert [result.title for result in results] == ["Channel 1"]
+
+
+def test_unchanged_responses_are_not_modified(fake, fake_client):
+    (channel_id, channel) = next(iter(fake.channels.items()))
+
+    class DictCache(ResponseCache):
+        def __init__(self):
+            self.entries = {}
+
+        def get(self, url, params):
+            return self.entries.get((url, repr(sorted(params.items()))))
+
+        def set(self, url, params, etag, data):
+            self.entries[(url, repr(sorted(params.items())))] = (etag, data)
+
+    fake_client.cache = DictCache()
+    since = timezone.now() - timedelta(days=365)
+    (first, second) = [
+        fake_client.fetch_playlist_page(playlist_id=channel["uploads"], since=since)
+        for _ in range(2)
+    ]
+
+    assert [video.youtube_id for video in first.videos] == [
+        video.youtube_id for video in second.videos
+    ]
+    assert fake_client.stats["cache_hits"] == 1
+
+
+def test_transient_errors_are_retried(mocker):
+    mocker.patch("subscriptions.utils.youtube_client.clock.sleep")
+    with FakeYoutube(channels=1, videos_per_channel=10, error_rate=0.5) as fake:
+        client = YoutubeClient("key", base_url=fake.base_url, max_retries=20)
+        channel_id = next(iter(fake.channels))
+
+        assert client.fetch_uploads_playlist_id(channel_id).startswith("UU")
+
+    assert client.stats["retries"] == fake.requests["channels"] - 1
+
+
+@pytest.mark.django_db
+def test_first_crawl_through_worker(fake, fake_client, user):
+    (channel_id, channel) = next(iter(fake.channels.items()))
+    sub = Subscription.objects.create(
+        user=user, name=channel["title"], youtube_id=channel_id, type="ItemType.CHANNEL"
+    )
+    enqueue(sub.feed)
+    # Crawl a single page each time the worker runs
+    worker = CrawlWorker(Crawler(fake_client), lease=timedelta(0))
+
+    worker.run_once()
+    assert sub.unwatched().count() == 50
+
+    while worker.run_once():
+        pass
+    # Every video is within the 90 day backfill window
+    assert sub.unwatched().count() == 120
+    assert fake.requests == {"channels": 1, "playlistItems": 3, "videos": 3}
+
+
+@pytest.mark.django_db
+def test_playlist_is_synced_incrementally(user):
+    with FakeYoutube(channels=1, videos_per_channel=120) as fake:
+        client = YoutubeClient("key", base_url=fake.base_url)
+        crawler = Crawler(client, concurrent=False)
+        playlist_id = next(iter(fake.playlists))
+        sub = Subscription.objects.create(
+            user=user, name="playlist", youtube_id=playlist_id, type="ItemType.PLAYLIST"
+        )
+
+        crawler.crawl_feed(sub.feed)
+        assert sub.unwatched().count() == 120
+        assert fake.requests["playlistItems"] == 3
+
+        # An unchanged playlist is not paged through again
+        fake.requests.clear()
+        crawler.crawl_feed(Feed.objects.get(id=sub.feed_id))
+        assert fake.requests == {"playlistItems": 1}
+
+        # Neither is one with a video added at the top
+        fake.upload(next(iter(fake.channels)))
+        fake.requests.clear()
+        crawler.crawl_feed(Feed.objects.get(id=sub.feed_id))
+        assert fake.requests == {"playlistItems": 1, "videos": 1}
+        assert sub.unwatched().count() == 121
+
+
+@pytest.mark.django_db
+def test_playlist_with_swapped_item_is_paged_through(user):
+    with FakeYoutube(channels=1, videos_per_channel=120) as fake:
+        crawler = Crawler(
+            YoutubeClient("key", base_url=fake.base_url), concurrent=False
+        )
+        playlist_id = next(iter(fake.playlists))
+        sub = Subscription.objects.create(
+            user=user, name="playlist", youtube_id=playlist_id, type="ItemType.PLAYLIST"
+        )
+        crawler.crawl_feed(sub.feed)
+
+        # An item is removed, and another added on the last page, so the
+        # playlist changes without growing
+        playlist = fake.playlists[playlist_id]
+        video = fake.upload(next(iter(fake.channels)))
+        playlist.remove(video)
+        playlist.append(video)
+        playlist.pop(0)
+        fake.requests.clear()
+        crawler.crawl_feed(Feed.objects.get(id=sub.feed_id))
+
+        assert fake.requests["playlistItems"] == 3
+        assert sub.unwatched().filter(youtube_id=video["id"]).exists()
+
+
+@pytest.mark.django_db
+def test_playlist_sync_stops_once_the_rest_is_unchanged(user):
+    with FakeYoutube(channels=1, videos_per_channel=300) as fake:
+        crawler = Crawler(
+            YoutubeClient("key", base_url=fake.base_url), concurrent=False
+        )
+        playlist_id = next(iter(fake.playlists))
+        playlist = fake.playlists[playlist_id]
+        sub = Subscription.objects.create(
+            user=user, name="playlist", youtube_id=playlist_id, type="ItemType.PLAYLIST"
+        )
+        crawler.crawl_feed(sub.feed)
+        assert fake.requests["playlistItems"] == 6
+
+        def synced():
+            fake.requests.clear()
+            crawler.crawl_feed(Feed.objects.get(id=sub.feed_id))
+            state = PlaylistState.from_json(
+                Feed.objects.get(id=sub.feed_id).playlist_state
+            )
+            assert state.split(state.item_hashes) == [
+                PlaylistState.hash_item(f"{playlist_id}.{video['id']}")
+                for video in playlist
+            ]
+            return fake.requests["playlistItems"]
+
+        # An item removed from the second page shifts the rest up by one
+        del playlist[60]
+        assert synced() == 2
+
+        # An item added on the third page shifts them back
+        video = fake.upload(next(iter(fake.channels)))
+        playlist.remove(video)
+        playlist.insert(120, video)
+        assert synced() == 3
+        assert sub.unwatched().filter(youtube_id=video["id"]).exists()
+
+
+@pytest.mark.django_db
+def test_channel_is_crawled_through_atom_feed(user):
+    with FakeYoutube(channels=1, videos_per_channel=30) as fake:
+        client = YoutubeClient("key", base_url=fake.base_url, feeds_url=fake.feeds_url)
+        crawler = Crawler(client, concurrent=False, channel_mode=CrawlMode.FEED)
+        channel_id = next(iter(fake.channels))
+        sub = Subscription.objects.create(
+            user=user, name="channel", youtube_id=channel_id, type="ItemType.CHANNEL"
+        )
+
+        # The first crawl backfills through the uploads playlist
+        crawler.crawl_feed(sub.feed)
+        assert sub.unwatched().count() == 30
+        assert fake.requests["videos.xml"] == 0
+
+        # Later crawls read the feed, and only look up the new videos
+        fake.upload(channel_id, "New video")
+        fake.requests.clear()
+        crawler.crawl_feed(Feed.objects.get(id=sub.feed_id))
+        assert fake.requests == {"videos.xml": 1, "videos": 1}
+        newest = sub.unwatched().first()
+        assert newest.name == "New video"
+        assert newest.duration is not None
+
+        # An unchanged feed is not downloaded again
+        fake.requests.clear()
+        crawler.crawl_feed(Feed.objects.get(id=sub.feed_id))
+        assert fake.requests == {"videos.xml": 1}
+        assert client.stats["feeds_unchanged"] == 1
+
+
+def upload_burst(fake, channel_id):
+    """
+    Upload more videos than the channel's Atom feed lists
+    """
+    return [fake.upload(channel_id, f"Burst {i}") for i in range(16)]
+
+
+@pytest.mark.django_db
+def test_incomplete_atom_feed_falls_back_to_uploads(user):
+    with FakeYoutube(channels=1, videos_per_channel=30) as fake:
+        client = YoutubeClient("key", base_url=fake.base_url, feeds_url=fake.feeds_url)
+        crawler = Crawler(client, concurrent=False, channel_mode=CrawlMode.FEED)
+        channel_id = next(iter(fake.channels))
+        sub = Subscription.objects.create(
+            user=user, name="channel", youtube_id=channel_id, type="ItemType.CHANNEL"
+        )
+        crawler.crawl_feed(sub.feed)
+
+        # The feed's 15 entries are all new, so the 16th is only found through
+        # the uploads playlist
+        upload_burst(fake, channel_id)
+        fake.requests.clear()
+        crawler.crawl_feed(Feed.objects.get(id=sub.feed_id))
+
+        assert fake.requests["videos.xml"] == 1
+        assert fake.requests["playlistItems"] == 1
+        assert sub.unwatched().count() == 46
+        assert Feed.objects.get(id=sub.feed_id).atom_state is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_incomplete_atom_feed_falls_back_to_uploads_async(user):
+    async def crawl(fake, feed_id):
+        async with AsyncYoutubeClient(
+            "key", base_url=fake.base_url, feeds_url=fake.feeds_url
+        ) as client:
+            crawler = AsyncCrawler(client, channel_mode=CrawlMode.FEED)
+            await crawler.crawl_feed(await database(Feed.objects.get)(id=feed_id))
+        await database(connections.close_all)()
+
+    with FakeYoutube(channels=1, videos_per_channel=30) as fake:
+        channel_id = next(iter(fake.channels))
+        sub = Subscription.objects.create(
+            user=user, name="channel", youtube_id=channel_id, type="ItemType.CHANNEL"
+        )
+        asyncio.run(crawl(fake, sub.feed_id))
+
+        upload_burst(fake, channel_id)
+        fake.requests.clear()
+        asyncio.run(crawl(fake, sub.feed_id))
+
+        assert fake.requests["videos.xml"] == 1
+        assert fake.requests["playlistItems"] == 1
+        assert sub.unwatched().count() == 46
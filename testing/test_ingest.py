@@ -0,0 +1,152 @@
+from datetime import time
+import threading
+import pytest
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from subscriptions.models import Subscription, Video
+from subscriptions.utils.ingest import IngestResult, ingest_videos
+
+PUBLISHED_AT = timezone.make_aware(timezone.datetime(2019, 9, 26, 17, 15, 22))
+
+
+def make_video(youtube_id, name="", **kwargs):
+    return Video(youtube_id=youtube_id, name=name, published_at=PUBLISHED_AT, **kwargs)
+
+
+@pytest.mark.django_db
+def test_ingest_inserts_new_videos(subscription):
+    videos = [make_video(str(i)) for i in range(5)]
+
+    result = ingest_videos(subscription.feed, videos)
+
+    assert result == IngestResult(inserted=5)
+    assert sorted(v.youtube_id for v in subscription.unwatched()) == [
+        str(i) for i in range(5)
+    ]
+
+
+@pytest.mark.django_db
+def test_ingest_fans_out_to_every_subscriber(django_user_model):
+    subs = [
+        Subscription.objects.create(
+            user=django_user_model.objects.create_user(name), name=name, youtube_id="1"
+        )
+        for name in ("a", "b")
+    ]
+
+    ingest_videos(subs[0].feed, [make_video("video")])
+
+    assert Video.objects.count() == 1
+    for sub in subs:
+        assert [v.youtube_id for v in sub.unwatched()] == ["video"]
+
+
+@pytest.mark.django_db
+def test_ingest_updates_changed_videos_and_skips_the_rest(subscription, user):
+    feed = subscription.feed
+    make_video("same", name="Same", feed=feed).save()
+    make_video("renamed", name="Old", feed=feed).save()
+    other = Subscription.objects.create(user=user, name="bar", youtube_id="other")
+    make_video("elsewhere", name="Other", feed=other.feed).save()
+
+    result = ingest_videos(
+        feed,
+        [
+            make_video("same", name="Same"),
+            make_video("renamed", name="New"),
+            make_video("elsewhere", name="Elsewhere"),
+            make_video("elsewhere", name="Elsewhere"),
+        ],
+    )
+
+    assert result == IngestResult(inserted=1, updated=1, skipped=2)
+    assert Video.objects.get(feed=feed, youtube_id="renamed").name == "New"
+    assert Video.objects.get(feed=other.feed, youtube_id="elsewhere").name == "Other"
+    # Only the new video is added to the subscriber's feed
+    assert [v.youtube_id for v in subscription.unwatched()] == ["elsewhere"]
+
+
+@pytest.mark.django_db
+def test_ingest_queries_per_batch(subscription):
+    make_video("0", name="Old", feed=subscription.feed).save()
+    videos = [make_video(str(i), name="New") for i in range(10)]
+
+    with CaptureQueriesContext(connection) as queries:
+        result = ingest_videos(subscription.feed, videos, batch_size=5)
+
+    assert result == IngestResult(inserted=9, updated=1)
+    # Per batch: savepoint, feed lock, lookup, insert, subscribers, new video ids, insert
+    # entries, subscriber counters, an update for the first batch only, and
+    # release
+    assert len(queries) == 19
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_ingests_count_each_video_once(subscription):
+    results = []
+
+    def ingest_in_thread():
+        results.append(
+            ingest_videos(subscription.feed, [make_video("1"), make_video("2")])
+        )
+        connection.close()
+
+    with transaction.atomic():
+        ingest_videos(subscription.feed, [make_video("1")])
+        # The other ingest waits for this one to commit
+        thread = threading.Thread(target=ingest_in_thread)
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive()
+    thread.join(5)
+
+    assert results == [IngestResult(inserted=1, skipped=1)]
+    assert subscription.feed.videos.count() == 2
+
+
+@pytest.mark.django_db
+def test_ingest_stores_buffered_videos_on_error(subscription):
+    def videos():
+        yield make_video("1")
+        raise RuntimeError()
+
+    with pytest.raises(RuntimeError):
+        ingest_videos(subscription.feed, videos())
+
+    assert [v.youtube_id for v in subscription.feed.videos.all()] == ["1"]
+
+
+@pytest.mark.django_db
+def test_ingest_updates_subscriber_counters(subscription):
+    videos = [make_video(str(i), duration=time(0, 10, i)) for i in range(3)]
+    videos[0].published_at += timezone.timedelta(days=1)
+
+    ingest_videos(subscription.feed, videos)
+    subscription.refresh_from_db()
+
+    assert subscription.unwatched_count == 3
+    assert subscription.unwatched_duration == timezone.timedelta(minutes=30, seconds=3)
+    assert subscription.latest_published_at == videos[0].published_at
+
+    # A changed duration is counted too
+    ingest_videos(subscription.feed, [make_video("1", duration=time(1, 10, 1))])
+    subscription.refresh_from_db()
+
+    assert subscription.unwatched_duration == timezone.timedelta(
+        hours=1, minutes=30, seconds=3
+    )
+
+
+@pytest.mark.django_db
+def test_rebuild_counters(subscription):
+    ingest_videos(subscription.feed, [make_video(str(i)) for i in range(3)])
+    subscription.entries.filter(video__youtube_id="0").update(watched=True)
+    Subscription.objects.update(unwatched_count=0)
+
+    call_command("rebuild_counters", "--batch-size", "1")
+
+    subscription.refresh_from_db()
+    assert subscription.unwatched_count == 2
+    assert subscription.unwatched_duration == timezone.timedelta(0)
@@ -0,0 +1,169 @@
+import threading
+import pytest
+from django.db import connection, transaction
+from django.utils import timezone
+from subscriptions.models import CrawlJob, Feed, Subscription
+from subscriptions.utils import jobs
+from subscriptions.utils.crawler import CrawlDeadlineExceeded
+from subscriptions.utils.ingest import IngestResult
+from subscriptions.utils.jobs import CrawlWorker, claim, complete, enqueue, retry
+from subscriptions.utils.quota import QuotaExhausted
+from subscriptions.utils.types import CrawlResult
+
+MINUTE = timezone.timedelta(minutes=1)
+
+
+def make_feeds(user, count):
+    return [
+        Subscription.objects.create(user=user, name=str(i), youtube_id=str(i)).feed
+        for i in range(count)
+    ]
+
+
+@pytest.mark.django_db
+def test_enqueue_once_per_feed(subscription):
+    job = enqueue(subscription.feed)
+
+    assert enqueue(subscription.feed) == job
+    complete(claim("worker", 1)[0])
+    assert enqueue(subscription.feed) != job
+
+
+@pytest.mark.django_db
+def test_claim_leases_jobs(user):
+    feeds = make_feeds(user, 3)
+    for feed in feeds:
+        enqueue(feed)
+    enqueue(Feed.objects.create(youtube_id="later"), timezone.now() + MINUTE)
+
+    first = claim("first", 2)
+    second = claim("second", 2)
+
+    assert [job.feed for job in first + second] == feeds
+    assert all(job.status == CrawlJob.Status.RUNNING for job in first + second)
+    assert {job.leased_by for job in first} == {"first"}
+    assert claim("third", 2) == []
+
+
+@pytest.mark.django_db
+def test_expired_leases_are_claimed_again(subscription):
+    enqueue(subscription.feed)
+    [lost] = claim("dead", 1, lease=-MINUTE)
+
+    [job] = claim("alive", 1)
+
+    assert job.id == lost.id
+    assert job.attempts == 2
+    # The worker that lost the lease cannot finish the job
+    assert not complete(lost)
+    assert complete(job)
+    assert CrawlJob.objects.get().status == CrawlJob.Status.DONE
+
+
+@pytest.mark.django_db
+def test_retry_backs_off_then_gives_up(subscription, mocker):
+    enqueue(subscription.feed)
+    now = timezone.now()
+    mocker.patch("subscriptions.utils.jobs.timezone.now", return_value=now)
+
+    for attempt in range(1, jobs.MAX_ATTEMPTS):
+        [job] = claim("worker", 1)
+        assert job.attempts == attempt
+        assert retry(job)
+        job.refresh_from_db()
+        assert job.status == CrawlJob.Status.PENDING
+        assert job.run_after == now + jobs.RETRY_DELAY * 2 ** (attempt - 1)
+        now = job.run_after
+        jobs.timezone.now.return_value = now
+
+    [job] = claim("worker", 1)
+    assert retry(job)
+    job.refresh_from_db()
+    assert job.status == CrawlJob.Status.FAILED
+    # The feed is left alone for a while rather than queued again at once
+    assert Feed.objects.get().next_check_at > now
+
+
+@pytest.mark.django_db(transaction=True)
+def test_claim_skips_locked_jobs(user):
+    (locked, free) = make_feeds(user, 2)
+    enqueue(locked)
+    enqueue(free)
+    claimed = []
+
+    with transaction.atomic():
+        CrawlJob.objects.select_for_update().get(feed=locked)
+
+        def claim_in_thread():
+            claimed.extend(claim("other", 2))
+            connection.close()
+
+        thread = threading.Thread(target=claim_in_thread)
+        thread.start()
+        thread.join(5)
+
+    assert [job.feed for job in claimed] == [free]
+
+
+@pytest.mark.django_db
+def test_worker_completes_and_retries_jobs(user, mocker):
+    (done, pending) = make_feeds(user, 2)
+    Feed.objects.update(last_checked=timezone.now())
+    enqueue(done)
+    enqueue(pending)
+    crawler = mocker.Mock()
+    crawler.crawl_feeds.return_value = CrawlResult(completed=[done], pending=[pending])
+
+    assert CrawlWorker(crawler, name="worker").run_once() == 2
+
+    assert CrawlJob.objects.get(feed=done).status == CrawlJob.Status.DONE
+    job = CrawlJob.objects.get(feed=pending)
+    assert job.status == CrawlJob.Status.PENDING
+    assert job.run_after > timezone.now()
+    assert CrawlWorker(crawler, name="worker").run_once() == 0
+
+
+@pytest.mark.django_db
+def test_first_crawl_is_resumed(subscription, mocker):
+    job = enqueue(subscription.feed)
+    crawler = mocker.Mock()
+
+    def crawl_feed(feed, deadline, progress):
+        progress += IngestResult(inserted=50)
+        # Run out of time after the first page of the first run
+        if crawler.crawl_feed.call_count == 1:
+            raise CrawlDeadlineExceeded()
+        return progress
+
+    crawler.crawl_feed.side_effect = crawl_feed
+    worker = CrawlWorker(crawler, name="worker")
+
+    worker.run_once()
+    job.refresh_from_db()
+    assert job.status == CrawlJob.Status.PENDING
+    assert job.attempts == 0
+    assert job.videos_added == 50
+
+    worker.run_once()
+    job.refresh_from_db()
+    assert job.status == CrawlJob.Status.DONE
+    assert job.videos_added == 100
+
+
+@pytest.mark.django_db
+def test_failed_first_crawl_is_retried(subscription, mocker):
+    job = enqueue(subscription.feed)
+    crawler = mocker.Mock()
+
+    def crawl_feed(feed, deadline, progress):
+        progress += IngestResult(inserted=50)
+        raise QuotaExhausted()
+
+    crawler.crawl_feed.side_effect = crawl_feed
+
+    CrawlWorker(crawler, name="worker").run_once()
+
+    job.refresh_from_db()
+    assert job.status == CrawlJob.Status.PENDING
+    assert job.videos_added == 50
+    assert job.run_after > timezone.now()
@@ -0,0 +1,114 @@
+import json
+import logging
+import pytest
+from django.test import Client
+from subscriptions.models import Subscription
+from subscriptions.utils import metrics
+from subscriptions.utils.crawler import Crawler
+from subscriptions.utils.youtube_client import YoutubeClient
+from testing.fake_youtube import FakeYoutube
+
+
+def test_render():
+    registry = metrics.Registry()
+    requests = registry.register(
+        metrics.Counter("requests_total", "Requests", ["endpoint"])
+    )
+    seconds = registry.register(
+        metrics.Histogram("seconds", "Duration", buckets=(0.1, 1))
+    )
+
+    requests.inc(endpoint="videos")
+    requests.inc(2, endpoint='say "hi"')
+    seconds.observe(0.5)
+    seconds.observe(5)
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="say \\"hi\\""} 2',
+        'requests_total{endpoint="videos"} 1',
+        "# HELP seconds Duration",
+        "# TYPE seconds histogram",
+        'seconds_bucket{le="0.1"} 0',
+        'seconds_bucket{le="1"} 1',
+        'seconds_bucket{le="+Inf"} 2',
+        "seconds_sum 5.5",
+        "seconds_count 2",
+    ]
+
+
+def test_labels_must_match():
+    counter = metrics.Counter("requests_total", "Requests", ["endpoint"])
+
+    with pytest.raises(ValueError):
+        counter.inc(status=200)
+
+
+def crawl_logs(caplog):
+    return [
+        json.loads(record.args[0])
+        for record in caplog.records
+        if record.msg == "Crawled feed %s"
+    ]
+
+
+@pytest.mark.django_db
+def test_crawl_is_recorded(user, caplog):
+    caplog.set_level(logging.INFO, logger="ytvd.subscriptions.utils")
+    requests = metrics.REQUESTS.value(endpoint="playlistItems", status=200)
+    completed = metrics.CRAWLS.value(outcome="completed")
+    inserted = metrics.CRAWL_VIDEOS.value(result="inserted")
+
+    with FakeYoutube(channels=1, videos_per_channel=60) as fake:
+        crawler = Crawler(YoutubeClient("key", base_url=fake.base_url))
+        channel_id = next(iter(fake.channels))
+        sub = Subscription.objects.create(
+            user=user, name="channel", youtube_id=channel_id, type="ItemType.CHANNEL"
+        )
+        crawler.crawl_feed(sub.feed)
+
+    assert metrics.REQUESTS.value(endpoint="playlistItems", status=200) == requests + 2
+    assert metrics.CRAWLS.value(outcome="completed") == completed + 1
+    assert metrics.CRAWL_VIDEOS.value(result="inserted") == inserted + 60
+    assert metrics.CRAWL_SECONDS.count(type="ItemType.CHANNEL") > 0
+
+    [log] = crawl_logs(caplog)
+    assert log["feed_id"] == sub.feed_id
+    assert log["outcome"] == "completed"
+    assert log["pages"] == 2
+    assert log["requests"] == {"channels": 1, "playlistItems": 2, "videos": 2}
+    assert log["quota_units"] == 5
+    assert log["response_bytes"] > 0
+    assert (log["inserted"], log["updated"], log["skipped"]) == (60, 0, 0)
+
+
+@pytest.mark.django_db
+def test_failed_crawl_is_recorded(user, client, mocker, caplog):
+    caplog.set_level(logging.INFO, logger="ytvd.subscriptions.utils")
+    failed = metrics.CRAWLS.value(outcome="failed")
+    sub = Subscription.objects.create(
+        user=user, name="channel", youtube_id="channel", type="ItemType.CHANNEL"
+    )
+    crawler = Crawler(client)
+    mocker.patch.object(crawler, "fetch_page", side_effect=RuntimeError)
+
+    with pytest.raises(RuntimeError):
+        crawler.crawl_feed(sub.feed)
+
+    assert metrics.CRAWLS.value(outcome="failed") == failed + 1
+    [log] = crawl_logs(caplog)
+    assert log["outcome"] == "failed"
+    assert log["pages"] == 0
+
+
+def test_metrics_view():
+    metrics.REQUESTS.inc(endpoint="videos", status=200)
+
+    response = Client().get("/metrics")
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == metrics.CONTENT_TYPE
+    assert 'youtube_requests_total{endpoint="videos",status="200"}' in (
+        response.content.decode()
+    )
@@ -2,8 +2,17 @@ from datetime import time
 import pytest
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from subscriptions.models import Subscription, Video
+from subscriptions.models import (
+    Feed,
+    Subscription,
+    SubscriptionVideo,
+    Video,
+    attach_newest_unwatched,
+)
+from subscriptions.utils.counters import update_counters
 
 
 @pytest.fixture
@@ -19,25 +28,53 @@ class TestSubscription:
 
     def test_has_videos(self, now, user):
         s = Subscription.objects.create(user=user, name="foo")
-        s.videos.create(published_at=now)
+        s.videos.create(feed=s.feed, published_at=now)
 
         assert Video.objects.first().published_at == now
+        assert list(s.feed.videos.all()) == list(s.videos.all())
 
     def test_unwatched_filter(self, now, user):
         s = Subscription.objects.create(user=user, name="foo")
-        v1 = s.videos.create(youtube_id="123", published_at=now)
-        v2 = s.videos.create(youtube_id="456", published_at=now, watched=True)
+        v1 = s.videos.create(feed=s.feed, youtube_id="123", published_at=now)
+        v2 = s.videos.create(
+            feed=s.feed,
+            youtube_id="456",
+            published_at=now,
+            through_defaults={"watched": True},
+        )
 
         unwatched = s.unwatched()
         assert list(unwatched) == [v1]
 
+    def test_shares_feed(self, django_user_model):
+        u1 = django_user_model.objects.create_user("a")
+        u2 = django_user_model.objects.create_user("b")
+        s1 = u1.subscriptions.create(name="foo", youtube_id="123", type="t")
+        s2 = u2.subscriptions.create(name="foo", youtube_id="123", type="t")
+
+        assert s1.feed == s2.feed
+        assert Feed.objects.get().youtube_id == "123"
+
+    def test_watched_state_is_per_subscriber(self, now, django_user_model):
+        s1 = django_user_model.objects.create_user("a").subscriptions.create(
+            name="foo", youtube_id="123"
+        )
+        s2 = django_user_model.objects.create_user("b").subscriptions.create(
+            name="foo", youtube_id="123"
+        )
+        video = s1.feed.videos.create(youtube_id="v", published_at=now)
+        s1.videos.add(video, through_defaults={"watched": True})
+        s2.videos.add(video)
+
+        assert list(s1.unwatched()) == []
+        assert list(s2.unwatched()) == [video]
+
 
 class TestVideo:
     @pytest.mark.django_db
     def test_create(self, now, subscription):
-        Video.objects.create(published_at=now, subscription=subscription)
+        Video.objects.create(published_at=now, feed=subscription.feed)
         assert Video.objects.first().published_at == now
-        assert Video.objects.first().watched == False
 
     def test_url_property(self, now):
         youtube_id = "foobar"
@@ -63,3 +100,101 @@ def test_subscriptions_belong_to_user():
     assert list(u1.subscriptions.all()) == [
         sub1,
     ]
+
+
+@pytest.mark.django_db
+def test_attach_newest_unwatched(now, user):
+    (s1, s2, s3) = [
+        Subscription.objects.create(user=user, name=name, youtube_id=name)
+        for name in ("a", "b", "c")
+    ]
+    videos = [
+        s1.videos.create(
+            feed=s1.feed,
+            youtube_id=str(i),
+            published_at=now - timezone.timedelta(days=i),
+            through_defaults={"watched": i == 0},
+        )
+        for i in range(5)
+    ]
+    s2.videos.create(feed=s2.feed, youtube_id="b", published_at=now)
+
+    subscriptions = attach_newest_unwatched(
+        Subscription.objects.order_by("name"), limit=3
+    )
+
+    assert subscriptions == [s1, s2, s3]
+    assert subscriptions[0].newest_unwatched == videos[1:4]
+    assert [video.youtube_id for video in subscriptions[1].newest_unwatched] == ["b"]
+    assert subscriptions[2].newest_unwatched == []
+
+
+@pytest.fixture
+def backlog(now, user):
+    """
+    Subscriptions with a long history of videos, mostly watched, and
+    statistics for the query planner
+    """
+    # Autovacuum cannot see the rows of the test's transaction, and analysing
+    # the tables while it runs would leave the planner thinking them empty
+    with connection.cursor() as cursor:
+        for model in (Subscription, SubscriptionVideo, Video):
+            cursor.execute(
+                f"LOCK TABLE {model._meta.db_table} IN SHARE UPDATE EXCLUSIVE MODE"
+            )
+
+    subscriptions = []
+    for s in range(10):
+        sub = Subscription.objects.create(user=user, name=str(s), youtube_id=str(s))
+        Video.objects.bulk_create(
+            Video(
+                feed=sub.feed,
+                youtube_id=f"{s}-{v}",
+                published_at=now - timezone.timedelta(hours=v),
+            )
+            for v in range(500)
+        )
+        SubscriptionVideo.objects.bulk_create(
+            SubscriptionVideo(subscription=sub, video_id=video_id, watched=v >= 5)
+            for (v, video_id) in enumerate(
+                sub.feed.videos.order_by("-published_at").values_list("id", flat=True)
+            )
+        )
+        subscriptions.append(sub)
+
+    with connection.cursor() as cursor:
+        for model in (Subscription, SubscriptionVideo, Video):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+    return subscriptions
+
+
+@pytest.mark.django_db
+def test_unwatched_queries_only_read_index(backlog, user):
+    unwatched = backlog[0].unwatched().explain()
+
+    assert "Index Only Scan using unwatched_entries" in unwatched
+    assert "Seq Scan on subscriptions_subscriptionvideo" not in unwatched
+
+
+@pytest.mark.django_db
+def test_counters_are_updated_through_indexes(backlog):
+    with CaptureQueriesContext(connection) as queries:
+        update_counters(Subscription.objects.filter(id=backlog[0].id))
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN " + queries[0]["sql"])
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+
+    assert "using unwatched_entries" in plan
+    assert "using newest_videos" in plan
+    assert "Seq Scan on subscriptions_subscriptionvideo" not in plan
+
+
+@pytest.mark.django_db
+def test_newest_videos_of_feed_use_index(backlog, now):
+    plan = (
+        backlog[0]
+        .feed.videos.filter(published_at__gt=now - timezone.timedelta(days=1))
+        .explain()
+    )
+
+    assert "Index Scan using newest_videos" in plan
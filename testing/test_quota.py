@@ -0,0 +1,207 @@
+from unittest import mock
+import threading
+import pytest
+from django.db import connection
+from django.utils import timezone
+from subscriptions.models import Feed, Subscription, QuotaDay, QuotaUsage
+from subscriptions.utils.crawler import Crawler, estimate_cost
+from subscriptions.utils.quota import QuotaLedger, QuotaExhausted
+from subscriptions.utils.types import CrawlMode
+from subscriptions.utils.youtube_client import YoutubeClient
+
+
+@pytest.fixture
+def ledger():
+    return QuotaLedger(daily_limit=200)
+
+
+@pytest.mark.parametrize(
+    "url,expected",
+    [
+        ("https://www.googleapis.com/youtube/v3/search", ("search", 100)),
+        ("https://www.googleapis.com/youtube/v3/playlistItems", ("playlistItems", 1)),
+        ("https://www.googleapis.com/youtube/v3/videos", ("videos", 1)),
+    ],
+)
+def test_cost(url, expected):
+    assert QuotaLedger.cost(url) == expected
+
+
+@pytest.mark.django_db
+class TestQuotaLedger:
+    def test_charge(self, ledger):
+        ledger.charge("search", 100)
+        ledger.charge("videos", 1)
+        ledger.charge("videos", 1)
+
+        assert ledger.used() == 102
+        assert ledger.remaining() == 98
+        assert QuotaUsage.objects.get(endpoint="videos").units == 2
+
+    def test_charge_over_budget(self, ledger):
+        ledger.charge("search", 100)
+        ledger.charge("search", 100)
+
+        with pytest.raises(QuotaExhausted):
+            ledger.charge("videos", 1)
+        assert ledger.used() == 200
+
+    def test_charge_is_conditional(self, ledger):
+        # Another process has spent the rest of the quota since this one
+        # last looked
+        ledger.charge("search", 100)
+        QuotaDay.objects.update(units=150)
+
+        with pytest.raises(QuotaExhausted):
+            ledger.charge("search", 100)
+        ledger.charge("videos", 50)
+
+        assert ledger.used() == 200
+        assert QuotaUsage.objects.get(endpoint="search").units == 100
+
+    def test_previous_days_do_not_count(self, ledger):
+        QuotaUsage.objects.create(
+            date=ledger.today() - timezone.timedelta(days=1),
+            endpoint="search",
+            units=200,
+        )
+
+        assert ledger.remaining() == 200
+
+    def test_exhaust(self, ledger):
+        ledger.charge("videos", 1)
+        ledger.exhaust()
+
+        assert ledger.remaining() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_charges_do_not_overspend(ledger):
+    ledger.charge("search", 100)
+    charged = []
+
+    def charge_in_thread():
+        try:
+            ledger.charge("search", 100)
+            charged.append(True)
+        except QuotaExhausted:
+            charged.append(False)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=charge_in_thread) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert sorted(charged) == [False, False, False, True]
+    assert ledger.used() == 200
+
+
+@pytest.mark.django_db
+def test_fetch_charges_ledger(api_key, ledger):
+    client = YoutubeClient(api_key, ledger=ledger)
+    response = mock.Mock(status_code=200, content=b"")
+    response.json.return_value = {"items": []}
+
+    with mock.patch.object(client.session, "get", return_value=response):
+        client._fetch("https://www.googleapis.com/youtube/v3/search")
+
+    assert ledger.used() == 100
+
+
+@pytest.mark.django_db
+def test_fetch_charges_every_attempt(api_key, ledger, mocker):
+    mocker.patch("subscriptions.utils.youtube_client.clock.sleep")
+    client = YoutubeClient(api_key, ledger=ledger)
+    unavailable = mock.Mock(status_code=503, content=b"", headers={})
+    unavailable.json.return_value = None
+    response = mock.Mock(status_code=200, content=b"")
+    response.json.return_value = {"items": []}
+
+    with mock.patch.object(
+        client.session, "get", side_effect=[unavailable, unavailable, response]
+    ):
+        client._fetch("https://www.googleapis.com/youtube/v3/videos")
+
+    assert ledger.used() == 3
+    assert QuotaUsage.objects.get(endpoint="videos").units == 3
+
+
+@pytest.mark.django_db
+def test_fetch_quota_error_exhausts_ledger(api_key, ledger):
+    client = YoutubeClient(api_key, ledger=ledger)
+    response = mock.Mock(status_code=403, content=b"")
+    response.json.return_value = {
+        "error": {"code": 403, "errors": [{"reason": "quotaExceeded"}]}
+    }
+
+    with mock.patch.object(client.session, "get", return_value=response):
+        with pytest.raises(QuotaExhausted):
+            client._fetch("https://www.googleapis.com/youtube/v3/videos")
+
+    assert ledger.remaining() == 0
+
+
+@pytest.mark.django_db
+def test_plan_orders_and_trims(api_key):
+    client = YoutubeClient(api_key, ledger=QuotaLedger(daily_limit=5))
+    now = timezone.now()
+
+    def create(name, last_checked, **kwargs):
+        return Feed.objects.create(
+            name=name,
+            youtube_id=name,
+            type="ItemType.PLAYLIST",
+            last_checked=last_checked,
+            **kwargs,
+        )
+
+    recent = create("recent", now - timezone.timedelta(hours=1))
+    stale = create("stale", now - timezone.timedelta(days=7))
+    new = create("new", None)
+
+    crawler = Crawler(client, concurrent=False)
+    # Each playlist costs two units, so only two fit in the budget
+    assert crawler.plan([recent, stale, new]) == [new, stale]
+
+
+@pytest.mark.django_db
+def test_plan_estimates_search_mode(api_key):
+    client = YoutubeClient(api_key, ledger=QuotaLedger(daily_limit=50))
+    feed = Feed.objects.create(name="channel", youtube_id="UC", type="ItemType.CHANNEL")
+
+    assert Crawler(client, concurrent=False).plan([feed]) == [feed]
+    assert (
+        Crawler(client, concurrent=False, channel_mode=CrawlMode.SEARCH).plan([feed])
+        == []
+    )
+
+
+def test_estimate_feed_mode():
+    new = Feed(type="ItemType.CHANNEL", uploads_playlist_id="UU")
+    crawled = Feed(type="ItemType.CHANNEL", last_checked=timezone.now())
+
+    # Channels are backfilled through their uploads playlist first
+    assert estimate_cost(new, CrawlMode.FEED) == 2
+    # and then only the durations of new videos cost quota
+    assert estimate_cost(crawled, CrawlMode.FEED) == 1
+
+
+@pytest.mark.django_db
+def test_crawl_survives_quota_exhaustion(client, user, mocker):
+    Subscription.objects.create(
+        user=user, name="a", youtube_id="PLa", type="ItemType.PLAYLIST"
+    )
+    Subscription.objects.create(
+        user=user, name="b", youtube_id="PLb", type="ItemType.PLAYLIST"
+    )
+    fetch = mocker.patch.object(
+        client, "sync_playlist_page", side_effect=QuotaExhausted
+    )
+
+    Crawler(client, concurrent=False).crawl(user=user)
+
+    assert fetch.call_count == 2
+    assert all(feed.last_checked is None for feed in Feed.objects.all())
@@ -0,0 +1,206 @@
+import time
+from unittest import mock
+import pytest
+import requests
+from subscriptions.utils.quota import QuotaExhausted
+from subscriptions.utils.ratelimit import TokenBucket
+from subscriptions.utils.youtube_client import YoutubeClient, request_deadline
+
+
+URL = "https://www.googleapis.com/youtube/v3/videos"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def stub_response(status_code, data=None, headers=None):
+    response = mock.Mock(status_code=status_code, headers=headers or {}, content=b"")
+    response.json.return_value = data
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(
+            f"{status_code} Error"
+        )
+    return response
+
+
+class TestTokenBucket:
+    def test_burst_up_to_capacity(self):
+        bucket = TokenBucket(rate=2, capacity=3, clock=FakeClock())
+
+        assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+        # Further requests are spaced out at the rate
+        assert bucket.reserve() == pytest.approx(0.5)
+        assert bucket.reserve() == pytest.approx(1.0)
+
+    def test_refills_over_time(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=1, clock=clock)
+
+        assert bucket.reserve() == 0
+        clock.now = 0.5
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.5)
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+
+
+@pytest.fixture
+def sleep(mocker):
+    return mocker.patch("subscriptions.utils.youtube_client.clock.sleep")
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 503])
+def test_retries_transient_errors(api_key, sleep, status_code):
+    client = YoutubeClient(api_key)
+
+    with mock.patch.object(
+        client.session,
+        "get",
+        side_effect=[
+            stub_response(status_code),
+            stub_response(status_code),
+            stub_response(200, {"items": []}),
+        ],
+    ) as get:
+        assert client._fetch(URL) == {"items": []}
+
+    assert get.call_count == 3
+    assert sleep.call_count == 2
+    assert client.stats["retries"] == 2
+
+
+def test_retries_rate_limit_403(api_key, sleep):
+    client = YoutubeClient(api_key)
+    rate_limited = stub_response(
+        403, {"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}
+    )
+
+    with mock.patch.object(
+        client.session,
+        "get",
+        side_effect=[rate_limited, stub_response(200, {"items": []})],
+    ):
+        assert client._fetch(URL) == {"items": []}
+
+    assert client.stats["retries"] == 1
+
+
+def test_does_not_retry_quota_exhaustion(api_key, sleep):
+    client = YoutubeClient(api_key)
+    exhausted = stub_response(403, {"error": {"errors": [{"reason": "quotaExceeded"}]}})
+
+    with mock.patch.object(client.session, "get", return_value=exhausted):
+        with pytest.raises(QuotaExhausted):
+            client._fetch(URL)
+
+    sleep.assert_not_called()
+
+
+def test_gives_up_after_max_retries(api_key, sleep):
+    client = YoutubeClient(api_key, max_retries=2)
+
+    with mock.patch.object(
+        client.session, "get", return_value=stub_response(503)
+    ) as get:
+        with pytest.raises(requests.HTTPError):
+            client._fetch(URL)
+
+    assert get.call_count == 3
+
+
+def test_retries_connection_errors(api_key, sleep):
+    client = YoutubeClient(api_key)
+
+    with mock.patch.object(
+        client.session,
+        "get",
+        side_effect=[requests.ConnectionError(), stub_response(200, {"items": []})],
+    ):
+        assert client._fetch(URL) == {"items": []}
+
+    assert client.stats["retries"] == 1
+
+
+def test_retries_stop_at_deadline(api_key, sleep):
+    client = YoutubeClient(api_key)
+
+    with mock.patch.object(
+        client.session, "get", return_value=stub_response(503)
+    ) as get:
+        with request_deadline(time.monotonic() - 1):
+            with pytest.raises(requests.HTTPError):
+                client._fetch(URL)
+
+    assert get.call_count == 1
+    sleep.assert_not_called()
+
+
+def test_requests_time_out_at_deadline(api_key):
+    client = YoutubeClient(api_key, timeout=(1, 20))
+
+    with mock.patch.object(
+        client.session, "get", return_value=stub_response(200, {"items": []})
+    ) as get:
+        with request_deadline(time.monotonic() + 5):
+            client._fetch(URL)
+        client._fetch(URL)
+
+    ((_, with_deadline), (_, without_deadline)) = get.call_args_list
+    (connect, read) = with_deadline["timeout"]
+    assert connect == 1
+    assert 4 < read <= 5
+    assert without_deadline["timeout"] == (1, 20)
+
+
+def test_backoff_honours_retry_after(api_key, sleep):
+    client = YoutubeClient(api_key, backoff=0.01)
+
+    with mock.patch.object(
+        client.session,
+        "get",
+        side_effect=[
+            stub_response(429, headers={"Retry-After": "7"}),
+            stub_response(200, {"items": []}),
+        ],
+    ):
+        client._fetch(URL)
+
+    sleep.assert_called_once_with(7.0)
+
+
+def test_backoff_is_bounded(api_key):
+    client = YoutubeClient(api_key, backoff=1, max_backoff=4)
+
+    for attempt in range(10):
+        assert 0 <= client._retry_delay(attempt) <= min(4, 2 ** attempt)
+
+
+def test_requests_are_throttled(api_key, sleep):
+    bucket = TokenBucket(rate=1, capacity=1, clock=FakeClock())
+    client = YoutubeClient(api_key, rate_limiter=bucket)
+
+    with mock.patch.object(
+        client.session, "get", return_value=stub_response(200, {"items": []})
+    ):
+        client._fetch(URL)
+        client._fetch(URL)
+
+    assert client.stats["throttle_wait_seconds"] == pytest.approx(1.0)
+
+
+def test_requests_have_timeouts(api_key):
+    client = YoutubeClient(api_key, timeout=(1, 2))
+
+    with mock.patch.object(
+        client.session, "get", return_value=stub_response(200, {"items": []})
+    ) as get:
+        client._fetch(URL)
+
+    assert get.call_args[1]["timeout"] == (1, 2)
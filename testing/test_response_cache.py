@@ -0,0 +1,104 @@
+from unittest import mock
+import pytest
+from django.core.cache import caches
+from subscriptions.utils.response_cache import ResponseCache
+from subscriptions.utils.youtube_client import YoutubeClient
+
+
+URL = "https://www.googleapis.com/youtube/v3/playlistItems"
+
+
+@pytest.fixture
+def cache():
+    cache = caches["youtube"]
+    yield ResponseCache(cache)
+    cache.clear()
+
+
+@pytest.fixture
+def cached_client(api_key, cache):
+    return YoutubeClient(api_key, cache=cache)
+
+
+def stub_response(status_code, data=None, etag=None):
+    response = mock.Mock(status_code=status_code, headers={}, content=b"")
+    if etag is not None:
+        response.headers["ETag"] = etag
+    response.json.return_value = data
+    return response
+
+
+def test_key_ignores_api_key_and_param_order():
+    assert ResponseCache.key(URL, {"key": "a", "part": "snippet", "id": "1"}) == (
+        ResponseCache.key(URL, {"id": "1", "part": "snippet", "key": "b"})
+    )
+    assert ResponseCache.key(URL, {"id": "1"}) != ResponseCache.key(URL, {"id": "2"})
+
+
+@pytest.mark.django_db
+def test_unchanged_response_served_from_cache(cached_client):
+    data = {"items": [{"id": "abc"}]}
+    params = {"key": "API_KEY", "playlistId": "PL"}
+
+    with mock.patch.object(
+        cached_client.session,
+        "get",
+        side_effect=[stub_response(200, data, etag='"v1"'), stub_response(304)],
+    ) as get:
+        assert cached_client._fetch(URL, params=params) == data
+        assert cached_client._fetch(URL, params=params) == data
+
+    assert get.call_args_list[0][1]["headers"] == {}
+    assert get.call_args_list[1][1]["headers"] == {"If-None-Match": '"v1"'}
+    assert cached_client.stats["cache_hits"] == 1
+    assert cached_client.stats["cache_misses"] == 1
+
+
+@pytest.mark.django_db
+def test_changed_response_replaces_cache(cached_client, cache):
+    params = {"playlistId": "PL"}
+
+    with mock.patch.object(
+        cached_client.session,
+        "get",
+        side_effect=[
+            stub_response(200, {"items": [1]}, etag='"v1"'),
+            stub_response(200, {"items": [1, 2]}, etag='"v2"'),
+        ],
+    ):
+        cached_client._fetch(URL, params=params)
+        assert cached_client._fetch(URL, params=params) == {"items": [1, 2]}
+
+    assert cache.get(URL, params) == ('"v2"', {"items": [1, 2]})
+    assert cached_client.stats["cache_hits"] == 0
+
+
+@pytest.mark.parametrize(
+    "url,params,expected",
+    [
+        (URL, {"playlistId": "PL"}, True),
+        (URL, {"playlistId": "PL", "pageToken": "page2"}, False),
+        ("https://www.googleapis.com/youtube/v3/videos", {"id": "1"}, False),
+        ("https://www.googleapis.com/youtube/v3/search", {"channelId": "1"}, False),
+    ],
+)
+def test_cacheable(url, params, expected):
+    assert ResponseCache.cacheable(url, params) == expected
+
+
+@pytest.mark.django_db
+def test_requests_not_worth_caching_skip_cache(cached_client, cache):
+    params = {"playlistId": "PL", "pageToken": "page2"}
+
+    with mock.patch.object(
+        cached_client.session,
+        "get",
+        return_value=stub_response(200, {"items": []}, etag='"v1"'),
+    ) as get:
+        cached_client._fetch(URL, params=params)
+        cached_client._fetch(URL, params={"playlistId": "PL"}, etag='"v0"')
+
+    assert cache.get(URL, params) is None
+    assert cache.get(URL, {"playlistId": "PL"}) is None
+    assert get.call_args_list[1][1]["headers"] == {"If-None-Match": '"v0"'}
+    assert cached_client.stats["cache_misses"] == 0
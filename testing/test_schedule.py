@@ -0,0 +1,117 @@
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from subscriptions.models import CrawlJob, Feed, Subscription, Video
+from subscriptions.utils.crawler import Crawler
+from subscriptions.utils.jobs import enqueue
+from subscriptions.utils.schedule import (
+    due_feeds,
+    next_due_at,
+    poll_interval,
+    schedule_next_check,
+)
+from subscriptions.utils.types import Page
+
+MINUTE = timezone.timedelta(minutes=1)
+HOUR = timezone.timedelta(hours=1)
+DAY = timezone.timedelta(days=1)
+
+
+@pytest.fixture
+def now():
+    return timezone.now()
+
+
+def test_poll_interval_follows_upload_rate(now):
+    # Uploads every 8 hours, polled four times per upload
+    published = [now - 8 * HOUR * i for i in range(1, 11)]
+    assert poll_interval(published, now, MINUTE, DAY) == 2 * HOUR
+
+
+def test_poll_interval_backs_off_dormant_feeds(now):
+    # Used to upload every 8 hours, but has not for a month
+    published = [now - 30 * DAY - 8 * HOUR * i for i in range(10)]
+    assert poll_interval(published, now, MINUTE, DAY) > 16 * HOUR
+
+
+@pytest.mark.parametrize(
+    "published,expected",
+    [
+        ([], DAY),
+        (["busy"], 15 * MINUTE),
+        (["dormant"], DAY),
+    ],
+)
+def test_poll_interval_bounds(now, published, expected):
+    times = {"busy": now - MINUTE, "dormant": now - 365 * DAY}
+    published = [times[p] for p in published]
+    assert poll_interval(published, now, 15 * MINUTE, DAY) == expected
+
+
+@pytest.mark.django_db
+def test_crawl_schedules_next_check(client, subscription, mocker, now):
+    feed = subscription.feed
+    feed.type = "ItemType.PLAYLIST"
+    mocker.patch("subscriptions.utils.crawler.timezone.now", return_value=now)
+    mocker.patch.object(
+        client,
+        "sync_playlist_page",
+        return_value=Page(
+            [
+                Video(youtube_id=str(i), published_at=now - 8 * HOUR * i)
+                for i in range(1, 11)
+            ]
+        ),
+    )
+
+    Crawler(client, concurrent=False).crawl_feed(feed)
+
+    feed.refresh_from_db()
+    assert feed.last_checked == now
+    assert feed.next_check_at == now + 2 * HOUR
+
+
+@pytest.mark.django_db
+def test_pushed_feeds_are_polled_rarely(subscription, settings, now):
+    feed = subscription.feed
+    feed.videos.create(youtube_id="busy", published_at=now - MINUTE)
+    feed.push_expires_at = now + DAY
+
+    schedule_next_check(feed, now)
+
+    assert feed.next_check_at == now + timezone.timedelta(
+        seconds=settings.CRAWL_MAX_INTERVAL
+    )
+
+
+@pytest.mark.django_db
+def test_due_feeds(user, now):
+    def subscribe(name, next_check_at):
+        sub = Subscription.objects.create(user=user, name=name, youtube_id=name)
+        Feed.objects.filter(id=sub.feed_id).update(next_check_at=next_check_at)
+
+    subscribe("new", None)
+    subscribe("due", now - MINUTE)
+    subscribe("later", now + HOUR)
+    Feed.objects.create(name="unsubscribed", youtube_id="unsubscribed")
+
+    assert sorted(feed.name for feed in due_feeds(now)) == ["due", "new"]
+    assert next_due_at() == now - MINUTE
+
+
+@pytest.mark.django_db
+def test_queued_feeds_are_not_due(subscription, now):
+    enqueue(subscription.feed)
+
+    assert list(due_feeds(now)) == []
+    assert next_due_at() is None
+
+
+@pytest.mark.django_db
+def test_scheduler_queues_due_feeds(subscription):
+    call_command("crawl_scheduler", "--once")
+    call_command("crawl_scheduler", "--once")
+
+    job = CrawlJob.objects.get()
+    assert job.feed == subscription.feed
+    assert job.status == CrawlJob.Status.PENDING
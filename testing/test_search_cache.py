@@ -0,0 +1,62 @@
+import pytest
+from django.core.cache import caches
+from subscriptions.utils.search_cache import SearchCache
+from subscriptions.utils.types import ItemType, SearchItem, Thumbnail
+
+
+@pytest.fixture
+def search_cache():
+    yield SearchCache()
+    caches["search"].clear()
+    caches["search-local"].clear()
+
+
+@pytest.fixture
+def items():
+    return [
+        SearchItem(
+            id="UCKk076mm-7JjLxJcFSXIPJA",
+            title="outsidexbox",
+            description="",
+            thumbnail=Thumbnail(url="https://example.com", width=None, height=None),
+            channel_title="outsidexbox",
+            item_type=ItemType.CHANNEL,
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "term", ["outside xbox", "  Outside   Xbox ", "OUTSIDE\txbox", "ｏｕｔｓｉｄｅ xbox"]
+)
+def test_normalize(term):
+    assert SearchCache.normalize(term) == "outside xbox"
+
+
+@pytest.mark.django_db
+def test_repeated_search_is_cached(search_cache, client, items, mocker):
+    search = mocker.patch.object(client, "search", return_value=iter(items))
+
+    assert search_cache.search(client, "Outside Xbox") == items
+    assert search_cache.search(client, "outside  xbox") == items
+
+    search.assert_called_once_with(term="outside xbox")
+
+
+@pytest.mark.django_db
+def test_shared_between_processes(search_cache, items):
+    search_cache.set("outside xbox", items)
+    # A different process has an empty local cache
+    caches["search-local"].clear()
+
+    assert search_cache.get("outside xbox") == items
+
+
+@pytest.mark.django_db
+def test_expired_entries_are_ignored(search_cache, items, mocker):
+    search_cache.set("outside xbox", items)
+
+    mocker.patch(
+        "subscriptions.utils.search_cache.time.time",
+        return_value=10 ** 10,
+    )
+    assert search_cache.get("outside xbox") is None
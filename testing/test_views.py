@@ -0,0 +1,226 @@
+import pytest
+from django.utils import timezone
+from subscriptions.models import CrawlJob, Subscription, Video
+from subscriptions.utils.crawler import commit_page, start_crawl
+from subscriptions.utils.ingest import link_videos
+from subscriptions.utils.jobs import claim, complete, enqueue
+from subscriptions.utils.types import Page
+from subscriptions.views import VIDEOS_PER_PAGE, VIDEOS_PER_SUBSCRIPTION
+
+
+@pytest.fixture
+def bundles(mocker):
+    # Render pages without the stats of a webpack build
+    mocker.patch("webpack_loader.loader.WebpackLoader.get_bundle", return_value=[])
+
+
+@pytest.mark.django_db
+def test_update_feeds_queues_crawls(web, user):
+    subs = [
+        Subscription.objects.create(user=user, name=name, youtube_id=name)
+        for name in ("a", "b")
+    ]
+
+    response = web.post("/update_feeds/", HTTP_ACCEPT="application/json")
+
+    jobs = CrawlJob.objects.order_by("id")
+    assert response.json() == {"jobs": [job.id for job in jobs]}
+    assert [job.feed for job in jobs] == [sub.feed for sub in subs]
+
+
+@pytest.mark.django_db
+def test_update_feeds_redirects_without_javascript(web, subscription):
+    response = web.post("/update_feeds/")
+
+    assert response.status_code == 302
+    assert CrawlJob.objects.get().feed == subscription.feed
+
+
+@pytest.mark.django_db
+def test_update_feeds_status(web, user, django_user_model):
+    subs = [
+        Subscription.objects.create(user=user, name=name, youtube_id=name)
+        for name in ("a", "b")
+    ]
+    other = Subscription.objects.create(
+        user=django_user_model.objects.create_user("other"),
+        name="c",
+        youtube_id="c",
+    )
+    job_ids = web.post("/update_feeds/", HTTP_ACCEPT="application/json").json()["jobs"]
+    other_job = CrawlJob.objects.create(feed=other.feed)
+
+    [job, _] = claim("worker", 2)
+    complete(job, videos_added=3)
+    jobs = ",".join(str(i) for i in job_ids + [other_job.id])
+    progress = web.get(f"/update_feeds/status/?jobs={jobs}").json()
+
+    assert progress == {
+        "done": False,
+        "subscriptions": [
+            {
+                "id": subs[0].id,
+                "name": "a",
+                "status": "done",
+                "new_videos": 3,
+                "unwatched_videos": 0,
+            },
+            {
+                "id": subs[1].id,
+                "name": "b",
+                "status": "running",
+                "new_videos": 0,
+                "unwatched_videos": 0,
+            },
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_subscribe_queues_first_crawl(web, user):
+    response = web.post(
+        "/search/subscribe",
+        {"item-id": "PL1", "item-type": "ItemType.PLAYLIST", "item-name": "name"},
+    )
+
+    assert response.status_code == 302
+    sub = Subscription.objects.get(user=user)
+    assert CrawlJob.objects.get().feed == sub.feed
+
+
+@pytest.mark.django_db
+def test_subscribe_during_first_crawl_gets_committed_pages(
+    web, user, django_user_model
+):
+    first = Subscription.objects.create(
+        user=django_user_model.objects.create_user("first"),
+        name="name",
+        youtube_id="PL1",
+        type="ItemType.PLAYLIST",
+    )
+    enqueue(first.feed)
+    # The first crawl has committed a page, but not finished
+    start_crawl(first.feed, timezone.now())
+    video = Video(youtube_id="v1", name="v1", published_at=timezone.now())
+    commit_page(first.feed, Page([video], next_page_id="2"))
+
+    web.post(
+        "/search/subscribe",
+        {"item-id": "PL1", "item-type": "ItemType.PLAYLIST", "item-name": "name"},
+    )
+
+    sub = Subscription.objects.get(user=user)
+    assert [v.youtube_id for v in sub.unwatched()] == ["v1"]
+    assert CrawlJob.objects.get().feed == sub.feed
+
+
+def add_videos(sub, count):
+    now = timezone.now()
+    videos = [
+        sub.feed.videos.create(
+            youtube_id=f"{sub.youtube_id}-{i}",
+            published_at=now - timezone.timedelta(hours=i),
+        )
+        for i in range(count)
+    ]
+    link_videos([sub.id], [video.id for video in videos])
+
+
+@pytest.mark.django_db
+def test_index_queries_do_not_grow_with_subscriptions(
+    web, user, bundles, django_assert_num_queries
+):
+    def subscribe(name, videos):
+        sub = Subscription.objects.create(user=user, name=name, youtube_id=name)
+        add_videos(sub, videos)
+
+    subscribe("a", 3)
+    # Session, user, subscriptions and their unwatched videos
+    with django_assert_num_queries(4):
+        web.get("/")
+
+    for name in ("b", "c", "d"):
+        subscribe(name, VIDEOS_PER_SUBSCRIPTION + 5)
+    with django_assert_num_queries(4):
+        response = web.get("/")
+
+    subscriptions = response.context["cards"]
+    assert [sub.name for sub in subscriptions] == ["b", "c", "d", "a"]
+    assert [len(sub.newest_unwatched) for sub in subscriptions] == [10, 10, 10, 3]
+    assert response.content.count(b"Show all 15 unwatched videos") == 3
+
+
+@pytest.mark.django_db
+def test_subscription_pages_through_unwatched_videos(
+    web, user, bundles, django_user_model
+):
+    sub = Subscription.objects.create(user=user, name="a", youtube_id="a")
+    add_videos(sub, VIDEOS_PER_PAGE + 1)
+    other = Subscription.objects.create(
+        user=django_user_model.objects.create_user("other"), name="b", youtube_id="b"
+    )
+
+    first = web.get(f"/subscriptions/{sub.id}/")
+    last = web.get(f"/subscriptions/{sub.id}/?page=2")
+
+    assert len(first.context["page"]) == VIDEOS_PER_PAGE
+    assert [video.youtube_id for video in last.context["page"]] == ["a-50"]
+    assert web.get(f"/subscriptions/{other.id}/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_index_loads_later_cards_lazily(web, user, bundles, mocker):
+    mocker.patch("subscriptions.views.EAGER_CARDS", 2)
+    for name in ("a", "b", "c"):
+        Subscription.objects.create(user=user, name=name, youtube_id=name)
+
+    response = web.get("/")
+
+    assert [sub.name for sub in response.context["cards"]] == ["a", "b"]
+    assert [sub.name for sub in response.context["lazy_cards"]] == ["c"]
+    assert response.content.count(b"data-lazy-card") == 1
+
+
+@pytest.mark.django_db
+def test_subscription_card_pages_through_unwatched_videos(
+    web, user, bundles, django_user_model
+):
+    sub = Subscription.objects.create(user=user, name="a", youtube_id="a")
+    add_videos(sub, VIDEOS_PER_SUBSCRIPTION + 1)
+    other = Subscription.objects.create(
+        user=django_user_model.objects.create_user("other"), name="b", youtube_id="b"
+    )
+
+    first = web.get(f"/subscriptions/{sub.id}/card/")
+    last = web.get(f"/subscriptions/{sub.id}/card/?page=2")
+
+    assert len(first.context["videos"]) == VIDEOS_PER_SUBSCRIPTION
+    assert b"Older" in first.content and b"Newer" not in first.content
+    assert [video.youtube_id for video in last.context["videos"]] == ["a-10"]
+    assert b"<html" not in last.content
+    assert web.get(f"/subscriptions/{other.id}/card/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_watching_a_video_redirects_to_its_card(web, user, bundles):
+    sub = Subscription.objects.create(user=user, name="a", youtube_id="a")
+    add_videos(sub, 2)
+    [video, _] = sub.unwatched()
+    card_url = f"/subscriptions/{sub.id}/card/?page=1"
+
+    response = web.post(
+        "/watched_video/", {"video-id": video.id, "next": card_url}, follow=True
+    )
+
+    assert response.redirect_chain == [(card_url, 302)]
+    assert [v.youtube_id for v in response.context["videos"]] == ["a-1"]
+
+
+@pytest.mark.django_db
+def test_watching_ignores_next_url_off_site(web, subscription):
+    response = web.post(
+        "/watched_sub/",
+        {"subscription-id": subscription.id, "next": "https://example.com/"},
+    )
+
+    assert response.url == "/"
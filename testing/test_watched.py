@@ -0,0 +1,133 @@
+import json
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from subscriptions.models import Subscription
+from subscriptions.utils.ingest import link_videos
+from subscriptions.utils.watched import mark_watched
+
+
+@pytest.fixture
+def subscriptions(user, django_user_model):
+    """
+    Two subscriptions of the user, with five videos a day apart, and one of
+    another user to the same channel
+    """
+    now = timezone.now()
+    (a, b) = [
+        Subscription.objects.create(user=user, name=name, youtube_id=name)
+        for name in ("a", "b")
+    ]
+    other = Subscription.objects.create(
+        user=django_user_model.objects.create_user("other"), name="a", youtube_id="a"
+    )
+    for sub in (a, b):
+        for i in range(5):
+            video = sub.feed.videos.create(
+                youtube_id=f"{sub.name}{i}",
+                published_at=now - timezone.timedelta(days=i),
+            )
+            link_videos([sub.id] + ([other.id] if sub == a else []), [video.id])
+    return (a, b, other)
+
+
+def unwatched_ids(sub):
+    return [video.youtube_id for video in sub.unwatched()]
+
+
+def count_entry_updates(queries):
+    return sum(
+        query["sql"].startswith('UPDATE "subscriptions_subscriptionvideo"')
+        for query in queries
+    )
+
+
+def unwatched_count(sub):
+    return Subscription.objects.get(id=sub.id).unwatched_count
+
+
+@pytest.mark.django_db
+def test_mark_subscription_watched(user, subscriptions):
+    (a, b, other) = subscriptions
+
+    with CaptureQueriesContext(connection) as queries:
+        assert mark_watched(user, subscription_id=a.id) == 5
+
+    assert count_entry_updates(queries) == 1
+    assert [unwatched_count(sub) for sub in subscriptions] == [0, 5, 5]
+
+    assert unwatched_ids(a) == []
+    assert len(unwatched_ids(b)) == 5
+    assert len(unwatched_ids(other)) == 5
+    # Videos already watched are left alone
+    assert mark_watched(user, subscription_id=a.id) == 0
+
+
+@pytest.mark.django_db
+def test_mark_watched_before(user, subscriptions):
+    (a, b, other) = subscriptions
+    before = timezone.now() - timezone.timedelta(days=2, hours=12)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert mark_watched(user, before=before) == 4
+
+    assert count_entry_updates(queries) == 1
+    assert [unwatched_count(sub) for sub in subscriptions] == [3, 3, 5]
+
+    assert unwatched_ids(a) == ["a0", "a1", "a2"]
+    assert unwatched_ids(b) == ["b0", "b1", "b2"]
+    assert len(unwatched_ids(other)) == 5
+
+
+@pytest.mark.django_db
+def test_mark_videos_watched(user, subscriptions):
+    (a, b, other) = subscriptions
+    video_ids = [v.id for v in a.unwatched()[:2]] + [b.unwatched()[0].id]
+
+    with CaptureQueriesContext(connection) as queries:
+        assert mark_watched(user, video_ids=video_ids) == 3
+
+    assert count_entry_updates(queries) == 1
+    assert [unwatched_count(sub) for sub in subscriptions] == [3, 4, 5]
+
+    assert unwatched_ids(a) == ["a2", "a3", "a4"]
+    assert unwatched_ids(b) == ["b1", "b2", "b3", "b4"]
+
+
+def post(web, batch):
+    return web.post("/watched/", json.dumps(batch), content_type="application/json")
+
+
+@pytest.mark.django_db
+def test_batch_endpoint(web, subscriptions):
+    (a, b, _) = subscriptions
+    before = timezone.now() - timezone.timedelta(days=3, hours=12)
+
+    response = post(web, {"subscription": a.id, "before": before.isoformat()})
+    assert response.json() == {"marked": 1}
+    assert unwatched_ids(a) == ["a0", "a1", "a2", "a3"]
+
+    video_ids = [video.id for video in b.unwatched()]
+    assert post(web, {"videos": video_ids}).json() == {"marked": 5}
+    assert unwatched_ids(b) == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "batch",
+    [
+        {},
+        [],
+        {"before": "yesterday"},
+        {"videos": ["a"]},
+        {"videos": [True]},
+        {"subscription": "a"},
+        {"subscription": True},
+    ],
+)
+def test_batch_endpoint_rejects_invalid_batches(web, subscriptions, batch):
+    response = post(web, batch)
+
+    assert response.status_code == 400
+    assert "error" in response.json()
@@ -0,0 +1,146 @@
+from datetime import timedelta
+import pytest
+from django.test import Client
+from django.utils import timezone
+from subscriptions.models import Feed, Subscription
+from subscriptions.utils.websub import renew_leases, topic_url
+from subscriptions.utils.youtube_client import YoutubeClient
+from testing.fake_hub import FakeHub, notification
+from testing.fake_youtube import FakeYoutube
+
+
+@pytest.mark.django_db(transaction=True)
+def test_pushed_uploads_are_ingested(live_server, settings, user, mocker):
+    with FakeYoutube(channels=1, videos_per_channel=5) as fake, FakeHub() as hub:
+        settings.WEBSUB_CALLBACK_BASE_URL = live_server.url
+        settings.WEBSUB_HUB_URL = hub.url
+        mocker.patch(
+            "subscriptions.views.YOUTUBE",
+            YoutubeClient("key", base_url=fake.base_url),
+        )
+        channel_id = next(iter(fake.channels))
+        sub = Subscription.objects.create(
+            user=user, name="channel", youtube_id=channel_id, type="ItemType.CHANNEL"
+        )
+
+        assert renew_leases(timezone.now()) == 1
+        feed = Feed.objects.get(id=sub.feed_id)
+        assert feed.push_expires_at > timezone.now() + timedelta(days=4)
+        # Leases are only renewed once they are about to expire
+        assert renew_leases(timezone.now()) == 0
+
+        video = fake.upload(channel_id, "Pushed video")
+        assert hub.publish(topic_url(feed), notification(video, channel_id)) == [204]
+
+    assert [v.name for v in sub.unwatched()] == ["Pushed video"]
+    assert fake.requests == {"videos": 1}
+
+
+@pytest.mark.django_db
+def test_notification_with_bad_signature_is_ignored(subscription, mocker):
+    feed = subscription.feed
+    feed.push_secret = "secret"
+    feed.save()
+    youtube = mocker.patch("subscriptions.views.YOUTUBE")
+
+    response = Client().post(
+        f"/websub/{feed.id}/",
+        data=b"<feed/>",
+        content_type="application/atom+xml",
+        HTTP_X_HUB_SIGNATURE="sha1=bad",
+    )
+
+    assert response.status_code == 202
+    youtube.fetch_videos.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_verification_of_other_topic_is_refused(subscription):
+    feed = subscription.feed
+
+    response = Client().get(
+        f"/websub/{feed.id}/",
+        {
+            "hub.mode": "subscribe",
+            "hub.topic": topic_url(Feed(youtube_id="other")),
+            "hub.challenge": "challenge",
+        },
+    )
+
+    assert response.status_code == 404
+    feed.refresh_from_db()
+    assert feed.push_expires_at is None
+
+
+def verify(feed, mode="subscribe", **params):
+    return Client().get(
+        f"/websub/{feed.id}/",
+        {
+            "hub.mode": mode,
+            "hub.topic": topic_url(feed),
+            "hub.challenge": "challenge",
+            **params,
+        },
+    )
+
+
+def request_pending(feed, mode="subscribe", requested_at=None):
+    feed.push_requested_mode = mode
+    feed.push_requested_at = requested_at or timezone.now()
+    feed.save()
+
+
+@pytest.mark.django_db
+def test_unsolicited_verification_is_refused(subscription):
+    feed = subscription.feed
+
+    response = verify(feed, **{"hub.lease_seconds": "315360000"})
+
+    assert response.status_code == 404
+    feed.refresh_from_db()
+    assert feed.push_expires_at is None
+
+
+@pytest.mark.django_db
+def test_verification_must_match_pending_request(subscription):
+    feed = subscription.feed
+    request_pending(feed, "unsubscribe")
+    assert verify(feed, "subscribe").status_code == 404
+
+    request_pending(feed, requested_at=timezone.now() - timedelta(days=1))
+    assert verify(feed).status_code == 404
+
+    request_pending(feed)
+    response = verify(feed)
+    assert response.status_code == 200
+    assert response.content == b"challenge"
+    # A request is only verified once
+    assert verify(feed).status_code == 404
+    feed.refresh_from_db()
+    assert (feed.push_requested_mode, feed.push_requested_at) == ("", None)
+
+
+@pytest.mark.django_db
+def test_lease_is_capped(subscription, settings):
+    feed = subscription.feed
+    request_pending(feed)
+
+    response = verify(feed, **{"hub.lease_seconds": "99999999999999"})
+
+    assert response.status_code == 200
+    feed.refresh_from_db()
+    assert feed.push_expires_at <= timezone.now() + timedelta(
+        seconds=settings.WEBSUB_LEASE_SECONDS
+    )
+
+
+@pytest.mark.django_db
+def test_verification_with_bad_lease_is_refused(subscription):
+    feed = subscription.feed
+    request_pending(feed)
+
+    response = verify(feed, **{"hub.lease_seconds": "forever"})
+
+    assert response.status_code == 404
+    feed.refresh_from_db()
+    assert feed.push_expires_at is None
@@ -6,22 +6,6 @@ from subscriptions.utils.youtube_client import YoutubeClient
 from subscriptions.utils.types import ItemType
 from subscriptions.utils.crawler import Crawler
 from subscriptions.models import Subscription, Video
-from ytvd.settings import BASE_DIR
-import os
-
-
-@pytest.fixture(scope="session")
-def response():
-    import json
-
-    def _inner(name):
-        filename = os.path.join(
-            BASE_DIR, "testing", "fixtures", f"{name}_response.json"
-        )
-        with open(filename) as infile:
-            return json.load(infile)
-
-    return _inner
 
 
 def test_client_creation(api_key, client):
@@ -181,3 +165,103 @@ def test_fetch_from_playlist(client, response, mocker):
     assert videos[0].description.startswith(
         "Come hang out with Duffie Cooley as he does a bit of hands on hacking"
     )
+
+
+def test_fetch_latest_batches_video_details(client, response, mocker):
+    stub_response_1 = response("fetch_latest_1")
+    stub_response_2 = response("fetch_latest_2")
+    stub_response_3 = response("fetch_latest_3")
+
+    mocker.patch.object(
+        client,
+        "_fetch",
+        side_effect=[stub_response_1, stub_response_2, stub_response_3],
+    )
+    fetch_video_details = mocker.patch.object(
+        client, "fetch_video_details", return_value={}
+    )
+
+    videos = list(
+        client.fetch_latest_from_channel(
+            channel_id="UCKk076mm-7JjLxJcFSXIPJA",
+            since=timezone.make_aware(timezone.datetime(2019, 9, 1)),
+        )
+    )
+
+    # One details lookup per non-empty page, rather than one per video
+    assert fetch_video_details.call_count == 2
+    first_page_ids = fetch_video_details.call_args_list[0][0]
+    assert len(first_page_ids) == 25
+    assert first_page_ids[0] == "7v-KIxHOhrs"
+    assert [v.youtube_id for v in videos[:25]] == list(first_page_ids)
+
+
+def test_fetch_video_details_chunks_ids(client, response, mocker):
+    stub_response = response("video_details")
+    fetch = mocker.patch.object(client, "_fetch", return_value=stub_response)
+
+    video_ids = [f"video{i}" for i in range(120)]
+    client.fetch_video_details(*video_ids)
+
+    assert fetch.call_count == 3
+    requested = [call[1]["params"]["id"].split(",") for call in fetch.call_args_list]
+    assert [len(ids) for ids in requested] == [50, 50, 20]
+    assert sum(requested, []) == video_ids
+
+
+def test_fetch_uploads_playlist_id(client, mocker):
+    fetch = mocker.patch.object(
+        client,
+        "_fetch",
+        return_value={
+            "items": [
+                {
+                    "id": "UCKk076mm-7JjLxJcFSXIPJA",
+                    "contentDetails": {
+                        "relatedPlaylists": {"uploads": "UUKk076mm-7JjLxJcFSXIPJA"}
+                    },
+                }
+            ]
+        },
+    )
+
+    assert (
+        client.fetch_uploads_playlist_id("UCKk076mm-7JjLxJcFSXIPJA")
+        == "UUKk076mm-7JjLxJcFSXIPJA"
+    )
+    fetch.assert_called_once_with(
+        "https://www.googleapis.com/youtube/v3/channels",
+        params={
+            "key": client.api_key,
+            "part": "contentDetails",
+            "id": "UCKk076mm-7JjLxJcFSXIPJA",
+        },
+    )
+
+
+def test_fetch_uploads_playlist_id_missing_channel(client, mocker):
+    mocker.patch.object(client, "_fetch", return_value={"items": []})
+
+    with pytest.raises(ValueError):
+        client.fetch_uploads_playlist_id("missing")
+
+
+def test_fetch_from_playlist_newest_first_stops_paging(client, response, mocker):
+    stub_response_1 = response("playlist_1")
+    stub_response_2 = response("playlist_2")
+
+    fetch = mocker.patch.object(
+        client, "_fetch", side_effect=[stub_response_1, stub_response_2]
+    )
+    mocker.patch.object(client, "fetch_video_details", return_value={})
+
+    videos = list(
+        client.fetch_latest_from_playlist(
+            playlist_id="PL7bmigfV0EqQzxcNpmcdTJ9eFRPBe-iZa",
+            since=timezone.make_aware(timezone.datetime(2019, 10, 24)),
+            newest_first=True,
+        )
+    )
+
+    assert len(videos) == 2
+    assert fetch.call_count == 1
@@ -93,6 +93,39 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+#
+# The database caches are shared by every worker process. Create their tables
+# with `python ./manage.py createcachetable`
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # First pages of playlists from the Youtube API with their ETags, one per
+    # feed crawled through a playlist, for conditional requests
+    "youtube": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "youtube_response_cache",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # Search results, shared between processes
+    "search": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "search_cache",
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+    # The most recently used search results, held by each process
+    "search-local": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "search-local",
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 100},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -141,3 +174,43 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, "assets"),)
 LOGIN_REDIRECT_URL = "/"
 
 GRAPHENE = {"SCHEMA": "ytvd.schema.schema"}
+
+# Youtube API
+# https://developers.google.com/youtube/v3/getting-started#quota
+
+YOUTUBE_API_URL = os.environ.get(
+    "YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3"
+)
+
+YOUTUBE_DAILY_QUOTA = int(os.environ.get("YOUTUBE_DAILY_QUOTA", 10000))
+
+# Requests per second allowed to the API, shared by all crawler threads
+YOUTUBE_REQUESTS_PER_SECOND = float(os.environ.get("YOUTUBE_REQUESTS_PER_SECOND", 10))
+
+# Connect and read timeouts in seconds for each API request
+YOUTUBE_TIMEOUT = (3.05, 10.0)
+
+# Public Atom feeds of channels, which cost no quota
+YOUTUBE_FEEDS_URL = os.environ.get(
+    "YOUTUBE_FEEDS_URL", "https://www.youtube.com/feeds/videos.xml"
+)
+
+# Bounds in seconds on how often the crawl scheduler polls a feed, which
+# otherwise follows the feed's recent upload rate
+CRAWL_MIN_INTERVAL = float(os.environ.get("CRAWL_MIN_INTERVAL", 15 * 60))
+CRAWL_MAX_INTERVAL = float(os.environ.get("CRAWL_MAX_INTERVAL", 24 * 60 * 60))
+
+# How channels are crawled: "feed" (their Atom feeds), "uploads" (their
+# uploads playlists) or "search"
+CRAWL_CHANNEL_MODE = os.environ.get("CRAWL_CHANNEL_MODE", "feed")
+
+# WebSub push notifications of new uploads
+# https://developers.google.com/youtube/v3/guides/push_notifications
+
+# Public URL of the app, which the hub calls back; push is disabled if unset
+WEBSUB_CALLBACK_BASE_URL = os.environ.get("WEBSUB_CALLBACK_BASE_URL")
+WEBSUB_HUB_URL = os.environ.get(
+    "WEBSUB_HUB_URL", "https://pubsubhubbub.appspot.com/subscribe"
+)
+# Lease requested from the hub, in seconds
+WEBSUB_LEASE_SECONDS = int(os.environ.get("WEBSUB_LEASE_SECONDS", 5 * 24 * 60 * 60))